@@ -0,0 +1,27 @@
+# alembic/versions/0002_processor_dedupe.py
+"""processor dedupe
+
+Revision ID: p0002
+Revises: p0001
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = 'p0002'
+down_revision = 'p0001'
+branch_labels = None
+depends_on = None
+
+def upgrade():
+    op.create_table('processor_dedupe',
+        sa.Column('key', sa.String(length=32), primary_key=True),
+        sa.Column('response', sa.Text(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_dedupe_created_at', 'processor_dedupe', ['created_at'])
+
+def downgrade():
+    op.drop_index('ix_dedupe_created_at', table_name='processor_dedupe')
+    op.drop_table('processor_dedupe')
@@ -0,0 +1,2 @@
+# processor/app/bench/__init__.py
+# Local benchmarks and load tools; run as `python -m app.bench.<name>`.
@@ -0,0 +1,107 @@
+# processor/app/bench/bin_index.py
+"""
+Load time and lookups/sec of app.bin_index on a synthetic BIN table: scheme-wide
+ranges plus --ranges issuer ranges (8-digit BINs, some split into 10-digit
+sub-ranges), from CSV and from the mmapped binary layout.
+
+    python -m app.bench.bin_index --ranges 300000 --lookups 1000000
+"""
+import argparse
+import csv
+import os
+import random
+import tempfile
+import time
+
+from app.bin_index import BinIndex
+
+_SCHEMES = (("4", "visa"), ("51", "mastercard"), ("52", "mastercard"), ("53", "mastercard"), ("54", "mastercard"),
+            ("55", "mastercard"), ("6011", "discover"), ("65", "discover"))
+_PRODUCTS = ("credit", "debit", "prepaid", "commercial")
+
+
+def bin_table(ranges: int, seed: int = 7) -> list:
+    """Rows for BinIndex.from_ranges: one per scheme prefix, then `ranges` nested issuer ranges."""
+    rnd = random.Random(seed)
+    rows = [(prefix, prefix, scheme, "issuer_simulator", "default") for prefix, scheme in _SCHEMES]
+    seen = set()
+    while len(seen) < ranges:
+        prefix, scheme = rnd.choice(_SCHEMES)
+        bin8 = prefix + "".join(rnd.choice("0123456789") for _ in range(8 - len(prefix)))
+        if bin8 in seen:
+            continue
+        seen.add(bin8)
+        issuer = f"issuer_{rnd.randrange(2000):04d}"
+        rows.append((bin8, bin8, scheme, issuer, rnd.choice(_PRODUCTS)))
+        if rnd.random() < 0.05 and len(seen) < ranges:
+            # an account range inside the BIN with its own product
+            sub = bin8 + f"{rnd.randrange(100):02d}"
+            seen.add(sub)
+            rows.append((sub, sub, scheme, issuer, rnd.choice(_PRODUCTS)))
+    return rows
+
+
+def pans(rows: list, count: int, seed: int = 11) -> list:
+    """Mostly PANs inside table BINs, with 10% unrouted or scheme-only ones."""
+    rnd = random.Random(seed)
+    out = []
+    for _ in range(count):
+        if rnd.random() < 0.9:
+            prefix = rnd.choice(rows)[0]
+        else:
+            prefix = rnd.choice("3456789")
+        out.append(prefix + "".join(rnd.choice("0123456789") for _ in range(16 - len(prefix))))
+    return out
+
+
+def _best(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ranges", type=int, default=300000)
+    parser.add_argument("--lookups", type=int, default=1000000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    rows = bin_table(args.ranges)
+    sample = pans(rows, args.lookups)
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, bin_path = os.path.join(tmp, "bins.csv"), os.path.join(tmp, "bins.idx")
+        with open(csv_path, "w", newline="") as fh:
+            writer = csv.writer(fh)
+            writer.writerow(["low", "high", "scheme", "issuer", "product"])
+            writer.writerows(rows)
+
+        t0 = time.perf_counter()
+        from_csv = BinIndex.load_csv(csv_path)
+        t_csv = time.perf_counter() - t0
+        from_csv.save_binary(bin_path)
+        t0 = time.perf_counter()
+        mapped = BinIndex.load_binary(bin_path)
+        t_bin = time.perf_counter() - t0
+
+        print(f"{len(rows)} BIN rows -> {len(from_csv)} segments, {len(from_csv.routes)} distinct routes "
+              f"({os.path.getsize(bin_path) / 1e6:.1f} MB compiled)")
+        print(f"  load csv      {t_csv * 1000:9.1f} ms")
+        print(f"  load binary   {t_bin * 1000:9.1f} ms (mmap)")
+
+        assert from_csv.lookup_many(sample[:10000]) == mapped.lookup_many(sample[:10000])
+        for name, index in (("array", from_csv), ("mmap", mapped)):
+            lookup, lookup_key = index.lookup, index.lookup_key
+            t_key = _best(lambda: [lookup_key(p) for p in sample], args.rounds)
+            index.lookup_many(sample)  # fill the block memo
+            t_warm = _best(lambda: [lookup(p) for p in sample], args.rounds)
+            t_many = _best(lambda: index.lookup_many(sample), args.rounds)
+            print(f"  {name:6s} binary search {len(sample) / t_key / 1e6:6.2f} M lookups/s   "
+                  f"memoised {len(sample) / t_warm / 1e6:6.2f} M/s   lookup_many {len(sample) / t_many / 1e6:6.2f} M/s")
+
+
+if __name__ == "__main__":
+    main()
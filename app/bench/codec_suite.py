@@ -0,0 +1,268 @@
+# processor/app/bench/codec_suite.py
+"""
+Codec micro-benchmarks with a regression gate: encode/decode of every frame
+layout the listener accepts, at several payload sizes, measured in ops/sec and
+bytes allocated per op, and compared against a recorded baseline.
+
+Variants (encode / decode):
+  length_prefixed  iso_codec.pack_iso / unpack_iso on the full frame (gateway framing)
+  json             serializer.dumps / the "json" codec on a bare JSON payload
+  legacy           ASCII MTI + JSON body / the "ascii" codec (legacy listener layout)
+  compat           iso8583_compat.pack_iso / the "ascii" codec (MTI + 4-byte length + JSON)
+  compat_unpack    iso8583_compat.unpack_iso on length-prefixed frames (decode only)
+
+Sizes: small (card auth), medium (card auth with DE48/DE55), large (ISO20022
+payout with pain.001), xlarge (bulk pain.001 with 40 transactions).
+
+allocs_bytes is the peak memory traced by tracemalloc during one call beyond what
+was allocated before it, result included: how much a call allocates, not how
+much it keeps.
+
+    python -m app.bench.codec_suite                       # run, compare with the baseline if present
+    python -m app.bench.codec_suite --save-baseline       # record the current numbers as the baseline
+    python -m app.bench.codec_suite --threshold 15 --filter large
+
+Exits with status 1 when a case's ops/sec drops, or its allocations grow, by more
+than --threshold percent (CODEC_BENCH_THRESHOLD, default 10) against the baseline.
+Baselines are machine-specific: record them on the machine that runs the gate.
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from app import iso8583_compat, serializer
+from app.iso_codec import get_codec, pack_iso, unpack_iso
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "codec_baseline.json")
+DEFAULT_THRESHOLD = float(os.environ.get("CODEC_BENCH_THRESHOLD", "10"))
+# allocation growth below this many bytes per op is noise, whatever the percentage
+ALLOC_SLACK_BYTES = 64
+
+_CARD = {"2": "4111111111111111", "3": "000000", "4": "000000001000", "7": "0101120000", "11": "000042",
+         "12": "120000", "13": "0101", "22": "051", "25": "00", "37": "000000000042", "41": "TERM0001",
+         "42": "MERCH0000000001", "49": "978"}
+_EMV = ("9F2608C2C12B098F3DA6E39F2701809F101307010103A0B000010A010000000000E1C73C4B9F3704"
+        "A1B2C3D49F360200159505008004E0009A032601019C01005F2A0209789F02060000000010009F03"
+        "060000000000008202580084") * 2
+
+_TX = ('<CdtTrfTxInf><PmtId><InstrId>I-{i}</InstrId><EndToEndId>E2E-{i}</EndToEndId></PmtId>'
+       '<Amt><InstdAmt Ccy="EUR">{amount}</InstdAmt></Amt><CdtrAgt><FinInstnId><BICFI>COBADEFFXXX</BICFI>'
+       '</FinInstnId></CdtrAgt><Cdtr><Nm>Zoë Müller {i}</Nm></Cdtr><CdtrAcct><Id><IBAN>DE89370400440532013000'
+       '</IBAN></Id></CdtrAcct><RmtInf><Ustrd>Invoice {i} / payout</Ustrd></RmtInf></CdtTrfTxInf>')
+
+
+def _pain_001(transactions: int) -> str:
+    txs = "".join(_TX.format(i=i, amount=f"{100 + i}.50") for i in range(transactions))
+    return ('<?xml version="1.0" encoding="UTF-8"?>'
+            '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.09"><CstmrCdtTrfInitn>'
+            f'<GrpHdr><MsgId>MSG-1</MsgId><CreDtTm>2026-01-01T00:00:00+00:00</CreDtTm>'
+            f'<NbOfTxs>{transactions}</NbOfTxs></GrpHdr><PmtInf><PmtInfId>MSG-1-1</PmtInfId><PmtMtd>TRF</PmtMtd>'
+            '<Dbtr><Nm>Société Générale Test Débiteur</Nm></Dbtr><DbtrAcct><Id><IBAN>FR7630006000011234567890189'
+            f'</IBAN></Id></DbtrAcct>{txs}</PmtInf></CstmrCdtTrfInitn></Document>')
+
+
+def _payout(transactions: int) -> dict:
+    return {"type": "iso20022", "txn_id": "00000000-0000-0000-0000-000000000001", "correlation_id": "corr-1",
+            "creditor_name": "Zoë Müller", "amount": "100.50", "currency": "EUR", "protocol": "101.1",
+            "auth_code": "123456", "payoutDetails": {"iban": "DE89370400440532013000", "bic": "COBADEFFXXX"},
+            "pain_xml": _pain_001(transactions)}
+
+
+SIZES = {
+    "small": _CARD,
+    "medium": {**_CARD, "48": "R1|ACQ=000123|POS=05|TID=TERM0001|" * 4, "55": _EMV},
+    "large": _payout(1),
+    "xlarge": _payout(40),
+}
+
+
+def _legacy_encode(mti: str, fields: dict) -> bytes:
+    return mti.encode("ascii") + serializer.dumps({"fields": fields})
+
+
+class Case(NamedTuple):
+    name: str
+    fn: Callable
+    args: tuple
+    check: Callable[[object], bool]
+
+
+def build_cases(sizes: Dict[str, dict] = SIZES) -> List[Case]:
+    json_codec, ascii_codec = get_codec("json"), get_codec("ascii")
+    cases = []
+    for size, fields in sizes.items():
+        frame = pack_iso("0200", fields)
+        json_payload = serializer.dumps({"mti": "0200", "fields": fields})
+        legacy = _legacy_encode("0200", fields)
+        compat = iso8583_compat.pack_iso("0200", fields)
+
+        def same_fields(msg, fields=fields):
+            return msg["mti"] == "0200" and msg["fields"] == fields
+
+        cases += [
+            Case(f"length_prefixed.encode.{size}", pack_iso, ("0200", fields), lambda out, f=frame: out == f),
+            Case(f"length_prefixed.decode.{size}", unpack_iso, (frame,), same_fields),
+            Case(f"json.encode.{size}", serializer.dumps, ({"mti": "0200", "fields": fields},),
+                 lambda out, p=json_payload: out == p),
+            Case(f"json.decode.{size}", json_codec.decode, (json_payload,), same_fields),
+            Case(f"legacy.encode.{size}", _legacy_encode, ("0200", fields), lambda out, p=legacy: out == p),
+            Case(f"legacy.decode.{size}", ascii_codec.decode, (legacy,), same_fields),
+            Case(f"compat.encode.{size}", iso8583_compat.pack_iso, ("0200", fields), lambda out, p=compat: out == p),
+            Case(f"compat.decode.{size}", ascii_codec.decode, (compat,), same_fields),
+            Case(f"compat_unpack.decode.{size}", iso8583_compat.unpack_iso, (frame,), same_fields),
+        ]
+    return cases
+
+
+def _ops_per_sec(fn, args, rounds: int, min_time: float) -> float:
+    # calibrate a loop long enough to time, then keep the best of `rounds` (GC off, as timeit does)
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _timed(fn, args, rounds, min_time)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _timed(fn, args, rounds: int, min_time: float) -> float:
+    loops = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn(*args)
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time / rounds:
+            break
+        loops *= 2 if elapsed <= 0 else max(2, min(10, int(min_time / rounds / elapsed) + 1))
+    best = elapsed
+    for _ in range(rounds - 1):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return loops / best
+
+
+def _alloc_bytes(fn, args, calls: int = 20) -> int:
+    """Smallest per-call peak of traced memory above the pre-call level (warm caches, no GC noise)."""
+    fn(*args)
+    tracemalloc.start()
+    try:
+        best = None
+        for _ in range(calls):
+            tracemalloc.reset_peak()
+            before, _ = tracemalloc.get_traced_memory()
+            fn(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            best = peak - before if best is None else min(best, peak - before)
+        return best
+    finally:
+        tracemalloc.stop()
+
+
+def run(cases: List[Case], rounds: int = 5, min_time: float = 0.5) -> Dict[str, dict]:
+    results = {}
+    for case in cases:
+        if not case.check(case.fn(*case.args)):
+            raise AssertionError(f"{case.name}: output does not round-trip")
+        results[case.name] = {
+            "ops_per_sec": round(_ops_per_sec(case.fn, case.args, rounds, min_time), 1),
+            "allocs_bytes": _alloc_bytes(case.fn, case.args),
+        }
+    return results
+
+
+def environment() -> dict:
+    return {"python": platform.python_version(), "implementation": platform.python_implementation(),
+            "machine": platform.machine(), "serializer": serializer.BACKEND}
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], threshold: float) -> List[str]:
+    """Regressions of more than threshold percent against the baseline, one line each."""
+    regressions = []
+    for name, cur in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = (cur["ops_per_sec"] - base["ops_per_sec"]) / base["ops_per_sec"] * 100.0
+        if change < -threshold:
+            regressions.append(f"{name}: {cur['ops_per_sec']:.0f} ops/s vs {base['ops_per_sec']:.0f} ({change:+.1f}%)")
+        grown = cur["allocs_bytes"] - base["allocs_bytes"]
+        if grown > ALLOC_SLACK_BYTES and grown > base["allocs_bytes"] * threshold / 100.0:
+            regressions.append(f"{name}: {cur['allocs_bytes']} bytes/op vs {base['allocs_bytes']} "
+                               f"({grown / max(base['allocs_bytes'], 1) * 100.0:+.1f}%)")
+    return regressions
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    try:
+        with open(path, encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+
+
+def _change(cur: dict, base: Optional[dict]) -> str:
+    if not base:
+        return ""
+    return f"{(cur['ops_per_sec'] - base['ops_per_sec']) / base['ops_per_sec'] * 100.0:+7.1f}%"
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="allowed regression, percent")
+    parser.add_argument("--filter", default="", help="only cases whose name contains this")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.5, help="seconds of timing per case")
+    parser.add_argument("--json", help="also write the results here")
+    args = parser.parse_args(argv)
+
+    cases = [c for c in build_cases() if args.filter in c.name]
+    results = run(cases, args.rounds, args.min_time)
+    baseline = load_baseline(args.baseline)
+    base_results = (baseline or {}).get("results", {})
+    if baseline and baseline.get("environment") != environment():
+        print(f"warning: baseline recorded on {baseline.get('environment')}, running on {environment()}",
+              file=sys.stderr)
+
+    print(f"{'case':34s}{'ops/s':>12s}{'bytes/op':>10s}{'vs base':>9s}")
+    for name, cur in results.items():
+        print(f"{name:34s}{cur['ops_per_sec']:12,.0f}{cur['allocs_bytes']:10d}{_change(cur, base_results.get(name)):>9s}")
+
+    report = {"environment": environment(), "results": results}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2)
+    if args.save_baseline:
+        if baseline and args.filter:
+            # keep the cases this run skipped
+            report["results"] = {**base_results, **results}
+        with open(args.baseline, "w", encoding="utf-8") as fh:
+            json.dump(report, fh, indent=2, sort_keys=True)
+        print(f"baseline written to {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"no baseline at {args.baseline}; record one with --save-baseline")
+        return 0
+
+    regressions = compare(results, base_results, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:g}%:")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"\nno regressions beyond {args.threshold:g}%")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
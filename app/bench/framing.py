@@ -0,0 +1,147 @@
+# processor/app/bench/framing.py
+"""
+Frames/sec of the stream-based read path (StreamReader.readexactly) against
+app.iso_framing.FrameProtocol, over a real loopback TCP connection, and of the
+response write path: one write + drain per response (send_frame) against
+FrameOutput coalescing the responses that finish in the same loop iteration
+(--burst of them, like a pipelined connection).
+
+    python -m app.bench.framing --frames 200000 --size 256 --burst 32
+"""
+import argparse
+import asyncio
+import struct
+import time
+
+from app.iso_framing import FrameOutput, FrameProtocol, read_frame, send_frame
+
+
+def _blob(frames: int, size: int) -> bytes:
+    payload = b"0200" + b"x" * max(0, size - 4)
+    return (struct.pack(">I", len(payload)) + payload) * frames
+
+
+async def _send(port: int, blob: bytes, chunk: int = 256 * 1024):
+    _, writer = await asyncio.open_connection("127.0.0.1", port)
+    view = memoryview(blob)
+    for i in range(0, len(blob), chunk):
+        writer.write(view[i:i + chunk])
+        await writer.drain()
+    writer.close()
+    await writer.wait_closed()
+
+
+async def _run_stream(blob: bytes, frames: int) -> float:
+    done = asyncio.get_running_loop().create_future()
+
+    async def handler(reader, writer):
+        count = 0
+        while await read_frame(reader) is not None:
+            count += 1
+        done.set_result(count)
+        writer.close()
+
+    server = await asyncio.start_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    t0 = time.perf_counter()
+    await _send(port, blob)
+    count = await done
+    elapsed = time.perf_counter() - t0
+    server.close()
+    assert count == frames, (count, frames)
+    return elapsed
+
+
+async def _run_protocol(blob: bytes, frames: int) -> float:
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+
+    async def handler(reader, writer):
+        count = 0
+        while await read_frame(reader) is not None:
+            count += 1
+        done.set_result(count)
+        writer.close()
+
+    server = await loop.create_server(lambda: FrameProtocol(handler), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    t0 = time.perf_counter()
+    await _send(port, blob)
+    count = await done
+    elapsed = time.perf_counter() - t0
+    server.close()
+    assert count == frames, (count, frames)
+    return elapsed
+
+
+async def _run_writes(payload: bytes, frames: int, burst: int, coalesced: bool) -> float:
+    loop = asyncio.get_running_loop()
+    expected = frames * (4 + len(payload))
+    received = loop.create_future()
+
+    async def sink(reader, writer):
+        total = 0
+        while total < expected:
+            data = await reader.read(1 << 20)
+            if not data:
+                break
+            total += len(data)
+        received.set_result(total)
+        writer.close()
+
+    server = await asyncio.start_server(sink, "127.0.0.1", 0)
+    _, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+    output = FrameOutput(writer)
+    t0 = time.perf_counter()
+    for start in range(0, frames, burst):
+        n = min(burst, frames - start)
+        if coalesced:
+            for _ in range(n):
+                output.send(payload)
+            await output.drain_if_needed()
+        else:
+            for _ in range(n):
+                await send_frame(writer, payload)
+        # the next burst finishes in a later loop iteration (FrameOutput flushes this one there)
+        await asyncio.sleep(0)
+    output.flush()
+    total = await received
+    elapsed = time.perf_counter() - t0
+    writer.close()
+    server.close()
+    assert total == expected, (total, expected)
+    return elapsed
+
+
+async def main_async(frames: int, size: int, rounds: int, burst: int = 32):
+    blob = _blob(frames, size)
+    cases = {
+        "stream (readexactly)": lambda: _run_stream(blob, frames),
+        "protocol (FrameReader)": lambda: _run_protocol(blob, frames),
+    }
+    print(f"{frames} frames x {size} bytes, best of {rounds}")
+    for name, case in cases.items():
+        best = min([await case() for _ in range(rounds)])
+        print(f"  {name:34s} {frames / best:12,.0f} frames/s  {len(blob) / best / 1e6:8.1f} MB/s")
+    payload = b"0210" + b"x" * max(0, size - 4)
+    writes = {
+        "write: send_frame per response": lambda: _run_writes(payload, frames, burst, coalesced=False),
+        f"write: FrameOutput, bursts of {burst}": lambda: _run_writes(payload, frames, burst, coalesced=True),
+    }
+    for name, case in writes.items():
+        best = min([await case() for _ in range(rounds)])
+        print(f"  {name:34s} {frames / best:12,.0f} frames/s  {len(blob) / best / 1e6:8.1f} MB/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200_000)
+    parser.add_argument("--size", type=int, default=256, help="payload bytes per frame")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--burst", type=int, default=32, help="responses finishing per loop iteration")
+    args = parser.parse_args(argv)
+    asyncio.run(main_async(args.frames, args.size, args.rounds, args.burst))
+
+
+if __name__ == "__main__":
+    main()
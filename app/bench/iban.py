@@ -0,0 +1,78 @@
+# processor/app/bench/iban.py
+"""
+IBANs/sec of app.iban on a synthetic bulk payout file: --count IBANs across every
+registry country, where --repeat of them are beneficiaries already seen earlier in the file.
+
+    python -m app.bench.iban --count 200000 --repeat 0.6
+"""
+import argparse
+import random
+import re
+import time
+
+from app import iban
+
+_ALPHABET = {"n": "0123456789", "a": "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "c": "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"}
+
+
+def random_iban(rnd: random.Random, country: str) -> str:
+    bban = "".join(rnd.choice(_ALPHABET[kind]) for count, kind in re.findall(r"(\d+)([nac])", iban.REGISTRY[country])
+                   for _ in range(int(count)))
+    return iban.make_iban(country, bban)
+
+
+def bulk_file(count: int, repeat: float, seed: int = 5) -> list:
+    rnd = random.Random(seed)
+    countries = sorted(iban.REGISTRY)
+    out = []
+    for i in range(count):
+        if out and rnd.random() < repeat:
+            out.append(rnd.choice(out))
+        else:
+            value = random_iban(rnd, rnd.choice(countries))
+            if i % 50 == 0:
+                value = value[:-1] + ("0" if value[-1] != "0" else "1")  # a typo
+            out.append(value)
+    return out
+
+
+def _bigint_check(value: str) -> bool:
+    # reference: the whole IBAN as one (up to 68-digit) int
+    return int((value[4:] + value[:4]).translate(iban._LETTERS)) % 97 == 1
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--repeat", type=float, default=0.6)
+    args = parser.parse_args(argv)
+
+    values = bulk_file(args.count, args.repeat)
+    unique = len(set(values))
+    print(f"{len(values)} IBANs, {unique} distinct, {len(iban.REGISTRY)} countries (cache {iban.CACHE_SIZE})")
+
+    t = _timed(lambda: [_bigint_check(v) for v in values])
+    print(f"  mod-97, one big int        {len(values) / t / 1e6:6.2f} M/s")
+    t = _timed(lambda: [iban.mod97(v[4:] + v[:4]) == 1 for v in values])
+    print(f"  mod-97, 9-digit chunks     {len(values) / t / 1e6:6.2f} M/s")
+
+    iban._check.cache_clear()
+    t = _timed(lambda: [iban.check_iban(v) for v in values])
+    print(f"  check_iban, cold cache     {len(values) / t / 1e6:6.2f} M/s")
+    t = _timed(lambda: [iban.check_iban(v) for v in values])
+    print(f"  check_iban, warm cache     {len(values) / t / 1e6:6.2f} M/s")
+    iban._check.cache_clear()
+    reasons = []
+    t = _timed(lambda: reasons.extend(iban.check_ibans(values)))
+    print(f"  check_ibans (batch), cold  {len(values) / t / 1e6:6.2f} M/s   "
+          f"{sum(r is not None for r in reasons)} rejected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# processor/app/bench/iso8583_binary.py
+"""
+Encode/decode ops/sec of the binary ISO8583 codec against the JSON frames the
+gateway sends today (pack_iso / the "json" registry codec), for a typical 0200.
+
+    python -m app.bench.iso8583_binary --ops 200000
+"""
+import argparse
+import time
+
+from app import iso8583_binary
+from app.iso_codec import get_codec, pack_iso
+
+FIELDS = {
+    "2": "4111111111111111",
+    "3": "000000",
+    "4": "000000001000",
+    "7": "1017120000",
+    "11": "123456",
+    "12": "120000",
+    "13": "1017",
+    "14": "2812",
+    "22": "051",
+    "25": "00",
+    "32": "123456",
+    "37": "000000123456",
+    "41": "TERM0001",
+    "42": "MERCH0000000001",
+    "49": "978",
+}
+
+
+def _best(fn, ops: int, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(ops):
+            fn()
+        best = min(best, time.perf_counter() - t0)
+    return ops / best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ops", type=int, default=200_000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    json_codec = get_codec("json")
+    json_payload = pack_iso("0200", FIELDS)[4:]
+    binary_payload = iso8583_binary.encode("0200", FIELDS)
+    cases = {
+        "json encode (pack_iso)": lambda: pack_iso("0200", FIELDS),
+        "json decode": lambda: json_codec.decode(json_payload),
+        "binary encode": lambda: iso8583_binary.encode("0200", FIELDS),
+        "binary decode": lambda: iso8583_binary.decode(binary_payload),
+    }
+    print(f"0200 with {len(FIELDS)} fields: json {len(json_payload)} bytes, binary {len(binary_payload)} bytes; "
+          f"best of {args.rounds}")
+    for name, fn in cases.items():
+        print(f"  {name:24s} {_best(fn, args.ops, args.rounds):12,.0f} ops/s")
+
+
+if __name__ == "__main__":
+    main()
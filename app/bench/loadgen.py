@@ -0,0 +1,362 @@
+# processor/app/bench/loadgen.py
+"""
+Load generator for the ISO listener: replays captured messages or a generated
+card / ISO20022 payout / 0800 echo mix over a pool of connections (app.iso_client),
+and reports throughput plus p50/p95/p99/p99.9 latency per message type.
+
+Modes:
+  --rate N         open loop: N requests/s on a fixed schedule. Latency is measured
+                   from each request's scheduled send time, so a stalled listener
+                   shows up as latency rather than as a lower request rate.
+  --concurrency N  closed loop: N callers, each sending its next request as soon
+                   as the previous one is answered.
+
+--local runs everything on this machine. It starts the listener
+(app.iso_supervisor) on a free port against a fresh SQLite database and stops it
+afterwards.
+
+    python -m app.bench.loadgen --local --concurrency 64 --duration 10
+    python -m app.bench.loadgen --port 9000 --rate 2000 --mix card=80,payout=15,echo=5 --json report.json
+    python -m app.bench.loadgen --local --replay captured.jsonl --concurrency 16 --requests 5000
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, List, Optional
+
+from app.iso_client import IsoClient
+
+DEFAULT_MIX = "card=80,payout=15,echo=5"
+PERCENTILES = (("p50", 50.0), ("p95", 95.0), ("p99", 99.0), ("p99.9", 99.9))
+
+
+# -- messages -------------------------------------------------------------------
+
+def card_message(i: int) -> dict:
+    return {"mti": "0200", "fields": {"2": "4111111111111111", "3": "000000", "4": f"{1000 + i % 50000:012d}",
+                                      "39": "00", "41": "TERM0001", "42": "MERCH0000000001", "49": "978"}}
+
+
+def payout_message(i: int) -> dict:
+    amount = f"{10 + i % 990}.{i % 100:02d}"
+    return {
+        "type": "iso20022",
+        "txn_id": f"lg-{os.getpid()}-{i}",
+        "protocol": "101.1",
+        "auth_code": "123456",
+        "amount": amount,
+        "currency": "EUR",
+        "creditor_name": f"Load Test Creditor {i}",
+        "payoutDetails": {"iban": "DE89370400440532013000", "bic": "COBADEFFXXX"},
+        "pain_xml": ('<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.09"><CstmrCdtTrfInitn>'
+                     f'<GrpHdr><MsgId>LG-{i}</MsgId><NbOfTxs>1</NbOfTxs></GrpHdr><PmtInf><CdtTrfTxInf>'
+                     f'<Amt><InstdAmt Ccy="EUR">{amount}</InstdAmt></Amt></CdtTrfTxInf></PmtInf>'
+                     "</CstmrCdtTrfInitn></Document>"),
+    }
+
+
+def echo_message(i: int) -> dict:
+    return {"mti": "0800", "fields": {"70": "301"}}
+
+
+GENERATORS = {"card": card_message, "payout": payout_message, "echo": echo_message}
+
+
+def parse_mix(spec: str) -> List[tuple]:
+    mix = []
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in GENERATORS:
+            raise ValueError(f"unknown message type {name!r} in mix (known: {', '.join(GENERATORS)})")
+        mix.append((name, float(weight or 1)))
+    return mix
+
+
+def generated(mix: List[tuple], seed: int = 0) -> Iterator[tuple]:
+    rnd = random.Random(seed)
+    names = [name for name, _ in mix]
+    weights = [weight for _, weight in mix]
+    for i in itertools.count():
+        name = rnd.choices(names, weights)[0]
+        yield name, GENERATORS[name](i)
+
+
+def message_type(msg: dict) -> str:
+    if msg.get("type"):
+        return str(msg["type"])
+    return str(msg.get("mti") or "unknown")
+
+
+def replayed(path: str) -> Iterator[tuple]:
+    """Cycle through a JSONL capture: one message per line ({"mti", "fields"} or a top-level ISO20022 dict)."""
+    messages = []
+    skipped = 0
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if isinstance(msg, dict) and ("fields" in msg or msg.get("type")):
+                messages.append((message_type(msg), msg))
+            else:
+                skipped += 1
+    if skipped:
+        print(f"replay: skipped {skipped} lines that are not ISO messages", file=sys.stderr)
+    if not messages:
+        raise SystemExit(f"replay: no ISO messages in {path}")
+    return itertools.cycle(messages)
+
+
+# -- load -----------------------------------------------------------------------
+
+class Recorder:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.de39: Dict[str, Counter] = defaultdict(Counter)
+
+    def ok(self, label: str, latency_ms: float, resp: dict):
+        self.latencies[label].append(latency_ms)
+        fields = resp.get("fields") if isinstance(resp.get("fields"), dict) else {}
+        self.de39[label][str(fields.get("39"))] += 1
+
+    def failed(self, label: str, exc: BaseException):
+        kind = "timeout" if isinstance(exc, asyncio.TimeoutError) else type(exc).__name__
+        self.errors[label][kind] += 1
+
+
+async def _send(client: IsoClient, msg: dict, timeout: float) -> dict:
+    if "fields" in msg and msg.get("type") != "iso20022":
+        fields = {k: v for k, v in msg["fields"].items() if str(k) != "11"}  # the client assigns unique STANs
+        extra = {k: v for k, v in msg.items() if k not in ("mti", "fields")}
+        return await client.request(str(msg.get("mti") or "0200"), fields, timeout=timeout, **extra)
+    return await client.request_message({k: v for k, v in msg.items() if k != "correlation_id"}, timeout=timeout)
+
+
+async def _one(client, label, msg, timeout, started, rec: Recorder):
+    try:
+        resp = await _send(client, msg, timeout)
+    except Exception as e:
+        rec.failed(label, e)
+    else:
+        rec.ok(label, (time.perf_counter() - started) * 1000.0, resp)
+
+
+async def run_closed_loop(client, source, concurrency, duration, requests, timeout, rec):
+    stop_at = time.perf_counter() + duration if duration else None
+    budget = itertools.count() if requests is None else iter(range(requests))
+
+    async def worker():
+        for _ in budget:
+            if stop_at is not None and time.perf_counter() >= stop_at:
+                return
+            label, msg = next(source)
+            await _one(client, label, msg, timeout, time.perf_counter(), rec)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def run_fixed_rate(client, source, rate, duration, requests, timeout, max_outstanding, rec):
+    total = requests if requests is not None else int(rate * duration)
+    interval = 1.0 / rate
+    start = time.perf_counter()
+    outstanding = set()
+    for i in range(total):
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        label, msg = next(source)
+        if len(outstanding) >= max_outstanding:
+            rec.failed(label, OverflowError("max outstanding reached"))
+            continue
+        task = asyncio.create_task(_one(client, label, msg, timeout, scheduled, rec))
+        outstanding.add(task)
+        task.add_done_callback(outstanding.discard)
+    if outstanding:
+        await asyncio.gather(*outstanding)
+
+
+def percentile(sorted_values: List[float], p: float) -> Optional[float]:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, int(-(-len(sorted_values) * p // 100)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def _summary(latencies: List[float], errors: Counter, elapsed: float) -> dict:
+    values = sorted(latencies)
+    row = {"ok": len(values), "errors": sum(errors.values()), "rps": round(len(values) / elapsed, 1) if elapsed else 0.0}
+    for name, p in PERCENTILES:
+        v = percentile(values, p)
+        row[f"{name}_ms"] = None if v is None else round(v, 3)
+    row["max_ms"] = round(values[-1], 3) if values else None
+    row["mean_ms"] = round(sum(values) / len(values), 3) if values else None
+    if errors:
+        row["error_kinds"] = dict(errors)
+    return row
+
+
+def build_report(rec: Recorder, elapsed: float, settings: dict) -> dict:
+    labels = sorted(set(rec.latencies) | set(rec.errors))
+    by_type = {label: _summary(rec.latencies[label], rec.errors[label], elapsed) for label in labels}
+    for label in labels:
+        by_type[label]["de39"] = dict(rec.de39[label])
+    everything = [v for label in labels for v in rec.latencies[label]]
+    all_errors = sum((rec.errors[label] for label in labels), Counter())
+    return {"settings": settings, "elapsed_s": round(elapsed, 3), "all": _summary(everything, all_errors, elapsed),
+            "by_type": by_type}
+
+
+def format_table(report: dict) -> str:
+    cols = ["ok", "errors", "rps"] + [f"{name}_ms" for name, _ in PERCENTILES] + ["max_ms"]
+    header = f"{'type':12s}" + "".join(f"{c:>11s}" for c in cols)
+    lines = [header, "-" * len(header)]
+    rows = list(report["by_type"].items()) + [("all", report["all"])]
+    for label, row in rows:
+        cells = "".join(f"{'-' if row.get(c) is None else row[c]:>11}" for c in cols)
+        lines.append(f"{label:12s}{cells}")
+    lines.append(f"elapsed {report['elapsed_s']}s")
+    return "\n".join(lines)
+
+
+# -- local listener -------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_local_listener(workdir: str, workers: int, pipeline: bool, log_path: str) -> tuple:
+    """SQLite-backed listener in a subprocess; returns (process, port, log file)."""
+    from sqlalchemy import create_engine
+
+    from app.models import Base
+
+    db_path = os.path.join(workdir, "loadgen.db")
+    engine = create_engine(f"sqlite:///{db_path}")
+    # the listener only writes processor_events and processor_dedupe
+    # (other models reference tables defined outside app.models)
+    for table in ("processor_events", "processor_dedupe"):
+        Base.metadata.tables[table].create(engine)
+    engine.dispose()
+
+    port = _free_port()
+    env = dict(os.environ, DATABASE_URL=f"sqlite+aiosqlite:///{db_path}")
+    cmd = [sys.executable, "-m", "app.iso_supervisor", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers)]
+    if pipeline:
+        cmd.append("--pipeline")
+    log = open(log_path, "ab")
+    proc = subprocess.Popen(cmd, env=env, stdout=log, stderr=log)
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"local listener exited early; see {log_path}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, port, log
+        except OSError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise SystemExit(f"local listener did not start; see {log_path}")
+
+
+# -- main -----------------------------------------------------------------------
+
+async def main_async(args, port: int) -> dict:
+    source = replayed(args.replay) if args.replay else generated(parse_mix(args.mix), args.seed)
+    rec = Recorder()
+    client = IsoClient(args.host, port, pool_size=args.connections, timeout=args.timeout,
+                       max_inflight_per_connection=args.max_inflight_per_connection)
+    await client.start()
+    if not client.connected():
+        await client.close()
+        raise SystemExit(f"cannot connect to {args.host}:{port}")
+    started = time.perf_counter()
+    try:
+        if args.rate:
+            await run_fixed_rate(client, source, args.rate, args.duration, args.requests, args.timeout,
+                                 args.max_outstanding, rec)
+        else:
+            await run_closed_loop(client, source, args.concurrency, args.duration, args.requests, args.timeout, rec)
+    finally:
+        elapsed = time.perf_counter() - started
+        await client.close()
+    settings = {k: v for k, v in vars(args).items() if k not in ("json",)}
+    settings["port"] = port
+    settings["mode"] = "fixed_rate" if args.rate else "closed_loop"
+    return build_report(rec, elapsed, settings)
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ISO_PORT", "9000")))
+    parser.add_argument("--local", action="store_true", help="start a SQLite-backed listener for the run")
+    parser.add_argument("--local-workers", type=int, default=1)
+    parser.add_argument("--local-pipeline", action="store_true", help="run the local listener with --pipeline")
+    parser.add_argument("--replay", help="JSONL file of messages to replay (cycled)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"generated mix, default {DEFAULT_MIX}")
+    parser.add_argument("--seed", type=int, default=0)
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--rate", type=float, help="open loop: requests per second")
+    mode.add_argument("--concurrency", type=int, default=16, help="closed loop: concurrent callers")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds (ignored with --requests)")
+    parser.add_argument("--requests", type=int, help="total requests instead of a duration")
+    parser.add_argument("--connections", type=int, default=8)
+    parser.add_argument("--max-inflight-per-connection", type=int, default=32,
+                        help="the listener sheds frames past its ISO_PIPELINE_MAX_INFLIGHT (32)")
+    parser.add_argument("--max-outstanding", type=int, default=10_000, help="open loop: cap on unanswered requests")
+    parser.add_argument("--timeout", type=float, default=5.0)
+    parser.add_argument("--json", help="write the JSON report here ('-' for stdout)")
+    args = parser.parse_args(argv)
+    if args.requests is not None:
+        args.duration = None
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    proc = log = None
+    with tempfile.TemporaryDirectory() as workdir:
+        port = args.port
+        if args.local:
+            proc, port, log = start_local_listener(workdir, args.local_workers, args.local_pipeline,
+                                                   os.path.join(workdir, "listener.log"))
+        try:
+            report = asyncio.run(main_async(args, port))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(15)
+                log.close()
+
+    if args.json == "-":
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_table(report))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as fh:
+                json.dump(report, fh, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# processor/app/bench/serializer.py
+"""
+Bytes/sec of each app.serializer backend (dumps and loads) on ISO20022 payout
+payloads shaped like the ones process_incoming_iso persists, pain.001 XML included.
+
+    python -m app.bench.serializer --payloads 2000 --rounds 5
+"""
+import argparse
+import time
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from app import serializer
+
+_PAIN_001 = """<?xml version="1.0" encoding="UTF-8"?>
+<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.09"><CstmrCdtTrfInitn>
+<GrpHdr><MsgId>{msg_id}</MsgId><CreDtTm>{created}</CreDtTm><NbOfTxs>1</NbOfTxs><CtrlSum>{amount}</CtrlSum>
+<InitgPty><Nm>Processor Test Initiator</Nm></InitgPty></GrpHdr>
+<PmtInf><PmtInfId>{msg_id}-1</PmtInfId><PmtMtd>TRF</PmtMtd><ReqdExctnDt><Dt>{date}</Dt></ReqdExctnDt>
+<Dbtr><Nm>Société Générale Test Débiteur</Nm></Dbtr><DbtrAcct><Id><IBAN>FR7630006000011234567890189</IBAN></Id></DbtrAcct>
+<DbtrAgt><FinInstnId><BICFI>AGRIFRPP</BICFI></FinInstnId></DbtrAgt>
+<CdtTrfTxInf><PmtId><EndToEndId>{e2e}</EndToEndId></PmtId><Amt><InstdAmt Ccy="EUR">{amount}</InstdAmt></Amt>
+<Cdtr><Nm>{creditor}</Nm></Cdtr><CdtrAcct><Id><IBAN>DE89370400440532013000</IBAN></Id></CdtrAcct>
+<RmtInf><Ustrd>Invoice {i} / payout</Ustrd></RmtInf></CdtTrfTxInf></PmtInf></CstmrCdtTrfInitn></Document>"""
+
+
+def payout_payload(i: int) -> dict:
+    amount = Decimal(10_000 + i * 37) / 100
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    msg_id = str(uuid.UUID(int=i))
+    creditor = f"Zoë Müller {i}"
+    return {
+        "txn_id": msg_id,
+        "correlation_id": f"corr-{i}",
+        "type": "iso20022",
+        "creditor_name": creditor,
+        "amount": str(amount),
+        "currency": "EUR",
+        "pain_xml": _PAIN_001.format(msg_id=msg_id, created=now.isoformat(), date=now.date(), amount=amount,
+                                     e2e=f"E2E-{i}", creditor=creditor, i=i),
+        "protocol": "101.1",
+        "auth_code": "123456",
+        "payoutDetails": {"iban": "DE89370400440532013000", "bic": "COBADEFFXXX", "reference": f"INV-{i}"},
+        "received_at": now,  # non-JSON types go through default=str
+    }
+
+
+def _best(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--payloads", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    payloads = [payout_payload(i) for i in range(args.payloads)]
+    print(f"{args.payloads} ISO20022 payout payloads, best of {args.rounds} (default backend: {serializer.BACKEND})")
+    for name, (dumps, loads) in serializer.BACKENDS.items():
+        encoded = [dumps(p) for p in payloads]
+        total = sum(len(e) for e in encoded)
+        t_dumps = _best(lambda: [dumps(p) for p in payloads], args.rounds)
+        t_loads = _best(lambda: [loads(e) for e in encoded], args.rounds)
+        print(f"  {name:8s} dumps {total / t_dumps / 1e6:8.1f} MB/s   loads {total / t_loads / 1e6:8.1f} MB/s"
+              f"   ({total / len(payloads):.0f} bytes/payload)")
+
+
+if __name__ == "__main__":
+    main()
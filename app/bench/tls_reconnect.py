@@ -0,0 +1,136 @@
+# processor/app/bench/tls_reconnect.py
+"""
+Reconnect latency against a local TLS listener (self-signed cert): full handshakes
+versus TLS session resumption, with plain TCP as the floor. Every reconnect opens
+a socket, handshakes, does one 0800/0810 echo and closes.
+
+    python -m app.bench.tls_reconnect --reconnects 300
+"""
+import argparse
+import asyncio
+import logging
+import socket
+import ssl
+import statistics
+import struct
+import tempfile
+import threading
+import time
+
+from app import iso_tls
+from app.iso_codec import pack_iso
+from app.iso_listener import start_server
+
+_ECHO = pack_iso("0800", {"11": "000001", "70": "301"})
+
+
+def _start_listener(port: int, ssl_context) -> threading.Thread:
+    ready = threading.Event()
+
+    def run():
+        async def main():
+            task = asyncio.create_task(start_server("127.0.0.1", port, ssl_context=ssl_context))
+            while True:
+                try:
+                    socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+                    break
+                except OSError:
+                    await asyncio.sleep(0.02)
+            ready.set()
+            await task
+
+        asyncio.run(main())
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    ready.wait(10)
+    return thread
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _echo(sock):
+    sock.sendall(_ECHO)
+    (n,) = struct.unpack(">I", _recv_exact(sock, 4))
+    return _recv_exact(sock, n)
+
+
+def _recv_exact(sock, n: int) -> bytes:
+    data = bytearray()
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("listener closed the connection")
+        data += chunk
+    return bytes(data)
+
+
+def reconnect(port: int, ctx: ssl.SSLContext = None, session=None):
+    """One reconnect; returns (seconds, session_reused, session for the next reconnect)."""
+    t0 = time.perf_counter()
+    raw = socket.create_connection(("127.0.0.1", port))
+    raw.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock = ctx.wrap_socket(raw, server_hostname="localhost", session=session) if ctx else raw
+    try:
+        _echo(sock)
+        elapsed = time.perf_counter() - t0
+        if ctx is None:
+            return elapsed, False, None
+        # TLS 1.3 tickets arrive after the handshake; the echo has read them by now
+        return elapsed, sock.session_reused, sock.session
+    finally:
+        sock.close()
+
+
+def _run(port: int, reconnects: int, ctx=None, resume: bool = False):
+    times, reused, session = [], 0, None
+    for _ in range(reconnects):
+        elapsed, was_reused, new_session = reconnect(port, ctx, session if resume else None)
+        times.append(elapsed * 1000.0)
+        reused += was_reused
+        session = new_session
+    times.sort()
+    return {
+        "p50_ms": round(statistics.median(times), 3),
+        "p95_ms": round(times[int(len(times) * 0.95) - 1], 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "resumed": reused,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--reconnects", type=int, default=300)
+    parser.add_argument("--tls-version", choices=("1.2", "1.3"), default="1.3")
+    args = parser.parse_args(argv)
+    # one connect/disconnect log line per reconnect would dominate the timings
+    for name in ("processor.iso_listener", "processor.iso_tls"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        certfile, keyfile = iso_tls.generate_self_signed(tmp)
+        server_ctx = iso_tls.server_context(certfile, keyfile)
+        client_ctx = iso_tls.client_context(cafile=certfile)
+        client_ctx.maximum_version = ssl.TLSVersion.TLSv1_3 if args.tls_version == "1.3" else ssl.TLSVersion.TLSv1_2
+        plain_port, tls_port = _free_port(), _free_port()
+        _start_listener(plain_port, None)
+        _start_listener(tls_port, server_ctx)
+
+        cases = {
+            "plain TCP": lambda: _run(plain_port, args.reconnects),
+            f"TLS {args.tls_version} full handshake": lambda: _run(tls_port, args.reconnects, client_ctx),
+            f"TLS {args.tls_version} resumed": lambda: _run(tls_port, args.reconnects, client_ctx, resume=True),
+        }
+        print(f"{args.reconnects} reconnects (connect + handshake + 0800 echo) per case")
+        for name, case in cases.items():
+            r = case()
+            print(f"  {name:28s} p50 {r['p50_ms']:7.3f} ms  p95 {r['p95_ms']:7.3f} ms  "
+                  f"mean {r['mean_ms']:7.3f} ms  resumed {r['resumed']}/{args.reconnects}")
+
+
+if __name__ == "__main__":
+    main()
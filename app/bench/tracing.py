@@ -0,0 +1,89 @@
+# processor/app/bench/tracing.py
+"""
+Overhead of app.tracing: the cost of a span when nothing is sampled, and the time
+per card authorization (decode + process_incoming_iso, database write replaced by
+a no-op) at several TRACE_SAMPLE_RATE values.
+
+    python -m app.bench.tracing --count 20000 --rates 0,0.01,1
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from app import iso_processing, serializer, tracing
+from app.iso_codec import CodecSession
+
+CARD = {"mti": "0200", "2": "4111111111111111", "4": "000000001000", "11": "000001", "txn_id": "bench"}
+
+
+def _best(fn, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def _spans(count: int):
+    for _ in range(count):
+        with tracing.span("decode"):
+            pass
+
+
+def _empty(count: int):
+    for _ in range(count):
+        pass
+
+
+async def _frames(framed: bytes, count: int):
+    codecs = CodecSession()
+    for _ in range(count):
+        with tracing.trace("iso.frame"):
+            with tracing.span("decode"):
+                _, msg = codecs.decode(framed)
+            await iso_processing.process_incoming_iso(msg)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--count", type=int, default=20000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--rates", default="0,0.01,1")
+    args = parser.parse_args(argv)
+
+    tracing.TRACE_FILE = None
+    tracing.SAMPLE_RATE = 0.0
+    n = args.count * 10
+    t_empty = _best(lambda: _empty(n), args.rounds)
+    t_span = _best(lambda: _spans(n), args.rounds)
+    noop_ns = (t_span - t_empty) / n * 1e9
+    print(f"span() outside a trace     {noop_ns:7.0f} ns/span")
+    with tracing.Span(tracing._Trace(), "bench", None, {}):
+        t_sampled = _best(lambda: _spans(args.count), args.rounds)
+    print(f"span() in a sampled trace  {(t_sampled / args.count - t_empty / n) * 1e9:7.0f} ns/span")
+
+    async def _no_write(sql, params):
+        return None
+
+    # per-frame log lines would dominate the timings
+    logging.getLogger("app.iso_processing").setLevel(logging.WARNING)
+    iso_processing._SINK_ENABLED = False
+    iso_processing._write_rows = _no_write
+    framed = serializer.dumps_str(CARD).encode("utf-8")
+    tracing.SAMPLE_RATE = 1.0
+    asyncio.run(_frames(framed, 1))
+    spans = len(tracing.recent(1)[0]["spans"])
+    for rate in (float(r) for r in args.rates.split(",")):
+        tracing.SAMPLE_RATE = rate
+        tracing.clear()
+        t = _best(lambda: asyncio.run(_frames(framed, args.count)), args.rounds)
+        print(f"  sample rate {rate:<6g}  {t / args.count * 1e6:8.2f} us/frame   {len(tracing.recent(10 ** 9))} traces kept")
+        if rate == 0:
+            print(f"    {spans} no-op spans/frame = {spans * noop_ns / 1000:.2f} us, "
+                  f"{spans * noop_ns / 1000 / (t / args.count * 1e6) * 100:.1f}% of a frame")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# processor/app/bench/velocity.py
+"""
+Cost of app.velocity per authorization at --keys distinct cards (and --keys / 100
+merchants): microseconds per velocity.check() (card + merchant totals, then both
+counted), the memory the store takes, and snapshot save / load time and size.
+
+    python -m app.bench.velocity --keys 1000000 --checks 200000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from app import velocity
+from app.velocity import VelocityStore
+
+
+def _timed(fn) -> float:
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def _store_bytes(store: VelocityStore) -> int:
+    total = 0
+    for shard in store._shards:
+        total += sys.getsizeof(shard.slots) + sys.getsizeof(shard.keys)
+        total += sum(sys.getsizeof(a) for w in shard.windows for a in w.arrays())
+    return total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=200000)
+    parser.add_argument("--checks", type=int, default=100000)
+    parser.add_argument("--shards", type=int, default=velocity.SHARDS)
+    args = parser.parse_args(argv)
+
+    rnd = random.Random(11)
+    cards = [f"4{rnd.randrange(10 ** 15):015d}" for _ in range(args.keys)]
+    merchants = [f"MERCH{n:010d}" for n in range(max(1, args.keys // 100))]
+    seconds = [s for s, _ in velocity.WINDOWS]
+    velocity.LIMITS = {"card": [(0, "count", 10 ** 6), (len(seconds) - 1, "amount", 10 ** 12)],
+                       "merchant": [(len(seconds) - 1, "amount", 10 ** 15)]}
+
+    velocity.STORE = VelocityStore(shards=args.shards)
+    t = _timed(lambda: [velocity.check(card, merchants[n % len(merchants)], 1000) for n, card in enumerate(cards)])
+    store = velocity.STORE
+    memory = _store_bytes(store)
+    print(f"{len(store)} keys, windows {velocity.WINDOWS}, {args.shards} shards: "
+          f"{memory / len(store):.0f} B/key ({memory / 2 ** 20:.1f} MiB)")
+    print(f"  check, new keys          {t / len(cards) * 1e6:7.2f} us")
+
+    picks = [rnd.randrange(len(cards)) for _ in range(args.checks)]
+    t = _timed(lambda: [velocity.check(cards[n], merchants[n % len(merchants)], 1000) for n in picks])
+    print(f"  check, known keys        {t / len(picks) * 1e6:7.2f} us")
+    keys = [store.key("card", cards[n]) for n in picks]
+    t = _timed(lambda: [store.totals(k) for k in keys])
+    print(f"  totals (hash excluded)   {t / len(keys) * 1e6:7.2f} us")
+    t = _timed(lambda: [store.key("card", cards[n]) for n in picks])
+    print(f"  key hash                 {t / len(picks) * 1e6:7.2f} us")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "velocity.snap")
+        t = _timed(lambda: store.save(path))
+        size = os.path.getsize(path)
+        print(f"  snapshot save            {t * 1000:7.1f} ms   {size / 2 ** 20:.1f} MiB")
+        t = _timed(lambda: VelocityStore.load(path))
+        print(f"  snapshot load            {t * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
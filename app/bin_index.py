@@ -0,0 +1,334 @@
+# processor/app/bin_index.py
+"""
+BIN range routing: PAN -> (scheme, issuer connector, product).
+
+A BIN table is a list of account-range rows:
+
+    low,high,scheme,issuer,product
+    4,4,visa,issuer_simulator,credit
+    45399700,45399799,visa,acme_bank,debit
+
+low / high are PAN prefixes of any length. low is right-padded with 0s and high
+with 9s to KEY_DIGITS (12) digits, so "4,4" covers every PAN starting with 4.
+An empty high means high = low. Nested ranges are allowed, and the narrowest
+range covering a PAN wins. Ranges that partly overlap are rejected.
+
+BinIndex flattens the table into disjoint segments held in three flat arrays
+(lows, highs, route number) plus a tuple of distinct routes. A lookup is one
+binary search (bisect in C) over the lows. Each index also memoises, per 8-digit
+BIN seen (up to BIN_MEMO_MAX), the route when the whole BIN falls in one
+segment. Repeat BINs (nearly all traffic) then cost one dict hit; BINs split
+into account ranges always take the binary search.
+
+Files:
+  *.csv  the format above, with a header row (what ops edits)
+  other  the compiled binary layout written by save_binary(). It is mapped with
+         mmap and searched in place, so loading a few hundred thousand ranges
+         takes no parsing and no copies.
+
+BIN_TABLE_FILE names the table. Without it, DEFAULT_RANGES keep the historical
+rule (PANs starting with 4, 5 or 6). The file is re-read when its mtime changes,
+checked at most every BIN_RELOAD_INTERVAL seconds (default 5). A new index is
+built in a background thread and swapped in with one assignment. Until then,
+lookups (including the one that noticed the change) use the previous index, so
+authorizations never wait for a table load. A file that fails to load keeps the
+previous index.
+"""
+import bisect
+import csv
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from app import metrics
+
+LOG = logging.getLogger("processor.bin_index")
+LOG.addHandler(logging.NullHandler())
+
+TABLE_FILE = os.environ.get("BIN_TABLE_FILE", "").strip() or None
+RELOAD_INTERVAL = float(os.environ.get("BIN_RELOAD_INTERVAL", "5"))
+MEMO_MAX = int(os.environ.get("BIN_MEMO_MAX", "1000000"))
+
+KEY_DIGITS = 12
+_BLOCK_DIGITS = 8
+_BLOCK = 10 ** (KEY_DIGITS - _BLOCK_DIGITS)
+
+DEFAULT_RANGES = [
+    ("4", "4", "visa", "issuer_simulator", "default"),
+    ("5", "5", "mastercard", "issuer_simulator", "default"),
+    ("6", "6", "discover", "issuer_simulator", "default"),
+]
+
+# magic, KEY_DIGITS, segment count, routes JSON length; padded to 32 bytes so the arrays are 8-aligned
+_HEADER = struct.Struct("<8sIQQ4x")
+_MAGIC = b"BINIDX01"
+
+_reloads = metrics.counter("bin_index.reloads")
+_reload_errors = metrics.counter("bin_index.reload_errors")
+_ranges = metrics.gauge("bin_index.ranges")
+
+
+class BinRoute(NamedTuple):
+    scheme: str
+    issuer: str
+    product: str
+
+
+_MIXED = object()
+_UNSET = object()
+
+
+def _bound(prefix: str, pad: str) -> int:
+    digits = str(prefix).strip()
+    if not digits.isdigit() or len(digits) > KEY_DIGITS:
+        raise ValueError(f"BIN bound must be 1-{KEY_DIGITS} digits, got {prefix!r}")
+    return int(digits.ljust(KEY_DIGITS, pad))
+
+
+def _flatten(ranges: Iterable[Tuple[int, int, int]]) -> List[Tuple[int, int, int]]:
+    """(low, high, route) ranges, possibly nested -> disjoint segments where the narrowest range wins."""
+    segments = []
+    stack: List[Tuple[int, int, int]] = []
+    pos = 0
+
+    def emit(lo, hi, route):
+        if lo <= hi:
+            if segments and segments[-1][2] == route and segments[-1][1] + 1 == lo:
+                segments[-1] = (segments[-1][0], hi, route)
+            else:
+                segments.append((lo, hi, route))
+
+    # outer ranges before the ranges nested in them
+    for lo, hi, route in sorted(ranges, key=lambda r: (r[0], -r[1])):
+        while stack and stack[-1][1] < lo:
+            top = stack.pop()
+            emit(pos, top[1], top[2])
+            pos = top[1] + 1
+        if stack:
+            if hi > stack[-1][1]:
+                raise ValueError(f"BIN range {lo}-{hi} partly overlaps {stack[-1][0]}-{stack[-1][1]}")
+            emit(pos, lo - 1, stack[-1][2])
+        stack.append((lo, hi, route))
+        pos = lo
+    while stack:
+        top = stack.pop()
+        emit(pos, top[1], top[2])
+        pos = top[1] + 1
+    return segments
+
+
+class BinIndex:
+    """Disjoint BIN segments in flat arrays; lookup(pan) -> BinRoute or None."""
+
+    __slots__ = ("lows", "highs", "route_ids", "routes", "source", "_blocks", "_mmap")
+
+    def __init__(self, lows: Sequence[int], highs: Sequence[int], route_ids: Sequence[int],
+                 routes: Sequence[BinRoute], source: str = "", _mmap=None):
+        self.lows = lows
+        self.highs = highs
+        self.route_ids = route_ids
+        self.routes = tuple(routes)
+        self.source = source
+        self._blocks = {}
+        self._mmap = _mmap
+
+    @classmethod
+    def from_ranges(cls, rows: Iterable[Sequence[str]], source: str = "") -> "BinIndex":
+        """Rows of (low, high, scheme, issuer, product); an empty high means high = low."""
+        route_numbers = {}
+        ranges = []
+        for row in rows:
+            if len(row) != 5:
+                raise ValueError(f"BIN row needs low, high, scheme, issuer, product: {row!r}")
+            low, high, scheme, issuer, product = (str(v).strip() for v in row)
+            lo, hi = _bound(low, "0"), _bound(high or low, "9")
+            if lo > hi:
+                raise ValueError(f"BIN range {low}-{high} is empty")
+            route = BinRoute(scheme, issuer, product)
+            ranges.append((lo, hi, route_numbers.setdefault(route, len(route_numbers))))
+        segments = _flatten(ranges)
+        return cls(array("q", (s[0] for s in segments)), array("q", (s[1] for s in segments)),
+                   array("I", (s[2] for s in segments)), list(route_numbers), source)
+
+    @classmethod
+    def load(cls, path: str) -> "BinIndex":
+        if path.lower().endswith(".csv"):
+            return cls.load_csv(path)
+        return cls.load_binary(path)
+
+    @classmethod
+    def load_csv(cls, path: str) -> "BinIndex":
+        with open(path, newline="", encoding="utf-8") as fh:
+            reader = csv.reader(fh)
+            header = [h.strip().lower() for h in next(reader, [])]
+            if header[:5] != ["low", "high", "scheme", "issuer", "product"]:
+                raise ValueError(f"{path}: header must be low,high,scheme,issuer,product, got {header}")
+            return cls.from_ranges((row[:5] for row in reader if row and any(row)), source=path)
+
+    @classmethod
+    def load_binary(cls, path: str) -> "BinIndex":
+        with open(path, "rb") as fh:
+            mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, digits, count, routes_len = _HEADER.unpack_from(mm, 0)
+            if magic != _MAGIC or digits != KEY_DIGITS:
+                raise ValueError(f"{path} is not a BIN index file (magic {magic!r}, {digits} digits)")
+            offset = _HEADER.size
+            size = count * 8
+            if len(mm) < offset + 2 * size + count * 4 + routes_len:
+                raise ValueError(f"{path} is truncated")
+            ids_at = offset + 2 * size
+            routes_at = ids_at + count * 4
+            routes = [BinRoute(*r) for r in json.loads(bytes(mm[routes_at:routes_at + routes_len]))]
+        except Exception:
+            mm.close()
+            raise
+        # searched in place: the views keep the mapping alive as long as the index
+        view = memoryview(mm)
+        lows = view[offset:offset + size].cast("q")
+        highs = view[offset + size:ids_at].cast("q")
+        route_ids = view[ids_at:routes_at].cast("I")
+        return cls(lows, highs, route_ids, routes, source=path, _mmap=mm)
+
+    def save_binary(self, path: str):
+        """Write the compiled layout that load_binary() maps; written to a temp file, then renamed."""
+        routes = json.dumps([list(r) for r in self.routes]).encode("utf-8")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(_HEADER.pack(_MAGIC, KEY_DIGITS, len(self), len(routes)))
+            for values, typecode in ((self.lows, "q"), (self.highs, "q"), (self.route_ids, "I")):
+                fh.write(array(typecode, values).tobytes())
+            fh.write(routes)
+        os.replace(tmp, path)
+
+    def __len__(self) -> int:
+        return len(self.lows)
+
+    def _search(self, key: int) -> int:
+        i = bisect.bisect_right(self.lows, key) - 1
+        return i if i >= 0 and key <= self.highs[i] else -1
+
+    def _block(self, prefix: str):
+        # the route shared by every PAN in this BIN, None when none is routed, else _MIXED
+        lo = int(prefix) * _BLOCK
+        hi = lo + _BLOCK - 1
+        i = bisect.bisect_right(self.lows, lo) - 1
+        if i >= 0 and self.highs[i] >= hi:
+            found = self.routes[self.route_ids[i]]
+        elif (i < 0 or self.highs[i] < lo) and (i + 1 >= len(self.lows) or self.lows[i + 1] > hi):
+            found = None
+        else:
+            found = _MIXED
+        if len(self._blocks) < MEMO_MAX:
+            self._blocks[prefix] = found
+        return found
+
+    def lookup(self, pan: str) -> Optional[BinRoute]:
+        prefix = pan[:_BLOCK_DIGITS]
+        found = self._blocks.get(prefix, _UNSET)
+        if found is _UNSET:
+            if len(prefix) < _BLOCK_DIGITS or not prefix.isdigit():
+                return self.lookup_key(pan)
+            found = self._block(prefix)
+        if found is _MIXED:
+            return self.lookup_key(pan)
+        return found
+
+    def lookup_key(self, pan: str) -> Optional[BinRoute]:
+        """lookup() without the block memo."""
+        digits = pan[:KEY_DIGITS]
+        if not digits.isdigit():
+            return None
+        if len(digits) < KEY_DIGITS:
+            digits = digits.ljust(KEY_DIGITS, "0")
+        i = self._search(int(digits))
+        return self.routes[self.route_ids[i]] if i >= 0 else None
+
+    def lookup_many(self, pans: Iterable[str]) -> List[Optional[BinRoute]]:
+        get, lookup, digits = self._blocks.get, self.lookup, _BLOCK_DIGITS
+        out = []
+        for pan in pans:
+            found = get(pan[:digits], _UNSET)
+            if found is _UNSET or found is _MIXED:
+                found = lookup(pan)
+            out.append(found)
+        return out
+
+
+class _Current:
+    """The live index plus the table file it came from, swapped atomically on reload."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.index = BinIndex.from_ranges(DEFAULT_RANGES, source="default")
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self._reloader: Optional[threading.Thread] = None
+        if path:
+            self.reload()
+        _ranges.set(len(self.index))
+
+    def reload(self) -> bool:
+        """Re-read the table file; False (and the old index kept) when it cannot be used."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                started = time.perf_counter()
+                index = BinIndex.load(self.path)
+            except (OSError, ValueError, TypeError, struct.error) as e:
+                _reload_errors.inc()
+                LOG.error("BIN table %s not loaded, keeping the previous one: %s", self.path, e)
+                return False
+            self.index, self._mtime = index, mtime
+            _reloads.inc()
+            _ranges.set(len(index))
+            LOG.info("Loaded %d BIN segments from %s in %.1f ms", len(index), self.path,
+                     (time.perf_counter() - started) * 1000.0)
+            return True
+
+    def get(self) -> BinIndex:
+        """The live index; a changed table file is loaded in the background, never here."""
+        if self.path:
+            now = time.monotonic()
+            if now - self._checked >= RELOAD_INTERVAL:
+                self._checked = now
+                try:
+                    changed = os.stat(self.path).st_mtime_ns != self._mtime
+                except OSError:
+                    changed = False
+                if changed and (self._reloader is None or not self._reloader.is_alive()):
+                    self._reloader = threading.Thread(target=self.reload, name="bin-index-reload", daemon=True)
+                    self._reloader.start()
+        return self.index
+
+    def wait(self, timeout: Optional[float] = None):
+        """Wait for a background reload in progress (if any) to finish."""
+        reloader = self._reloader
+        if reloader is not None:
+            reloader.join(timeout)
+
+
+_CURRENT = _Current(TABLE_FILE)
+
+
+def get_index() -> BinIndex:
+    """The live index (picks up table file changes)."""
+    return _CURRENT.get()
+
+
+def use_table_file(path: Optional[str]) -> BinIndex:
+    """Switch to another BIN table (None: DEFAULT_RANGES) and return the new index."""
+    global _CURRENT
+    _CURRENT = _Current(path)
+    return _CURRENT.index
+
+
+def lookup(pan: str) -> Optional[BinRoute]:
+    return get_index().lookup(pan)
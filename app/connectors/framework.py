@@ -0,0 +1,295 @@
+# processor/app/connectors/framework.py
+"""
+Issuer connectors: bounded, timed, circuit-broken calls to issuer backends.
+
+A backend is an async callable payload -> reply dict ({"approved", "de39",
+"gateway_txn_id", ...}); app.connectors.issuer_simulator.authorize is the
+reference one. BACKENDS maps the issuer names used in the BIN table
+(app.bin_index) to backends. IssuerConnector wraps one backend:
+
+  - at most ISSUER_MAX_CONCURRENCY calls in flight (a semaphore per issuer), so a
+    slow issuer holds its own slots and not the whole event loop's capacity;
+  - every call has a deadline (ISSUER_TIMEOUT_MS, or the caller's), and waiting
+    for a slot counts against it;
+  - a circuit breaker opens after ISSUER_BREAKER_FAILURES consecutive timeouts or
+    errors. While open, calls fail fast. After ISSUER_BREAKER_RESET_S one trial
+    call is let through (half-open), and its outcome closes or re-opens it;
+  - with ISSUER_HEDGE=1, a call still unanswered after the p95 of recent latencies
+    (at least ISSUER_HEDGE_MIN_MS) is sent a second time when a slot is free, and
+    the first reply wins. Only enable it for backends that treat a repeated
+    authorization as the same one.
+
+Calls that time out, are short-circuited or raise are answered with a decline:
+de39 ISSUER_DECLINE_DE39 (default 91, issuer unavailable) and an "error" reason.
+authorize() never raises.
+
+With ISSUER_AUTH=1, app.iso_processing sends card authorizations that the BIN
+index routes to an issuer through authorize() and answers with the issuer's
+reply; by default they are approved locally as before.
+
+Settings are ISSUER_<KEY>, overridable per issuer as ISSUER_<NAME>_<KEY>
+(e.g. ISSUER_ACME_BANK_TIMEOUT_MS). Connectors hold asyncio primitives, so
+get_connector() keeps one per event loop and issuer.
+
+Metrics per issuer: issuer.<name>.latency_ms (histogram of backend round trips),
+issuer.<name>.calls / timeouts / errors / short_circuited / hedged / hedge_wins
+(counters), issuer.<name>.inflight and issuer.<name>.breaker_open (gauges).
+"""
+import asyncio
+import logging
+import os
+import time
+import weakref
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+
+from app import metrics, tracing
+from app.connectors import issuer_simulator
+
+LOG = logging.getLogger("processor.connectors")
+LOG.addHandler(logging.NullHandler())
+
+Backend = Callable[[dict], Awaitable[dict]]
+
+BACKENDS: Dict[str, Backend] = {
+    "issuer_simulator": issuer_simulator.authorize,
+}
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+def _setting(issuer: str, key: str, default: str) -> str:
+    specific = f"ISSUER_{issuer.upper().replace('-', '_')}_{key}"
+    return os.environ.get(specific, os.environ.get(f"ISSUER_{key}", default))
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+ENABLED = _flag(os.environ.get("ISSUER_AUTH", "0"))
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open trial call."""
+
+    def __init__(self, failures: int = 5, reset_s: float = 10.0, clock: Callable[[], float] = time.monotonic):
+        self.failures = max(1, failures)
+        self.reset_s = reset_s
+        self.clock = clock
+        self.state = CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and self.clock() - self._opened_at >= self.reset_s:
+            self.state = HALF_OPEN
+            self._trial = False
+        if self.state == HALF_OPEN and not self._trial:
+            self._trial = True
+            return True
+        return False
+
+    def success(self):
+        self.state = CLOSED
+        self._consecutive = 0
+        self._trial = False
+
+    def abandon(self):
+        """The call was cancelled before the issuer answered: no verdict, but free the half-open trial."""
+        if self.state == HALF_OPEN:
+            self._trial = False
+
+    def failure(self):
+        self._consecutive += 1
+        if self.state == HALF_OPEN or self._consecutive >= self.failures:
+            self.state = OPEN
+            self._opened_at = self.clock()
+            self._trial = False
+
+
+class LatencyWindow:
+    """The last `size` latencies (ms); p95 recomputed every `every` observations."""
+
+    __slots__ = ("samples", "every", "_since", "_p95")
+
+    def __init__(self, size: int = 256, every: int = 16):
+        self.samples = deque(maxlen=size)
+        self.every = every
+        self._since = 0
+        self._p95: Optional[float] = None
+
+    def observe(self, ms: float):
+        self.samples.append(ms)
+        self._since += 1
+        if self._since >= self.every:
+            self._since = 0
+            ordered = sorted(self.samples)
+            self._p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    @property
+    def p95(self) -> Optional[float]:
+        return self._p95
+
+
+class IssuerConnector:
+    def __init__(self, name: str, backend: Backend, max_concurrency: int = 64, timeout_ms: float = 1000.0,
+                 breaker_failures: int = 5, breaker_reset_s: float = 10.0, hedge: bool = False,
+                 hedge_min_ms: float = 10.0, decline_de39: str = "91"):
+        self.name = name
+        self.backend = backend
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout = max(0.001, timeout_ms / 1000.0)
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset_s)
+        self.hedge = hedge
+        self.hedge_min_ms = hedge_min_ms
+        self.decline_de39 = decline_de39
+        self.window = LatencyWindow()
+        self._sem = asyncio.Semaphore(self.max_concurrency)
+
+        prefix = f"issuer.{name}"
+        self._latency = metrics.histogram(f"{prefix}.latency_ms")
+        self._calls = metrics.counter(f"{prefix}.calls")
+        self._timeouts = metrics.counter(f"{prefix}.timeouts")
+        self._errors = metrics.counter(f"{prefix}.errors")
+        self._short_circuited = metrics.counter(f"{prefix}.short_circuited")
+        self._hedged = metrics.counter(f"{prefix}.hedged")
+        self._hedge_wins = metrics.counter(f"{prefix}.hedge_wins")
+        self._inflight = metrics.gauge(f"{prefix}.inflight")
+        self._breaker_open = metrics.gauge(f"{prefix}.breaker_open")
+
+    @classmethod
+    def from_env(cls, name: str, backend: Backend) -> "IssuerConnector":
+        return cls(
+            name, backend,
+            max_concurrency=int(_setting(name, "MAX_CONCURRENCY", "64")),
+            timeout_ms=float(_setting(name, "TIMEOUT_MS", "1000")),
+            breaker_failures=int(_setting(name, "BREAKER_FAILURES", "5")),
+            breaker_reset_s=float(_setting(name, "BREAKER_RESET_S", "10")),
+            hedge=_flag(_setting(name, "HEDGE", "0")),
+            hedge_min_ms=float(_setting(name, "HEDGE_MIN_MS", "10")),
+            decline_de39=_setting(name, "DECLINE_DE39", "91"),
+        )
+
+    def decline(self, error: str) -> dict:
+        return {"approved": False, "de39": self.decline_de39, "gateway_txn_id": None, "error": error}
+
+    async def authorize(self, payload: dict, timeout_ms: Optional[float] = None) -> dict:
+        """The backend's reply, or a decline when the issuer is short-circuited, too slow or failing."""
+        with tracing.span("issuer", issuer=self.name) as span:
+            reply = await self._authorize(payload, timeout_ms)
+            if reply.get("error"):
+                span.set(error=reply["error"])
+            return reply
+
+    async def _authorize(self, payload: dict, timeout_ms: Optional[float]) -> dict:
+        if not self.breaker.allow():
+            self._short_circuited.inc()
+            return self.decline("issuer_circuit_open")
+        self._calls.inc()
+        timeout = self.timeout if timeout_ms is None else max(0.0, timeout_ms / 1000.0)
+        try:
+            reply = await asyncio.wait_for(self._call(payload), timeout)
+        except asyncio.TimeoutError:
+            self._timeouts.inc()
+            self._failed()
+            LOG.warning("Issuer %s did not answer within %.0f ms", self.name, timeout * 1000.0)
+            return self.decline("issuer_timeout")
+        except asyncio.CancelledError:
+            # the caller gave up (client gone, outer deadline); a half-open trial must not stay taken
+            self.breaker.abandon()
+            raise
+        except Exception as e:
+            self._errors.inc()
+            self._failed()
+            LOG.warning("Issuer %s call failed: %r", self.name, e)
+            return self.decline("issuer_error")
+        self.breaker.success()
+        self._breaker_open.set(0)
+        return reply if isinstance(reply, dict) else self.decline("issuer_bad_reply")
+
+    def _failed(self):
+        self.breaker.failure()
+        self._breaker_open.set(1 if self.breaker.state == OPEN else 0)
+
+    async def _attempt(self, payload: dict) -> dict:
+        async with self._sem:
+            self._inflight.inc()
+            started = time.perf_counter()
+            try:
+                reply = await self.backend(payload)
+            finally:
+                self._inflight.dec()
+            ms = (time.perf_counter() - started) * 1000.0
+            self._latency.observe(ms)
+            self.window.observe(ms)
+            return reply
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not self.hedge or self.window.p95 is None:
+            return None
+        return max(self.hedge_min_ms, self.window.p95) / 1000.0
+
+    async def _call(self, payload: dict) -> dict:
+        delay = self._hedge_delay()
+        if delay is None:
+            return await self._attempt(payload)
+        first = asyncio.ensure_future(self._attempt(payload))
+        second = None
+        try:
+            done, _ = await asyncio.wait([first], timeout=delay)
+            # no spare slot: a second copy would only queue behind the first
+            if done or self._sem.locked():
+                return await first
+            self._hedged.inc()
+            second = asyncio.ensure_future(self._attempt(payload))
+            pending = {first, second}
+            while True:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._hedge_wins.inc()
+                        return task.result()
+                if not pending:
+                    return first.result()
+        finally:
+            for task in (first, second):
+                if task is not None and not task.done():
+                    task.cancel()
+
+
+_CONNECTORS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, IssuerConnector]]" = \
+    weakref.WeakKeyDictionary()
+
+
+def register_backend(name: str, backend: Backend):
+    """Route issuer `name` (as named in the BIN table) to `backend`; applies to connectors created afterwards."""
+    BACKENDS[name] = backend
+    for connectors in _CONNECTORS.values():
+        connectors.pop(name, None)
+
+
+def get_connector(name: str) -> Optional[IssuerConnector]:
+    """The running loop's connector for issuer `name`; None when no backend is registered for it."""
+    connectors = _CONNECTORS.setdefault(asyncio.get_running_loop(), {})
+    connector = connectors.get(name)
+    if connector is None:
+        backend = BACKENDS.get(name)
+        if backend is None:
+            return None
+        connector = connectors[name] = IssuerConnector.from_env(name, backend)
+    return connector
+
+
+async def authorize(issuer: str, payload: dict, timeout_ms: Optional[float] = None) -> dict:
+    """Authorize `payload` with issuer `issuer`; unknown issuers are declined like unavailable ones."""
+    connector = get_connector(issuer)
+    if connector is None:
+        LOG.warning("No connector for issuer %r", issuer)
+        return {"approved": False, "de39": _setting(issuer, "DECLINE_DE39", "91"), "gateway_txn_id": None,
+                "error": "issuer_unknown"}
+    return await connector.authorize(payload, timeout_ms)
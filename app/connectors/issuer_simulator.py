@@ -1,14 +1,64 @@
 # processor/app/connectors/issuer_simulator.py
 import asyncio
 import logging
+import os
+import random
 from uuid import uuid4
 
 logger = logging.getLogger("app.issuer_simulator")
 logger.setLevel(logging.INFO)
 
+# Latency injection (to exercise timeouts, hedging and stand-in locally): every reply
+# takes ISSUER_SIM_LATENCY_MS plus up to ISSUER_SIM_JITTER_MS; a share of
+# ISSUER_SIM_SPIKE_RATE (0..1) of them takes ISSUER_SIM_SPIKE_MS instead.
+LATENCY_MS = float(os.environ.get("ISSUER_SIM_LATENCY_MS", "50"))
+JITTER_MS = float(os.environ.get("ISSUER_SIM_JITTER_MS", "0"))
+SPIKE_RATE = float(os.environ.get("ISSUER_SIM_SPIKE_RATE", "0"))
+SPIKE_MS = float(os.environ.get("ISSUER_SIM_SPIKE_MS", "5000"))
+# card requests (no authCode) above this amount, in minor units, are declined 51
+MAX_AMOUNT = int(os.environ.get("ISSUER_SIM_MAX_AMOUNT", "100000"))
+
+
+def set_latency(latency_ms: float = 50.0, jitter_ms: float = 0.0, spike_rate: float = 0.0, spike_ms: float = 5000.0):
+    """Change the injected latency at runtime (same meaning as the ISSUER_SIM_* settings)."""
+    global LATENCY_MS, JITTER_MS, SPIKE_RATE, SPIKE_MS
+    LATENCY_MS, JITTER_MS, SPIKE_RATE, SPIKE_MS = latency_ms, jitter_ms, spike_rate, spike_ms
+
+
+def _delay() -> float:
+    if SPIKE_RATE and random.random() < SPIKE_RATE:
+        return SPIKE_MS / 1000.0
+    return (LATENCY_MS + (random.random() * JITTER_MS if JITTER_MS else 0.0)) / 1000.0
+
+
+def _amount_minor(payload: dict):
+    de4 = str(payload.get("4") or "").strip()
+    if de4.isdigit():
+        return int(de4)
+    try:
+        return int(float(payload.get("amount")) * 100)
+    except (TypeError, ValueError):
+        return None
+
+
+def _card_reply(payload: dict) -> dict:
+    # ISO8583 card requests carry no authCode: decide on the PAN and the amount
+    pan = str(payload.get("2") or payload.get("cardNumber") or "")
+    if not (pan.isdigit() and 12 <= len(pan) <= 19):
+        return {"approved": False, "de39": "14", "gateway_txn_id": f"ISS-{uuid4()}"}
+    amount = _amount_minor(payload)
+    if amount is not None and amount > MAX_AMOUNT:
+        return {"approved": False, "de39": "51", "gateway_txn_id": f"ISS-{uuid4()}"}
+    return {"approved": True, "de39": "00", "gateway_txn_id": f"ISS-{uuid4()}",
+            "auth_code": f"{random.randrange(1000000):06d}"}
+
+
 async def authorize(payload: dict) -> dict:
     """
     Very small simulator: approve when authCode exists and does NOT end with '0'.
+    Card requests without an authCode are decided on the PAN (14 unless it is 12-19 digits)
+    and the amount (51 above ISSUER_SIM_MAX_AMOUNT). The injected latency applies to
+    every request.
     """
     try:
         auth = None
@@ -20,11 +70,13 @@ async def authorize(payload: dict) -> dict:
                 auth = payload.get(k)
                 break
 
+        await asyncio.sleep(_delay())
+
         if auth is None:
+            if payload.get("2") or payload.get("cardNumber"):
+                return _card_reply(payload)
             return {"approved": False, "de39": "96", "gateway_txn_id": f"ISS-{uuid4()}"}
 
-        await asyncio.sleep(0.05)
-
         if str(auth).endswith("0"):
             return {"approved": False, "de39": "05", "gateway_txn_id": f"ISS-{uuid4()}"}
         else:
@@ -0,0 +1,274 @@
+# processor/app/dedupe.py
+"""
+Duplicate-transmission detection in front of processing.
+
+Gateways retransmit on timeout. A retransmitted frame carries the same message
+class (MTI, with repeats such as 0101 / 0421 counted as their original 0100 /
+0420), terminal (DE41), STAN (DE11) and txn_id / correlation_id as the original,
+and gets the original response back. It is not processed again, so it never
+reaches the issuer or the database a second time. A reversal reusing its
+authorization's terminal and STAN is a different message and is processed.
+
+Lookup order for a message's key:
+  1. in-flight table: the original is still being processed -> wait for its response;
+  2. LRU (ISO_DEDUPE_MAX_ENTRIES, ISO_DEDUPE_TTL seconds) -> replay;
+  3. Bloom filter of every key this process recorded (or loaded by warm()) in the
+     last 1-2 TTLs -> "never seen" ends the lookup without touching the database
+     (the common case);
+  4. processor_dedupe table (entries evicted from the LRU, or recorded by another
+     worker) -> replay.
+
+The Bloom filter only knows this process's keys. A shared detector (the
+listener behind SO_REUSEPORT, see app.iso_supervisor, where a retransmit on a
+new connection usually lands on another worker) skips step 3 and always asks
+the table.
+
+Responses are recorded in the LRU and, write-behind through an app.event_sink
+EventSink, in processor_dedupe. DE39 96 (system error) responses are not
+recorded, so a retransmit after a transient failure is processed again.
+
+Messages with neither a terminal + STAN nor a txn_id / correlation_id have no key
+and are never treated as duplicates. Keys are BLAKE2b digests, so the table holds
+no PANs.
+
+Metrics: iso.dedupe.hits / misses / inflight_hits / db_hits / db_lookups /
+bloom_negatives (counters), iso.dedupe.entries (gauge).
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+
+from sqlalchemy import text
+
+from app import event_sink, metrics, serializer
+
+LOG = logging.getLogger("processor.dedupe")
+LOG.addHandler(logging.NullHandler())
+
+ENABLED = os.environ.get("ISO_DEDUPE", "1").strip().lower() in ("1", "true", "yes", "on")
+TTL = float(os.environ.get("ISO_DEDUPE_TTL", "300"))
+MAX_ENTRIES = int(os.environ.get("ISO_DEDUPE_MAX_ENTRIES", "100000"))
+BLOOM_CAPACITY = int(os.environ.get("ISO_DEDUPE_BLOOM_CAPACITY", "1000000"))
+BLOOM_ERROR_RATE = float(os.environ.get("ISO_DEDUPE_BLOOM_ERROR_RATE", "0.001"))
+DB_FALLBACK = os.environ.get("ISO_DEDUPE_DB", "1").strip().lower() in ("1", "true", "yes", "on")
+
+_hits = metrics.counter("iso.dedupe.hits")
+_misses = metrics.counter("iso.dedupe.misses")
+_inflight_hits = metrics.counter("iso.dedupe.inflight_hits")
+_db_hits = metrics.counter("iso.dedupe.db_hits")
+_db_lookups = metrics.counter("iso.dedupe.db_lookups")
+_bloom_negatives = metrics.counter("iso.dedupe.bloom_negatives")
+_entries = metrics.gauge("iso.dedupe.entries")
+
+
+def message_class(msg: dict) -> str:
+    """The MTI with the repeat flag cleared (0101 -> 0100, 0421 -> 0420); the type for MTI-less messages."""
+    fields = msg.get("fields") if isinstance(msg.get("fields"), dict) else msg
+    mti = str(msg.get("mti") or fields.get("mti") or "")
+    if len(mti) == 4 and mti.isdigit():
+        return mti[:3] + str(int(mti[3]) & ~1)
+    return mti or str(msg.get("type") or "")
+
+
+def message_key(msg: dict) -> Optional[bytes]:
+    """(message class, terminal, STAN, txn_id / correlation_id) of a decoded message, hashed; None when it has none."""
+    fields = msg.get("fields") if isinstance(msg.get("fields"), dict) else msg
+    terminal = fields.get("41") or msg.get("terminal_id") or ""
+    stan = fields.get("11") or msg.get("stan") or ""
+    ref = msg.get("txn_id") or fields.get("txn_id") or msg.get("correlation_id") or fields.get("correlation_id") or ""
+    if not ref and not (terminal and stan):
+        return None
+    return hashlib.blake2b(f"{message_class(msg)}|{terminal}|{stan}|{ref}".encode("utf-8"), digest_size=16).digest()
+
+
+def _copy(resp: dict) -> dict:
+    # replays must not share the recorded response's dicts with the caller
+    fields = resp.get("fields")
+    return {**resp, "fields": dict(fields)} if isinstance(fields, dict) else dict(resp)
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over byte keys (k indexes by double hashing one BLAKE2b digest)."""
+
+    __slots__ = ("bits", "size", "hashes", "count")
+
+    def __init__(self, capacity: int, error_rate: float = 0.001):
+        capacity = max(1, capacity)
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _indexes(self, key: bytes):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hashes)]
+
+    def add(self, key: bytes):
+        bits = self.bits
+        for i in self._indexes(key):
+            bits[i >> 3] |= 1 << (i & 7)
+        self.count += 1
+
+    def __contains__(self, key: bytes) -> bool:
+        bits = self.bits
+        return all(bits[i >> 3] & (1 << (i & 7)) for i in self._indexes(key))
+
+
+class DedupeStore:
+    """processor_dedupe rows: write-behind inserts through an EventSink, point lookups by key."""
+
+    _INSERT = text("INSERT INTO processor_dedupe (key, response, created_at) VALUES (:key, :response, :created_at) "
+                   "ON CONFLICT (key) DO NOTHING")
+    _SELECT = text("SELECT response FROM processor_dedupe WHERE key = :key AND created_at >= :cutoff")
+    _RECENT = text("SELECT key FROM processor_dedupe WHERE created_at >= :cutoff")
+
+    def __init__(self, session_factory: Callable):
+        self.session_factory = session_factory
+
+    async def put(self, key: bytes, response: dict):
+        row = {"key": key.hex(), "response": serializer.dumps_str(response),
+               "created_at": datetime.utcnow().isoformat()}
+        await event_sink.get_sink(self.session_factory, self._INSERT).submit(row)
+
+    async def get(self, key: bytes, ttl: float) -> Optional[dict]:
+        cutoff = (datetime.utcnow() - timedelta(seconds=ttl)).isoformat()
+        async with self.session_factory() as session:
+            row = (await session.execute(self._SELECT, {"key": key.hex(), "cutoff": cutoff})).first()
+        return serializer.loads(row[0]) if row else None
+
+    async def recent_keys(self, ttl: float):
+        cutoff = (datetime.utcnow() - timedelta(seconds=ttl)).isoformat()
+        async with self.session_factory() as session:
+            rows = (await session.execute(self._RECENT, {"cutoff": cutoff})).all()
+        return [bytes.fromhex(row[0]) for row in rows]
+
+
+class DuplicateDetector:
+    def __init__(self, ttl: float = TTL, max_entries: int = MAX_ENTRIES, bloom_capacity: int = BLOOM_CAPACITY,
+                 bloom_error_rate: float = BLOOM_ERROR_RATE, store: Optional[DedupeStore] = None,
+                 shared: bool = False):
+        self.ttl = ttl
+        # other processes record keys too: a Bloom negative does not mean "never seen"
+        self.shared = shared
+        self.max_entries = max(1, max_entries)
+        self.store = store
+        self._bloom_args = (bloom_capacity, bloom_error_rate)
+        # two generations: keys recorded in the current and the previous TTL period
+        self._bloom = BloomFilter(*self._bloom_args)
+        self._old_bloom = BloomFilter(1, bloom_error_rate)
+        self._rotated_at = time.monotonic()
+        self._lru: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._inflight: Dict[bytes, asyncio.Future] = {}
+
+    async def run(self, msg: dict, process: Callable[[], Awaitable[dict]]) -> dict:
+        """process()'s response for msg, or the recorded response of its original transmission."""
+        key = message_key(msg)
+        if key is None:
+            return await process()
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            _inflight_hits.inc()
+            LOG.info("Retransmission of a message still in flight; waiting for the original response")
+            await asyncio.wait([inflight])
+            if not inflight.cancelled() and inflight.exception() is None:
+                return _copy(inflight.result())
+            # the original failed: process this transmission on its own
+            return await self.run(msg, process)
+        # registered before the lookup, so a retransmit arriving meanwhile waits for this one
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        fresh = False
+        try:
+            resp = await self.lookup(key)
+            if resp is None:
+                _misses.inc()
+                resp = await process()
+                fresh = True
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+                fut.exception()  # retrieved: nobody else may be waiting
+            raise
+        finally:
+            del self._inflight[key]
+        fut.set_result(resp)
+        if fresh:
+            await self.record(key, resp)
+        return resp
+
+    async def warm(self) -> int:
+        """Seed the Bloom filter with keys the database recorded within the TTL (e.g. before a restart)."""
+        if self.store is None:
+            return 0
+        try:
+            keys = await self.store.recent_keys(self.ttl)
+        except Exception as e:
+            LOG.warning("Could not load recent dedupe keys: %r", e)
+            return 0
+        for key in keys:
+            self._bloom.add(key)
+        return len(keys)
+
+    async def lookup(self, key: bytes) -> Optional[dict]:
+        now = time.monotonic()
+        entry = self._lru.get(key)
+        if entry is not None:
+            expires, resp = entry
+            if expires > now:
+                self._lru.move_to_end(key)
+                _hits.inc()
+                return _copy(resp)
+            del self._lru[key]
+        self._rotate(now)
+        if key not in self._bloom and key not in self._old_bloom:
+            _bloom_negatives.inc()
+            if not self.shared:
+                return None
+        if self.store is None:
+            return None
+        _db_lookups.inc()
+        try:
+            resp = await self.store.get(key, self.ttl)
+        except Exception as e:
+            LOG.warning("Dedupe DB lookup failed, treating as new: %r", e)
+            return None
+        if resp is None:
+            return None
+        _hits.inc()
+        _db_hits.inc()
+        self._remember(key, resp, now)
+        return _copy(resp)
+
+    async def record(self, key: bytes, resp: dict):
+        if str((resp.get("fields") or {}).get("39")) == "96":
+            return
+        self._remember(key, resp, time.monotonic())
+        self._bloom.add(key)
+        if self.store is not None:
+            try:
+                await self.store.put(key, resp)
+            except Exception as e:
+                LOG.warning("Dedupe DB write failed: %r", e)
+
+    def _remember(self, key: bytes, resp: dict, now: float):
+        self._lru[key] = (now + self.ttl, resp)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+        _entries.set(len(self._lru))
+
+    def _rotate(self, now: float):
+        if now - self._rotated_at >= self.ttl:
+            self._old_bloom, self._bloom = self._bloom, BloomFilter(*self._bloom_args)
+            self._rotated_at = now
@@ -0,0 +1,220 @@
+# processor/app/event_sink.py
+"""
+Write-behind, group-committed event writer.
+
+persist_event() used to run one INSERT and one commit per event inside the
+authorization round-trip. An EventSink queues the rows instead, and a background
+task writes them in batches: one executemany INSERT and one commit per batch.
+A batch is flushed when it reaches EVENT_SINK_MAX_BATCH rows, or
+EVENT_SINK_MAX_DELAY_MS after its first row was queued, or straight away when a
+caller is waiting for it.
+
+  - submit(row, wait=False) returns as soon as the row is queued (write-behind).
+  - submit(row, wait=True) returns once the batch holding the row is committed,
+    and raises if the batch could not be written. A durable row never waits for
+    the delay. Rows that arrive while a batch is being committed go into the next
+    batch, so concurrent durable callers share commits.
+  - flush() waits until everything queued so far is committed.
+  - close() stops accepting rows and writes out everything still queued.
+
+When EVENT_SINK_MAX_QUEUE rows are already waiting, submit() waits for the
+commit even when wait=False, which pushes back on the caller.
+
+A failed batch is retried EVENT_SINK_RETRIES times with backoff. After that its
+durable callers get the error, and write-behind rows are logged and dropped
+(event_sink.dropped).
+
+Metrics: event_sink.queue_depth (gauge), event_sink.flush_ms and
+event_sink.batch_size (histograms), event_sink.events / flushes / errors / dropped
+(counters).
+
+A sink belongs to the event loop it was created on. get_sink() keeps one per loop
+and INSERT statement, because the embedded listener and the HTTP app run separate loops.
+"""
+import asyncio
+import logging
+import os
+import time
+import weakref
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from app import metrics
+
+LOG = logging.getLogger("processor.event_sink")
+LOG.addHandler(logging.NullHandler())
+
+ENABLED = os.environ.get("EVENT_SINK_ENABLED", "1").strip().lower() in ("1", "true", "yes", "on")
+MAX_BATCH = int(os.environ.get("EVENT_SINK_MAX_BATCH", "256"))
+MAX_DELAY_MS = float(os.environ.get("EVENT_SINK_MAX_DELAY_MS", "5"))
+MAX_QUEUE = int(os.environ.get("EVENT_SINK_MAX_QUEUE", "10000"))
+RETRIES = int(os.environ.get("EVENT_SINK_RETRIES", "3"))
+
+_queue_depth = metrics.gauge("event_sink.queue_depth")
+_flush_ms = metrics.histogram("event_sink.flush_ms")
+_batch_size = metrics.histogram("event_sink.batch_size", (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+_events = metrics.counter("event_sink.events")
+_flushes = metrics.counter("event_sink.flushes")
+_errors = metrics.counter("event_sink.errors")
+_dropped = metrics.counter("event_sink.dropped")
+
+
+class SinkClosed(RuntimeError):
+    pass
+
+
+class EventSink:
+    """
+    Batches rows for `insert_sql` (a SQLAlchemy text() with named parameters) and writes
+    them through `session_factory()`, an async context manager yielding an AsyncSession.
+    """
+
+    def __init__(self, session_factory: Callable, insert_sql, max_batch: Optional[int] = None,
+                 max_delay_ms: Optional[float] = None, max_queue: Optional[int] = None,
+                 retries: Optional[int] = None):
+        self.session_factory = session_factory
+        self.insert_sql = insert_sql
+        self.max_batch = max(1, MAX_BATCH if max_batch is None else max_batch)
+        self.max_delay = (MAX_DELAY_MS if max_delay_ms is None else max_delay_ms) / 1000.0
+        self.max_queue = max(self.max_batch, MAX_QUEUE if max_queue is None else max_queue)
+        self.retries = RETRIES if retries is None else retries
+        self._queue: Deque[Tuple[dict, Optional[asyncio.Future]]] = deque()
+        self._wakeup = asyncio.Event()
+        # resolved when the row queued last at the time of the call has been handled
+        self._idle: List[Tuple[int, asyncio.Future]] = []
+        self._queued = 0
+        # queued rows whose caller awaits the commit
+        self._waiters = 0
+        self._done = 0
+        self._task: Optional[asyncio.Task] = None
+        self._closed = False
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    async def submit(self, row: dict, wait: bool = False):
+        """Queue one row; with wait (or when the queue is full) return only once it is committed."""
+        if self._closed:
+            raise SinkClosed("event sink is closed")
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="event-sink")
+        fut = asyncio.get_running_loop().create_future() if wait or len(self._queue) >= self.max_queue else None
+        self._queue.append((row, fut))
+        self._queued += 1
+        _events.inc()
+        _queue_depth.inc()
+        if fut is not None:
+            self._waiters += 1
+        if fut is not None or len(self._queue) == 1 or len(self._queue) >= self.max_batch:
+            self._wakeup.set()
+        if fut is not None:
+            await fut
+
+    async def flush(self):
+        """Wait until every row queued before this call has been written (or dropped)."""
+        if self._done >= self._queued:
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._idle.append((self._queued, fut))
+        self._wakeup.set()
+        await fut
+
+    async def close(self):
+        """Refuse new rows, write out the queue and stop the writer task."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._task is None:
+            return
+        await self.flush()
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        LOG.info("Event sink closed (%d events written or dropped)", self._done)
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # give the batch until max_delay to fill unless it is full, someone awaits it or we are draining
+            if len(self._queue) < self.max_batch and not self._waiters and not self._closed and not self._idle:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.max_delay)
+                except asyncio.TimeoutError:
+                    pass
+            batch = [self._queue.popleft() for _ in range(min(len(self._queue), self.max_batch))]
+            self._waiters -= sum(1 for _, fut in batch if fut is not None)
+            if batch:
+                await self._write(batch)
+
+    async def _write(self, batch: List[Tuple[dict, Optional[asyncio.Future]]]):
+        rows = [row for row, _ in batch]
+        error = None
+        for attempt in range(self.retries + 1):
+            started = time.perf_counter()
+            try:
+                async with self.session_factory() as session:
+                    await session.execute(self.insert_sql, rows)
+                    await session.commit()
+                error = None
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                _errors.inc()
+                LOG.warning("Event sink batch of %d failed (attempt %d/%d): %r",
+                            len(rows), attempt + 1, self.retries + 1, e)
+                if attempt < self.retries:
+                    await asyncio.sleep(min(0.05 * 2 ** attempt, 1.0))
+            finally:
+                _flush_ms.observe((time.perf_counter() - started) * 1000.0)
+        _flushes.inc()
+        _batch_size.observe(len(rows))
+        _queue_depth.dec(len(rows))
+        for row, fut in batch:
+            if fut is None:
+                if error is not None:
+                    _dropped.inc()
+                    LOG.error("Dropped event topic=%s id=%s: %r", row.get("topic"), row.get("id"), error)
+            elif not fut.done():
+                if error is None:
+                    fut.set_result(None)
+                else:
+                    fut.set_exception(error)
+        self._done += len(batch)
+        self._release_flushers()
+
+    def _release_flushers(self):
+        still_waiting = []
+        for mark, fut in self._idle:
+            if self._done >= mark:
+                if not fut.done():
+                    fut.set_result(None)
+            else:
+                still_waiting.append((mark, fut))
+        self._idle = still_waiting
+
+
+_SINKS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, EventSink]]" = weakref.WeakKeyDictionary()
+
+
+def get_sink(session_factory: Callable, insert_sql) -> EventSink:
+    """The running loop's sink for insert_sql (one per statement), created on first use."""
+    sinks = _SINKS.setdefault(asyncio.get_running_loop(), {})
+    key = str(insert_sql)
+    sink = sinks.get(key)
+    if sink is None or sink._closed:
+        sink = sinks[key] = EventSink(session_factory, insert_sql)
+    return sink
+
+
+async def close_sink():
+    """Drain and close the running loop's sinks, if it has any."""
+    for sink in list(_SINKS.pop(asyncio.get_running_loop(), {}).values()):
+        await sink.close()
@@ -0,0 +1,144 @@
+# processor/app/iban.py
+"""
+IBAN and BIC validation for payout beneficiaries.
+
+An IBAN is checked against REGISTRY, the per-country BBAN structure from the
+SWIFT IBAN registry in its own notation:
+
+    "DE": "8n10n"    ->  DE + 2 check digits + 8 digits + 10 digits (22 chars)
+
+where n = digits, a = upper-case letters, c = letters or digits. Each entry is
+compiled once at import into the total length and one anchored regex.
+
+The mod-97 checksum (ISO 7064) maps letters to their two-digit values with one
+str.translate and folds the digits into the remainder 9 at a time, so no
+intermediate value outgrows a machine word (the whole number would be up to 68
+digits). python -m app.bench.iban compares it with a single int() % 97.
+
+check_iban() returns a reason ("country", "length", "format", "checksum") or None.
+Results are kept in an LRU cache of IBAN_CACHE_SIZE entries (default 65536),
+keyed by the value as received, so repeat beneficiaries cost one cache hit.
+check_ibans() does a whole bulk payout file in one call.
+
+BICs (ISO 9362) are 8 or 11 chars: 4 letters (institution), 2 letters (country),
+2 alphanumerics (location), and an optional 3-char branch.
+"""
+import os
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+CACHE_SIZE = int(os.environ.get("IBAN_CACHE_SIZE", "65536"))
+
+REGISTRY = {
+    "AD": "4n4n12c", "AE": "3n16n", "AL": "8n16c", "AT": "5n11n", "AZ": "4a20c", "BA": "3n3n8n2n", "BE": "3n7n2n",
+    "BG": "4a4n2n8c", "BH": "4a14c", "BI": "5n5n11n2n", "BR": "8n5n10n1a1c", "BY": "4c4n16c", "CH": "5n12c",
+    "CR": "4n14n", "CY": "3n5n16c", "CZ": "4n6n10n", "DE": "8n10n", "DJ": "5n5n11n2n", "DK": "4n9n1n",
+    "DO": "4c20n", "EE": "2n2n11n1n", "EG": "4n4n17n", "ES": "4n4n1n1n10n", "FI": "3n11n", "FK": "2a12n",
+    "FO": "4n9n1n", "FR": "5n5n11c2n", "GB": "4a6n8n", "GE": "2a16n", "GI": "4a15c", "GL": "4n9n1n",
+    "GR": "3n4n16c", "GT": "4c20c", "HN": "4a20n", "HR": "7n10n", "HU": "3n4n1n15n1n", "IE": "4a6n8n",
+    "IL": "3n3n13n", "IQ": "4a3n12n", "IS": "4n2n6n10n", "IT": "1a5n5n12c", "JO": "4a4n18c", "KW": "4a22c",
+    "KZ": "3n13c", "LB": "4n20c", "LC": "4a24c", "LI": "5n12c", "LT": "5n11n", "LU": "3n13c", "LV": "4a13c",
+    "LY": "3n3n15n", "MC": "5n5n11c2n", "MD": "2c18c", "ME": "3n13n2n", "MK": "3n10c2n", "MN": "4n12n",
+    "MR": "5n5n11n2n", "MT": "4a5n18c", "MU": "4a2n2n12n3n3a", "NI": "4a20n", "NL": "4a10n", "NO": "4n6n1n",
+    "OM": "3n16c", "PK": "4a16c", "PL": "8n16n", "PS": "4a21c", "PT": "4n4n11n2n", "QA": "4a21c", "RO": "4a16c",
+    "RS": "3n13n2n", "RU": "9n5n15c", "SA": "2n18c", "SC": "4a2n2n16n3a", "SD": "2n12n", "SE": "3n16n1n",
+    "SI": "5n8n2n", "SK": "4n6n10n", "SM": "1a5n5n12c", "SO": "4n3n12n", "ST": "4n4n11n2n", "SV": "4a20n",
+    "TL": "3n14n2n", "TN": "2n3n13n2n", "TR": "5n1n16c", "UA": "6n19c", "VA": "3n15n", "VG": "4a16n",
+    "XK": "4n10n2n", "YE": "4a4n18c",
+}
+
+_CLASSES = {"n": "[0-9]", "a": "[A-Z]", "c": "[A-Z0-9]"}
+_BIC = re.compile(r"[A-Z]{4}[A-Z]{2}[A-Z0-9]{2}(?:[A-Z0-9]{3})?")
+# A=10 ... Z=35
+_LETTERS = str.maketrans({chr(ord("A") + i): str(10 + i) for i in range(26)})
+# 10**n % 97 for chunk lengths 0..9
+_SHIFT = [10 ** n % 97 for n in range(10)]
+
+
+def _compile(spec: str) -> Tuple[int, "re.Pattern"]:
+    parts = re.findall(r"(\d+)([nac])", spec)
+    if "".join(n + k for n, k in parts) != spec:
+        raise ValueError(f"bad BBAN spec {spec!r}")
+    pattern = "".join(f"{_CLASSES[kind]}{{{count}}}" for count, kind in parts)
+    return 4 + sum(int(count) for count, _ in parts), re.compile(f"[0-9]{{2}}{pattern}")
+
+
+_COMPILED: Dict[str, Tuple[int, "re.Pattern"]] = {country: _compile(spec) for country, spec in REGISTRY.items()}
+
+
+def normalize(value: str) -> str:
+    return value.replace(" ", "").upper()
+
+
+def mod97(alnum: str) -> int:
+    """ISO 7064 mod 97-10 of an upper-case alphanumeric string."""
+    digits = alnum.translate(_LETTERS)
+    remainder = 0
+    for i in range(0, len(digits), 9):
+        chunk = digits[i:i + 9]
+        remainder = (remainder * _SHIFT[len(chunk)] + int(chunk)) % 97
+    return remainder
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _check(value: str) -> Optional[str]:
+    iban = normalize(value)
+    entry = _COMPILED.get(iban[:2])
+    if entry is None:
+        return "country"
+    length, bban = entry
+    if len(iban) != length:
+        return "length"
+    if bban.fullmatch(iban, 2) is None:
+        return "format"
+    if mod97(iban[4:] + iban[:4]) != 1:
+        return "checksum"
+    return None
+
+
+def check_iban(value) -> Optional[str]:
+    """Why `value` is not a valid IBAN, or None. Spaces and letter case are ignored."""
+    if not isinstance(value, str):
+        return "format"
+    return _check(value)
+
+
+def is_valid_iban(value) -> bool:
+    return check_iban(value) is None
+
+
+def check_ibans(values: Iterable) -> List[Optional[str]]:
+    """check_iban() over a bulk file; repeated beneficiaries are validated once."""
+    seen: Dict[str, Optional[str]] = {}
+    out = []
+    for value in values:
+        if not isinstance(value, str):
+            out.append("format")
+            continue
+        reason = seen.get(value, seen)
+        if reason is seen:
+            reason = seen[value] = _check(value)
+        out.append(reason)
+    return out
+
+
+def check_bic(value) -> Optional[str]:
+    """Why `value` is not a valid BIC, or None."""
+    if not isinstance(value, str):
+        return "format"
+    return None if _BIC.fullmatch(normalize(value)) else "format"
+
+
+def is_valid_bic(value) -> bool:
+    return check_bic(value) is None
+
+
+def make_iban(country: str, bban: str) -> str:
+    """country + check digits + bban (test data and benchmarks)."""
+    check = 98 - mod97(bban.upper() + country.upper() + "00")
+    return f"{country.upper()}{check:02d}{bban.upper()}"
+
+
+def cache_info():
+    return _check.cache_info()
@@ -0,0 +1,229 @@
+# processor/app/iso8583_binary.py
+"""
+Binary ISO8583: ASCII MTI, binary primary/secondary bitmaps, then the data elements
+in field order as fixed, LLVAR or LLLVAR fields (ASCII length digits).
+
+Field layouts are declared once in FIELD_SPEC and compiled into per-field lookup
+tables (length-prefix width, fixed length / max length, pad and convert functions),
+so encode/decode is a loop over the bitmap with no branching on type strings. The
+payload is handled as one latin-1 string, so text fields cost a slice each.
+Binary ("b") fields are carried as hex strings in the message dict; everything else
+is text.
+
+Importing this module registers the "binary" codec with app.iso_codec.
+"""
+from typing import Dict, Tuple
+
+from app.iso_codec import Codec, register_codec
+
+# field -> (type, layout, length). type: n numeric, an/ans text, z track data, b binary
+# (length in bytes); layout: FIXED, LLVAR, LLLVAR (length = maximum for variable fields).
+FIELD_SPEC: Dict[int, Tuple[str, str, int]] = {
+    2: ("n", "LLVAR", 19),      # PAN
+    3: ("n", "FIXED", 6),       # processing code
+    4: ("n", "FIXED", 12),      # amount, transaction
+    5: ("n", "FIXED", 12),      # amount, settlement
+    6: ("n", "FIXED", 12),      # amount, cardholder billing
+    7: ("n", "FIXED", 10),      # transmission date & time MMDDhhmmss
+    11: ("n", "FIXED", 6),      # STAN
+    12: ("n", "FIXED", 6),      # local time hhmmss
+    13: ("n", "FIXED", 4),      # local date MMDD
+    14: ("n", "FIXED", 4),      # expiry YYMM
+    15: ("n", "FIXED", 4),      # settlement date
+    18: ("n", "FIXED", 4),      # merchant category code
+    19: ("n", "FIXED", 3),      # acquiring institution country
+    22: ("n", "FIXED", 3),      # POS entry mode
+    23: ("n", "FIXED", 3),      # card sequence number
+    25: ("n", "FIXED", 2),      # POS condition code
+    26: ("n", "FIXED", 2),      # POS PIN capture code
+    32: ("n", "LLVAR", 11),     # acquiring institution id
+    33: ("n", "LLVAR", 11),     # forwarding institution id
+    35: ("z", "LLVAR", 37),     # track 2
+    37: ("an", "FIXED", 12),    # RRN
+    38: ("an", "FIXED", 6),     # authorization id response
+    39: ("an", "FIXED", 2),     # response code
+    41: ("ans", "FIXED", 8),    # terminal id
+    42: ("ans", "FIXED", 15),   # merchant id
+    43: ("ans", "FIXED", 40),   # card acceptor name/location
+    44: ("ans", "LLVAR", 25),   # additional response data
+    45: ("ans", "LLVAR", 76),   # track 1
+    48: ("ans", "LLLVAR", 999),  # additional data, private
+    49: ("n", "FIXED", 3),      # currency, transaction
+    50: ("n", "FIXED", 3),      # currency, settlement
+    51: ("n", "FIXED", 3),      # currency, cardholder billing
+    52: ("b", "FIXED", 8),      # PIN block
+    53: ("n", "FIXED", 16),     # security related control information
+    54: ("ans", "LLLVAR", 120),  # additional amounts
+    55: ("b", "LLLVAR", 255),   # ICC / EMV data
+    60: ("ans", "LLLVAR", 999),
+    61: ("ans", "LLLVAR", 999),
+    62: ("ans", "LLLVAR", 999),
+    63: ("ans", "LLLVAR", 999),
+    64: ("b", "FIXED", 8),      # MAC
+    70: ("n", "FIXED", 3),      # network management information code
+    90: ("n", "FIXED", 42),     # original data elements
+    95: ("an", "FIXED", 42),    # replacement amounts
+    100: ("n", "LLVAR", 11),    # receiving institution id
+    102: ("ans", "LLVAR", 28),  # account id 1
+    103: ("ans", "LLVAR", 28),  # account id 2
+    123: ("ans", "LLLVAR", 999),
+    127: ("ans", "LLLVAR", 999),
+    128: ("b", "FIXED", 8),     # secondary MAC
+}
+
+_PREFIX_WIDTH = {"FIXED": 0, "LLVAR": 2, "LLLVAR": 3}
+
+
+def _text(value) -> str:
+    return value if type(value) is str else str(value)
+
+
+def _binary(value) -> str:
+    # binary fields travel as hex in the message dict; latin-1 maps bytes 1:1 onto str
+    raw = value if isinstance(value, (bytes, bytearray)) else bytes.fromhex(str(value))
+    return raw.decode("latin-1")
+
+
+def _no_pad(text: str, length: int) -> str:
+    return text
+
+
+def _pad_numeric(text: str, length: int) -> str:
+    return text.rjust(length, "0")
+
+
+def _pad_text(text: str, length: int) -> str:
+    return text.ljust(length)
+
+
+def compile_spec(spec: Dict[int, Tuple[str, str, int]]):
+    """
+    Compile a FIELD_SPEC-style dict into (decode_table, encode_table), both lists indexed
+    by field number (1..128) holding None for undefined fields:
+      decode entry: (key, prefix_width, length, is_binary)
+      encode entry: (prefix_width, length, to_text, pad)
+    """
+    decode_table = [None] * 129
+    encode_table = [None] * 129
+    for field, (ftype, layout, length) in spec.items():
+        if not 2 <= field <= 128 or field == 65:
+            raise ValueError(f"field {field} cannot be defined (1 and 65 are bitmaps)")
+        width = _PREFIX_WIDTH[layout]
+        binary = ftype == "b"
+        if width or binary:
+            pad = _no_pad
+        elif ftype == "n":
+            pad = _pad_numeric
+        else:
+            pad = _pad_text
+        decode_table[field] = (str(field), width, length, binary)
+        encode_table[field] = (width, length, _binary if binary else _text, pad)
+    return decode_table, encode_table
+
+
+_DECODE, _ENCODE = compile_spec(FIELD_SPEC)
+
+# bit positions (1-based within the byte, MSB first) set in each byte value
+_BITS = [tuple(i + 1 for i in range(8) if b & (0x80 >> i)) for b in range(256)]
+
+
+def decode(payload: bytes, table=None) -> dict:
+    """Binary ISO8583 payload -> {"mti": "0200", "fields": {"2": ..., ...}}. Raises ValueError."""
+    table = table or _DECODE
+    size = len(payload)
+    if size < 12:
+        raise ValueError("binary ISO8583 payload too short")
+    # latin-1 keeps str offsets equal to byte offsets, so text fields are plain str slices
+    text = bytes(payload).decode("latin-1")
+    mti = text[:4]
+    if not mti.isdigit():
+        raise ValueError(f"invalid MTI {mti!r}")
+    pos = 12
+    bitmap = payload[4:12]
+    if bitmap[0] & 0x80:
+        if size < 20:
+            raise ValueError("secondary bitmap truncated")
+        bitmap = payload[4:20]
+        pos = 20
+
+    fields = {}
+    field = 0
+    for byte in bitmap:
+        for bit in _BITS[byte]:
+            entry = table[field + bit]
+            if entry is None:
+                if field + bit in (1, 65):
+                    continue
+                raise ValueError(f"field {field + bit} present but not defined in the field spec")
+            key, width, n, binary = entry
+            if width:
+                digits = text[pos:pos + width]
+                if len(digits) != width or not digits.isdigit():
+                    raise ValueError(f"field {key}: bad length prefix {digits!r}")
+                pos += width
+                if int(digits) > n:
+                    raise ValueError(f"field {key}: length {digits} exceeds max {n}")
+                n = int(digits)
+            end = pos + n
+            if end > size:
+                raise ValueError(f"field {key}: truncated")
+            fields[key] = text[pos:end].encode("latin-1").hex() if binary else text[pos:end]
+            pos = end
+        field += 8
+    if pos != size:
+        raise ValueError(f"{size - pos} trailing bytes after last field")
+    return {"mti": mti, "fields": fields}
+
+
+def encode(mti: str, fields: dict, table=None) -> bytes:
+    """Encode fields (keys "2".."128"; non-numeric keys are skipped) as binary ISO8583."""
+    table = table or _ENCODE
+    if not isinstance(mti, str) or len(mti) != 4 or not mti.isdigit():
+        raise ValueError("MTI must be a 4-digit string")
+    numbered = sorted((int(k), v) for k, v in fields.items() if str(k).isdigit())
+    bitmap = 0
+    parts = []
+    for field, value in numbered:
+        if field == 1 or field == 65:
+            continue
+        entry = table[field] if field <= 128 else None
+        if entry is None:
+            raise ValueError(f"field {field} not defined in the field spec")
+        width, length, to_text, pad = entry
+        raw = to_text(value)
+        if width:
+            if len(raw) > length:
+                raise ValueError(f"field {field}: length {len(raw)} exceeds max {length}")
+            parts.append("%0*d" % (width, len(raw)))
+        else:
+            raw = pad(raw, length)
+            if len(raw) != length:
+                raise ValueError(f"field {field}: expected {length} bytes, got {len(raw)}")
+        parts.append(raw)
+        bitmap |= 1 << (128 - field)
+    if bitmap & ((1 << 64) - 1):
+        bitmap |= 1 << 127  # secondary bitmap present
+        head = bitmap.to_bytes(16, "big")
+    else:
+        head = (bitmap >> 64).to_bytes(8, "big")
+    try:
+        body = "".join(parts).encode("latin-1")
+    except UnicodeEncodeError as e:
+        raise ValueError(f"field value outside latin-1: {e}") from None
+    return mti.encode("ascii") + head + body
+
+
+def _match(payload: bytes) -> bool:
+    # ASCII MTI followed by a bitmap rather than the legacy JSON body (MTI+JSON, MTI+len+JSON)
+    head = payload[:4]
+    return len(head) == 4 and head.isdigit() and len(payload) >= 12 and payload[4:5] != b"{" and payload[8:9] != b"{"
+
+
+def _encode_response(resp: dict) -> bytes:
+    fields = {k: v for k, v in resp.get("fields", {}).items()
+              if k.isdigit() and int(k) <= 128 and _ENCODE[int(k)] is not None}
+    return encode(resp.get("mti") or "0210", fields)
+
+
+# sniffed before the legacy ASCII-MTI codec, whose frames also start with four digits
+register_codec(Codec("binary", _match, decode, _encode_response), before="ascii")
@@ -0,0 +1,148 @@
+# processor/app/iso_admission.py
+"""
+Admission control for the ISO listener.
+
+Every frame must get a processing slot before it reaches process_incoming_iso:
+
+  - at most ISO_ADMIT_MAX_PER_CONN frames in flight per connection,
+  - at most ISO_ADMIT_MAX_INFLIGHT frames in flight per listener process,
+  - a frame may wait for a global slot for at most ISO_ADMIT_QUEUE_MS, counted
+    from the moment it was read off the socket.
+
+Frames that cannot be admitted are shed: the listener answers them straight away
+with ISO_SHED_DE39 (default 91, issuer unavailable) without touching the database.
+
+A pipelined connection reads at most ISO_PIPELINE_MAX_INFLIGHT (32) frames ahead
+of their responses, so its effective per-connection limit is the lower of the
+two. When all of its pipeline slots are taken, the listener sheds the next frame
+as per_connection instead of blocking the reader (see shed()).
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+
+from app import metrics
+
+SHED_PER_CONNECTION = "per_connection"
+SHED_QUEUE_BUDGET = "queue_budget"
+
+
+class ConnectionAdmission:
+    """Per-connection in-flight counter."""
+
+    __slots__ = ("peer", "inflight")
+
+    def __init__(self, peer=None):
+        self.peer = peer
+        self.inflight = 0
+
+
+class AdmissionController:
+    def __init__(self, max_inflight: int = 512, max_per_connection: int = 128, queue_budget_ms: float = 2000.0,
+                 shed_de39: str = "91", enabled: bool = True):
+        self.max_inflight = max(1, max_inflight)
+        self.max_per_connection = max(1, max_per_connection)
+        self.queue_budget = max(0.0, queue_budget_ms) / 1000.0
+        self.shed_de39 = shed_de39
+        self.enabled = enabled
+        self._inflight = 0
+        self._waiters: deque = deque()
+
+        self._admitted = metrics.counter("iso.admission.admitted")
+        self._shed = {
+            SHED_PER_CONNECTION: metrics.counter("iso.admission.shed.per_connection"),
+            SHED_QUEUE_BUDGET: metrics.counter("iso.admission.shed.queue_budget"),
+        }
+        self._inflight_gauge = metrics.gauge("iso.admission.inflight")
+        self._queued_gauge = metrics.gauge("iso.admission.queued")
+        self._queue_wait = metrics.histogram("iso.admission.queue_wait_ms")
+
+    @classmethod
+    def from_env(cls) -> "AdmissionController":
+        return cls(
+            max_inflight=int(os.environ.get("ISO_ADMIT_MAX_INFLIGHT", "512")),
+            max_per_connection=int(os.environ.get("ISO_ADMIT_MAX_PER_CONN", "128")),
+            queue_budget_ms=float(os.environ.get("ISO_ADMIT_QUEUE_MS", "2000")),
+            shed_de39=os.environ.get("ISO_SHED_DE39", "91"),
+            enabled=os.environ.get("ISO_ADMISSION", "1").strip().lower() not in ("0", "false", "no", "off"),
+        )
+
+    def connection(self, peer=None) -> ConnectionAdmission:
+        return ConnectionAdmission(peer)
+
+    async def acquire(self, conn: ConnectionAdmission, arrived_at: float) -> Optional[str]:
+        """
+        Take a slot for one frame read at `arrived_at` (time.monotonic()).
+        Returns None when admitted (call release() afterwards) or the shed reason.
+        """
+        if not self.enabled:
+            return None
+        if conn.inflight >= self.max_per_connection:
+            return self._reject(SHED_PER_CONNECTION)
+        # counts frames waiting for a global slot too
+        conn.inflight += 1
+
+        waited = time.monotonic() - arrived_at
+        if waited > self.queue_budget:
+            # already stale, e.g. the event loop itself is lagging
+            return self._reject(SHED_QUEUE_BUDGET, conn)
+
+        if self._inflight < self.max_inflight and not self._waiters:
+            self._inflight += 1
+        else:
+            fut = asyncio.get_running_loop().create_future()
+            self._waiters.append(fut)
+            self._queued_gauge.set(len(self._waiters))
+            try:
+                # release() hands its slot over by resolving the future
+                await asyncio.wait_for(fut, self.queue_budget - waited)
+            except asyncio.TimeoutError:
+                self._discard_waiter(fut)
+                return self._reject(SHED_QUEUE_BUDGET, conn)
+            except asyncio.CancelledError:
+                if fut.done() and not fut.cancelled():
+                    self._release_slot()
+                else:
+                    self._discard_waiter(fut)
+                conn.inflight -= 1
+                raise
+            finally:
+                self._queued_gauge.set(len(self._waiters))
+
+        self._admitted.inc()
+        self._inflight_gauge.set(self._inflight)
+        self._queue_wait.observe((time.monotonic() - arrived_at) * 1000.0)
+        return None
+
+    def shed(self, reason: str) -> str:
+        """Count a frame the listener sheds before acquire() (e.g. its pipeline is full)."""
+        return self._reject(reason)
+
+    def release(self, conn: ConnectionAdmission):
+        if not self.enabled:
+            return
+        conn.inflight -= 1
+        self._release_slot()
+        self._inflight_gauge.set(self._inflight)
+
+    def _release_slot(self):
+        while self._waiters:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                fut.set_result(None)
+                return
+        self._inflight -= 1
+
+    def _discard_waiter(self, fut):
+        try:
+            self._waiters.remove(fut)
+        except ValueError:
+            pass
+
+    def _reject(self, reason: str, conn: Optional[ConnectionAdmission] = None) -> str:
+        if conn is not None:
+            conn.inflight -= 1
+        self._shed[reason].inc()
+        return reason
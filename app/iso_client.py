@@ -0,0 +1,293 @@
+# processor/app/iso_client.py
+"""
+Asyncio ISO client: a pool of persistent connections to the listener with many
+requests in flight on each.
+
+Responses are routed back to their caller by correlation_id when the request has
+one (ISO20022 payouts; the listener echoes it at the top level), otherwise by STAN
+(DE11, assigned by the client when missing). This relies on the listener echoing
+match keys, so it works with pipelined (ISO_PIPELINE=1) and sequential listeners
+alike.
+
+Requests past max_inflight_per_connection (default 32, the listener's
+ISO_PIPELINE_MAX_INFLIGHT) wait on the client side; a listener with admission
+control sheds frames beyond its pipeline limit with DE39 91.
+
+Connections that drop fail their in-flight requests with ConnectionError and are
+re-dialled in the background with exponential backoff (plus jitter). Every
+request has a timeout; a response that arrives after it is dropped.
+
+    async with IsoClient("127.0.0.1", 9000, pool_size=4) as client:
+        resp = await client.request("0200", {"2": "4111111111111111", "4": "000000001000"})
+        resp["fields"]["39"]
+"""
+import asyncio
+import itertools
+import logging
+import random
+import ssl
+import time
+import uuid
+from typing import Dict, List, Optional
+
+from app import iso8583_binary, metrics, serializer
+from app.iso_framing import read_frame, send_frame
+
+LOG = logging.getLogger("processor.iso_client")
+LOG.addHandler(logging.NullHandler())
+
+_requests = metrics.counter("iso.client.requests")
+_timeouts = metrics.counter("iso.client.timeouts")
+_unmatched = metrics.counter("iso.client.unmatched")
+_reconnects = metrics.counter("iso.client.reconnects")
+_latency = metrics.histogram("iso.client.latency_ms")
+
+
+def decode_response(payload: bytes, codec: str = "json") -> dict:
+    """Listener response payload -> {"mti": ..., "fields": {...}, "txn_id"?, "correlation_id"?}."""
+    if codec == "binary":
+        return iso8583_binary.decode(payload)
+    mti, body = payload[:4], payload[4:]
+    if not mti.isdigit():
+        # bare JSON response
+        mti, body = b"", payload
+    resp = serializer.loads(body)
+    if not isinstance(resp, dict):
+        raise ValueError("response body is not a JSON object")
+    if mti:
+        resp["mti"] = mti.decode("ascii")
+    return resp
+
+
+def _stan_key(stan) -> str:
+    # binary frames zero-pad DE11, JSON frames echo it as sent
+    return str(stan).lstrip("0") or "0"
+
+
+class _Connection:
+    __slots__ = ("index", "reader", "writer", "pending", "slots", "task", "ready")
+
+    def __init__(self, index: int, max_inflight: int):
+        self.index = index
+        self.reader = None
+        self.writer = None
+        self.pending: Dict[tuple, asyncio.Future] = {}
+        self.slots = asyncio.Semaphore(max_inflight)
+        self.task: Optional[asyncio.Task] = None
+        self.ready = asyncio.Event()
+
+
+class IsoClient:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 9000,
+        pool_size: int = 4,
+        timeout: float = 5.0,
+        connect_timeout: float = 5.0,
+        max_inflight_per_connection: int = 32,
+        backoff_initial: float = 0.1,
+        backoff_max: float = 5.0,
+        ssl_context: Optional[ssl.SSLContext] = None,
+        server_hostname: Optional[str] = None,
+        codec: str = "json",
+    ):
+        if codec not in ("json", "binary"):
+            raise ValueError(f"unsupported client codec {codec!r} (expected 'json' or 'binary')")
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.backoff_initial = backoff_initial
+        self.backoff_max = backoff_max
+        self.ssl_context = ssl_context
+        self.server_hostname = server_hostname
+        self.codec = codec
+        self._max_inflight = max(1, max_inflight_per_connection)
+        self._pool_size = max(1, pool_size)
+        self._conns: List[_Connection] = []
+        self._stan = itertools.count(1)
+        self._closed = False
+
+    # -- lifecycle -------------------------------------------------------------
+
+    async def start(self, wait: bool = True):
+        """Open the pool; with wait, return once at least one connection is up (or connect_timeout passes)."""
+        if self._conns:
+            return
+        self._conns = [_Connection(i, self._max_inflight) for i in range(self._pool_size)]
+        for conn in self._conns:
+            conn.task = asyncio.create_task(self._maintain(conn))
+        if wait:
+            await self._any_ready(self.connect_timeout)
+
+    async def close(self):
+        self._closed = True
+        for conn in self._conns:
+            if conn.task is not None:
+                conn.task.cancel()
+        await asyncio.gather(*(c.task for c in self._conns if c.task is not None), return_exceptions=True)
+        for conn in self._conns:
+            self._drop(conn, ConnectionError("client closed"))
+        self._conns = []
+
+    async def __aenter__(self) -> "IsoClient":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def connected(self) -> int:
+        return sum(1 for c in self._conns if c.ready.is_set())
+
+    # -- requests --------------------------------------------------------------
+
+    def next_stan(self) -> str:
+        return f"{next(self._stan) % 1_000_000:06d}"
+
+    async def request(self, mti: str, fields: dict, timeout: Optional[float] = None, **extra) -> dict:
+        """
+        Send an ISO8583-style message and await its response. A STAN (DE11) is added when
+        `fields` has none; `extra` top-level keys (txn_id, correlation_id, ...) go into JSON frames.
+        """
+        fields = {str(k): v for k, v in fields.items()}
+        fields.setdefault("11", self.next_stan())
+        if self.codec == "binary":
+            payload = iso8583_binary.encode(mti, fields)
+        else:
+            payload = serializer.dumps({"mti": str(mti), "fields": fields, **extra})
+        return await self.send(payload, self._route_key(extra.get("correlation_id"), fields["11"]), timeout)
+
+    async def request_message(self, message: dict, timeout: Optional[float] = None) -> dict:
+        """Send a top-level JSON message (e.g. an ISO20022 payout); adds a correlation_id when missing."""
+        if self.codec != "json":
+            raise ValueError("request_message() needs the json codec")
+        message = dict(message)
+        message.setdefault("correlation_id", uuid.uuid4().hex)
+        return await self.send(serializer.dumps(message), self._route_key(message["correlation_id"], None), timeout)
+
+    async def send(self, payload: bytes, key: tuple, timeout: Optional[float] = None) -> dict:
+        """Send a pre-encoded payload whose response carries `key` (see _route_key)."""
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        conn = await self._pick(timeout)
+        remaining = deadline - time.monotonic()
+        try:
+            await asyncio.wait_for(conn.slots.acquire(), remaining)
+        except asyncio.TimeoutError:
+            _timeouts.inc()
+            raise asyncio.TimeoutError(f"no free request slot within {timeout}s") from None
+        try:
+            if key in conn.pending:
+                raise ValueError(f"request {key} already in flight on this connection")
+            if not conn.ready.is_set():
+                raise ConnectionError("connection lost before the request was sent")
+            fut = asyncio.get_running_loop().create_future()
+            conn.pending[key] = fut
+            started = time.perf_counter()
+            _requests.inc()
+            try:
+                await send_frame(conn.writer, payload)
+                return await asyncio.wait_for(fut, deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                _timeouts.inc()
+                raise asyncio.TimeoutError(f"no response for {key} within {timeout}s") from None
+            finally:
+                if conn.pending.get(key) is fut:
+                    del conn.pending[key]
+                _latency.observe((time.perf_counter() - started) * 1000.0)
+        finally:
+            conn.slots.release()
+
+    @staticmethod
+    def _route_key(correlation_id, stan) -> tuple:
+        if correlation_id:
+            return ("correlation_id", str(correlation_id))
+        return ("11", _stan_key(stan))
+
+    async def _pick(self, timeout: float) -> _Connection:
+        if not self._conns:
+            raise RuntimeError("IsoClient is not started")
+        ready = [c for c in self._conns if c.ready.is_set()]
+        if not ready:
+            await self._any_ready(timeout)
+            ready = [c for c in self._conns if c.ready.is_set()]
+            if not ready:
+                raise ConnectionError(f"no connection to {self.host}:{self.port} within {timeout}s")
+        # least loaded connection
+        return min(ready, key=lambda c: len(c.pending))
+
+    async def _any_ready(self, timeout: float):
+        waiters = [asyncio.create_task(c.ready.wait()) for c in self._conns]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for w in waiters:
+                w.cancel()
+
+    # -- connections -----------------------------------------------------------
+
+    async def _maintain(self, conn: _Connection):
+        """Keep one pool slot connected: dial, read responses until the connection drops, back off, repeat."""
+        delay = self.backoff_initial
+        while not self._closed:
+            try:
+                conn.reader, conn.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, ssl=self.ssl_context,
+                                            server_hostname=self.server_hostname if self.ssl_context else None),
+                    self.connect_timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                LOG.warning("ISO client connection %d to %s:%s failed: %r; retrying in %.2fs",
+                            conn.index, self.host, self.port, e, delay)
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, self.backoff_max)
+                continue
+            delay = self.backoff_initial
+            conn.ready.set()
+            LOG.info("ISO client connection %d up (%s:%s)", conn.index, self.host, self.port)
+            try:
+                await self._read_responses(conn)
+                error = ConnectionError("listener closed the connection")
+            except asyncio.CancelledError:
+                self._drop(conn, ConnectionError("client closed"))
+                raise
+            except Exception as e:
+                error = e if isinstance(e, ConnectionError) else ConnectionError(f"connection failed: {e!r}")
+            self._drop(conn, error)
+            if not self._closed:
+                _reconnects.inc()
+                LOG.warning("ISO client connection %d lost (%s); reconnecting", conn.index, error)
+
+    async def _read_responses(self, conn: _Connection):
+        while True:
+            payload = await read_frame(conn.reader)
+            if payload is None:
+                return
+            try:
+                resp = decode_response(payload, self.codec)
+            except ValueError as e:
+                LOG.warning("Undecodable response on connection %d: %s", conn.index, e)
+                continue
+            fields = resp.get("fields") if isinstance(resp.get("fields"), dict) else {}
+            fut = None
+            if resp.get("correlation_id"):
+                fut = conn.pending.pop(("correlation_id", str(resp["correlation_id"])), None)
+            if fut is None and fields.get("11") is not None:
+                fut = conn.pending.pop(("11", _stan_key(fields["11"])), None)
+            if fut is None:
+                # late (timed out) or unknown response
+                _unmatched.inc()
+                continue
+            if not fut.done():
+                fut.set_result(resp)
+
+    def _drop(self, conn: _Connection, error: Exception):
+        conn.ready.clear()
+        if conn.writer is not None:
+            conn.writer.close()
+            conn.writer = conn.reader = None
+        pending, conn.pending = conn.pending, {}
+        for fut in pending.values():
+            if not fut.done():
+                fut.set_exception(error)
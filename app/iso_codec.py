@@ -7,7 +7,8 @@ and legacy ASCII MTI frames. Designed for production: explicit errors,
 backwards compatibility, and clear logging.
 """
 from __future__ import annotations
-import json, struct, logging
+import struct, logging
+from app import serializer
 
 LOG = logging.getLogger("processor.iso_codec")
 LOG.addHandler(logging.NullHandler())
@@ -16,7 +17,7 @@ MAX_FRAME = 10 * 1024 * 1024  # 10 MB
 
 def pack_iso(mti: str, fields: dict) -> bytes:
     body = {"mti": str(mti), "fields": {str(k): v for k, v in (fields.items() if isinstance(fields, dict) else [])}}
-    payload = json.dumps(body).encode("utf-8")
+    payload = serializer.dumps(body)
     return struct.pack(">I", len(payload)) + payload
 
 def unpack_iso(frame_or_payload: bytes):
@@ -53,7 +54,7 @@ def unpack_iso(frame_or_payload: bytes):
     try:
         text = data.decode("utf-8")
         if text.strip().startswith("{"):
-            parsed = json.loads(text)
+            parsed = serializer.loads(text)
             if isinstance(parsed, dict) and "mti" in parsed and "fields" in parsed:
                 return {"mti": str(parsed["mti"]), "fields": parsed["fields"]}
             # if json contains "fields" that looks like payload but missing mti, try to recover
@@ -76,7 +77,7 @@ def unpack_iso(frame_or_payload: bytes):
             text_rem = fields_raw.decode("utf-8", errors="ignore").strip()
             if text_rem.startswith("{"):
                 # embedded JSON
-                sub = json.loads(text_rem)
+                sub = serializer.loads(text_rem)
                 return {"mti": mti, "fields": sub}
         except Exception:
             pass
@@ -84,25 +85,315 @@ def unpack_iso(frame_or_payload: bytes):
     except Exception as e:
         raise ValueError("invalid MTI in payload") from e
 
-def recv_frame(sock, timeout=5.0):
+def recv_frame(sock, timeout=5.0, decoder=None):
     """
     Read a length-prefixed frame from a socket: 4-byte BE length + payload.
     Returns payload bytes.
+
+    Without a decoder only the bytes of this one frame are read off the socket. Pass the
+    same IsoStreamDecoder on every call to read ahead in large chunks; frames that arrive
+    together are then returned by the following calls without touching the socket.
     """
     sock.settimeout(timeout)
-    hdr = sock.recv(4)
-    if not hdr or len(hdr) < 4:
-        raise ConnectionError("short header read")
-    (length,) = struct.unpack(">I", hdr)
-    if length <= 0 or length > MAX_FRAME:
-        raise ValueError(f"invalid frame length {length}")
-    data = b""
-    while len(data) < length:
-        chunk = sock.recv(length - len(data))
-        if not chunk:
-            raise ConnectionError("short payload read")
-        data += chunk
-    return data
+    exact = decoder is None
+    if exact:
+        decoder = IsoStreamDecoder(initial_buffer=4096)
+    while True:
+        payload = decoder.next_payload()
+        if payload is not None:
+            if not payload:
+                raise ValueError("invalid frame length 0")
+            return payload
+        if not decoder.recv_into(sock, decoder.wanted() if exact else 0):
+            raise ConnectionError("short header read" if decoder.pending < 4 else "short payload read")
+
+_LEN = struct.Struct(">I")
+
+class IsoStreamDecoder:
+    """
+    Incremental decoder for 4-byte BE length-prefixed frames over one reusable bytearray.
+
+    feed(chunk) takes arbitrary chunks (partial headers, several frames at once) and
+    returns every message completed so far, decoded with `decode` (unpack_iso by default,
+    None for raw payload bytes). Socket readers skip the copy in feed(): recv_into(sock)
+    (or get_buffer()/buffer_updated() for asyncio.BufferedProtocol) receive straight into
+    the buffer, and split()/compact() hand out complete frames as memoryview slices.
+
+    The buffer only grows to hold one frame of at most max_frame bytes; a larger length
+    header raises ValueError and discards the buffered data.
+    """
+
+    def __init__(self, max_frame: int = MAX_FRAME, decode=unpack_iso, initial_buffer: int = 64 * 1024,
+                 min_read: int = 16 * 1024):
+        self.max_frame = max_frame
+        self.decode = decode
+        self._initial = initial_buffer
+        self._min_read = min(min_read, initial_buffer)
+        self._buf = bytearray(initial_buffer)
+        self._view = memoryview(self._buf)
+        self._start = 0  # first unconsumed byte
+        self._end = 0  # end of received data
+        self._need = 0  # bytes still missing from a partially received frame
+
+    @property
+    def pending(self) -> int:
+        """Bytes received but not yet returned as a frame."""
+        return self._end - self._start
+
+    def wanted(self) -> int:
+        """Bytes that complete the next header or frame; never reads into the frame after it."""
+        pending = self._end - self._start
+        if pending < 4:
+            return 4 - pending
+        (size,) = _LEN.unpack_from(self._buf, self._start)
+        return max(1, size + 4 - pending)
+
+    # -- receive ------------------------------------------------------------------
+
+    def get_buffer(self, sizehint: int = -1) -> memoryview:
+        """Writable tail of the receive buffer, at least min_read bytes."""
+        if len(self._buf) - self._end < self._min_read:
+            self._make_room(self._min_read)
+        return self._view[self._end:]
+
+    def buffer_updated(self, nbytes: int):
+        self._end += nbytes
+
+    def recv_into(self, sock, nbytes: int = 0) -> int:
+        """One sock.recv_into() into the buffer (at most nbytes if given); returns bytes read, 0 on EOF."""
+        buf = self.get_buffer()
+        if nbytes and nbytes < len(buf):
+            buf = buf[:nbytes]
+        n = sock.recv_into(buf)
+        self._end += n
+        return n
+
+    def feed(self, chunk) -> list:
+        """Append a chunk of any size; returns the messages it completed, in order."""
+        out = []
+        view = memoryview(chunk).cast("B")
+        while view:
+            buf = self.get_buffer()
+            n = min(len(buf), len(view))
+            buf[:n] = view[:n]
+            self._end += n
+            view = view[n:]
+            out.extend(self.messages())
+        return out
+
+    # -- frames -------------------------------------------------------------------
+
+    def split(self) -> list:
+        """
+        memoryview slices of every complete frame buffered. Release them, then call
+        compact(), before the next get_buffer()/feed(). ValueError on an oversize header.
+        """
+        batch = []
+        self._need = 0
+        buf, start, end = self._buf, self._start, self._end
+        while end - start >= 4:
+            (size,) = _LEN.unpack_from(buf, start)
+            if size > self.max_frame:
+                self._start = self._end = 0
+                raise ValueError(f"frame length {size} exceeds max {self.max_frame}")
+            if end - start - 4 < size:
+                # room for the rest is made in compact(), after the slices are released
+                self._need = size + 4 - (end - start)
+                break
+            batch.append(self._view[start + 4:start + 4 + size])
+            start += 4 + size
+        self._start = start
+        return batch
+
+    def compact(self):
+        need, self._need = self._need, 0
+        if self._start == self._end:
+            self._start = self._end = 0
+            if len(self._buf) > self._initial:
+                # drop the space a large frame needed
+                self._buf = bytearray(self._initial)
+                self._view = memoryview(self._buf)
+        if len(self._buf) - self._end < max(need, self._min_read):
+            self._make_room(max(need, self._min_read))
+        elif self._start and len(self._buf) - self._end < self._min_read:
+            pending = self._end - self._start
+            self._buf[:pending] = self._buf[self._start:self._end]
+            self._start, self._end = 0, pending
+
+    def payloads(self) -> list:
+        """Copies of every complete frame payload buffered."""
+        batch = self.split()
+        out = []
+        for mv in batch:
+            out.append(bytes(mv))
+            mv.release()
+        self.compact()
+        return out
+
+    def messages(self) -> list:
+        payloads = self.payloads()
+        return [self.decode(p) for p in payloads] if self.decode else payloads
+
+    def next_payload(self):
+        """The next complete payload (bytes), or None while it is still incomplete."""
+        start = self._start
+        if self._end - start < 4:
+            return None
+        (size,) = _LEN.unpack_from(self._buf, start)
+        if size > self.max_frame:
+            self._start = self._end = 0
+            raise ValueError(f"invalid frame length {size}")
+        if self._end - start - 4 < size:
+            self._need = size + 4 - (self._end - start)
+            self.compact()
+            return None
+        payload = bytes(self._buf[start + 4:start + 4 + size])
+        self._start = start + 4 + size
+        self.compact()
+        return payload
+
+    def _make_room(self, need: int):
+        pending = self._end - self._start
+        if len(self._buf) - pending >= need:
+            # enough space once the consumed prefix is dropped
+            self._buf[:pending] = self._buf[self._start:self._end]
+        else:
+            # new buffer rather than resizing: slices handed out earlier may still export the old one
+            size = max(pending + need, min(len(self._buf) * 2, self.max_frame + 4))
+            new = bytearray(size)
+            new[:pending] = self._buf[self._start:self._end]
+            self._buf = new
+            self._view = memoryview(new)
+        self._start, self._end = 0, pending
+
+# --- codec registry ---------------------------------------------------------------
+# Frames are dispatched on their first bytes instead of trying every layout in turn:
+#   "{"             -> json   (gateway pack_iso frames and ISO20022 payout documents)
+#   4 ASCII digits  -> ascii  (legacy MTI prefix followed by JSON, length+JSON, or raw data)
+# A CodecSession locks the first codec that decodes successfully for the rest of the
+# connection, so later frames cost one first-byte check and one parse.
+
+class Codec:
+    """A wire format: match(payload) sniffs the first bytes, decode() returns the message dict,
+    encode_response() serializes a listener response ({"fields": {...}, ...})."""
+
+    __slots__ = ("name", "match", "decode", "encode_response")
+
+    def __init__(self, name: str, match, decode, encode_response):
+        self.name = name
+        self.match = match
+        self.decode = decode
+        self.encode_response = encode_response
+
+    def __repr__(self):
+        return f"<Codec {self.name}>"
+
+CODECS = {}
+_SNIFF_ORDER = []
+
+def register_codec(codec: Codec, before: str = None):
+    """Add (or replace) a codec. Codecs are sniffed in registration order unless
+    `before` names a registered codec this one must be tried ahead of."""
+    if codec.name in CODECS:
+        _SNIFF_ORDER[:] = [c for c in _SNIFF_ORDER if c.name != codec.name]
+    CODECS[codec.name] = codec
+    names = [c.name for c in _SNIFF_ORDER]
+    _SNIFF_ORDER.insert(names.index(before) if before in names else len(names), codec)
+
+def get_codec(name: str) -> Codec:
+    try:
+        return CODECS[name]
+    except KeyError:
+        raise ValueError(f"unknown ISO codec {name!r} (known: {', '.join(CODECS)})") from None
+
+def sniff_codec(payload: bytes):
+    """Codec whose first-byte signature matches payload, or None."""
+    for codec in _SNIFF_ORDER:
+        if codec.match(payload):
+            return codec
+    return None
+
+def response_mti(request_mti) -> str:
+    """0200 -> 0210, 0100 -> 0110, 0800 -> 0810; anything unexpected -> 0210."""
+    mti = str(request_mti or "")
+    if len(mti) == 4 and mti.isdigit() and int(mti[2]) % 2 == 0:
+        return mti[:2] + str(int(mti[2]) + 1) + mti[3]
+    return "0210"
+
+def _legacy_response(resp: dict) -> bytes:
+    # framed JSON payload prefixed with '0210' (legacy listener behavior)
+    if "mti" in resp:
+        resp = {k: v for k, v in resp.items() if k != "mti"}
+    return b"0210" + serializer.dumps(resp)
+
+def _json_match(payload: bytes) -> bool:
+    return payload[:1] == b"{"
+
+def _json_decode(payload: bytes) -> dict:
+    parsed = serializer.loads(payload)
+    if not isinstance(parsed, dict):
+        raise ValueError("JSON payload is not an object")
+    if "fields" in parsed and parsed.get("type") != "iso20022":
+        parsed["mti"] = str(parsed.get("mti") or "0200")
+    return parsed
+
+def _ascii_match(payload: bytes) -> bool:
+    head = payload[:4]
+    return len(head) == 4 and head.isdigit()
+
+def _ascii_decode(payload: bytes) -> dict:
+    mti = payload[:4].decode("ascii")
+    rest = payload[4:]
+    if rest[:1] != b"{" and rest[4:5] == b"{":
+        # iso8583_compat layout: MTI + 4-byte length + JSON
+        rest = rest[4:]
+    if rest[:1] == b"{":
+        sub = serializer.loads(rest)
+        if not isinstance(sub, dict):
+            raise ValueError("legacy JSON body is not an object")
+        fields = sub["fields"] if isinstance(sub.get("fields"), dict) else sub
+        return {"mti": mti, "fields": fields}
+    return {"mti": mti, "fields": {"raw_hex": rest.hex()}}
+
+register_codec(Codec("json", _json_match, _json_decode, _legacy_response))
+register_codec(Codec("ascii", _ascii_match, _ascii_decode, _legacy_response))
+
+# binary ISO8583 lives in its own module; importing it registers the "binary" codec
+from app import iso8583_binary as _iso8583_binary  # noqa: E402,F401
+
+class CodecSession:
+    """
+    Per-connection codec state. `forced` pins a codec up front (ISO_CODEC); otherwise the
+    first frame that decodes successfully locks its codec. A frame that does not match
+    the locked codec's signature is sniffed on its own without changing the lock.
+    """
+
+    __slots__ = ("codec", "locked")
+
+    def __init__(self, forced=None):
+        self.codec = get_codec(forced) if forced and forced != "auto" else None
+        self.locked = self.codec is not None
+
+    def codec_for(self, payload: bytes):
+        """The locked codec if payload matches its signature, else whatever sniffs (may be None)."""
+        codec = self.codec
+        if codec is None or not codec.match(payload):
+            codec = sniff_codec(payload)
+        return codec
+
+    def decode(self, payload: bytes):
+        """Returns (codec, message). Raises ValueError when no codec can decode the payload."""
+        codec = self.codec_for(payload)
+        if codec is None:
+            # unknown layout: best-effort legacy parser
+            return None, unpack_iso(payload)
+        message = codec.decode(payload)
+        if not self.locked:
+            self.codec, self.locked = codec, True
+        return codec, message
+
+    def encode_response(self, resp: dict) -> bytes:
+        return (self.codec.encode_response if self.codec else _legacy_response)(resp)
 
 if __name__ == "__main__":
     # quick local test
@@ -0,0 +1,161 @@
+# processor/app/iso_compression.py
+"""
+Negotiated per-connection compression for large frames (ISO20022 payouts carrying
+a full pain_xml document).
+
+A peer asks for it with an 0800 whose DE70 is NMI_COMPRESSION ("901", private use)
+and whose DE48 is the offer, e.g. "zlib;dict=iso20022-v1". When ISO_COMPRESSION is on
+the 0810 answers with the accepted parameters in DE48 ("zlib;dict=iso20022-v1;min=1024"),
+or "none" otherwise. From then on, in each direction:
+
+  - frames of at least ISO_COMPRESSION_MIN_BYTES are sent as COMPRESSED_MARKER (0x1F)
+    followed by deflate data from one zlib stream kept for the whole connection
+    (Z_SYNC_FLUSH after each frame), so later frames reuse the earlier ones' history;
+  - smaller frames (card auths, 0800/0810) are sent unchanged, without a marker.
+
+No codec's frames start with 0x1F ("{" JSON, ASCII MTI digits), so the marker is
+unambiguous. Both ends may prime their streams with PRESET_DICTIONARIES, a set of
+ISO20022 tags and payout JSON keys, which helps most on the first frames.
+"""
+import logging
+import os
+import zlib
+from typing import Optional
+
+from app import metrics, serializer
+from app.iso_codec import MAX_FRAME
+
+LOG = logging.getLogger("processor.iso_compression")
+LOG.addHandler(logging.NullHandler())
+
+COMPRESSED_MARKER = b"\x1f"
+NMI_COMPRESSION = "901"
+DECLINED = "none"
+
+ENABLED = os.environ.get("ISO_COMPRESSION", "0").strip().lower() in ("1", "true", "yes", "on")
+MIN_BYTES = int(os.environ.get("ISO_COMPRESSION_MIN_BYTES", "1024"))
+LEVEL = int(os.environ.get("ISO_COMPRESSION_LEVEL", "6"))
+
+_ISO20022_TAGS = (
+    '<?xml version="1.0" encoding="UTF-8"?>'
+    '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.09">'
+    '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pacs.008.001.08">'
+    "<CstmrCdtTrfInitn><GrpHdr><MsgId></MsgId><CreDtTm></CreDtTm><NbOfTxs>1</NbOfTxs><CtrlSum></CtrlSum>"
+    "<InitgPty><Nm></Nm></InitgPty></GrpHdr><PmtInf><PmtInfId></PmtInfId><PmtMtd>TRF</PmtMtd>"
+    "<BtchBookg>false</BtchBookg><PmtTpInf><SvcLvl><Cd>SEPA</Cd></SvcLvl></PmtTpInf>"
+    "<ReqdExctnDt><Dt></Dt></ReqdExctnDt><Dbtr><Nm></Nm><PstlAdr><Ctry></Ctry></PstlAdr></Dbtr>"
+    "<DbtrAcct><Id><IBAN></IBAN></Id></DbtrAcct><DbtrAgt><FinInstnId><BICFI></BICFI></FinInstnId></DbtrAgt>"
+    "<ChrgBr>SLEV</ChrgBr><CdtTrfTxInf><PmtId><InstrId></InstrId><EndToEndId></EndToEndId></PmtId>"
+    '<Amt><InstdAmt Ccy="EUR"></InstdAmt></Amt><CdtrAgt><FinInstnId><BICFI></BICFI></FinInstnId></CdtrAgt>'
+    "<Cdtr><Nm></Nm></Cdtr><CdtrAcct><Id><IBAN></IBAN></Id></CdtrAcct>"
+    "<RmtInf><Ustrd></Ustrd></RmtInf></CdtTrfTxInf></PmtInf></CstmrCdtTrfInitn></Document>"
+)
+_PAYOUT_KEYS = (
+    '{"mti":"0200","fields":{"type":"iso20022","txn_id":"","correlation_id":"","creditor_name":"",'
+    '"amount":"","currency":"EUR","protocol":"101.1","auth_code":"","payoutDetails":{"iban":"","bic":""},'
+    '"pain_xml":"'
+)
+
+# zlib matches recent dictionary bytes more cheaply, so the most common strings go last.
+# pain_xml travels inside a JSON string, hence the JSON-escaped copy of the tags.
+PRESET_DICTIONARIES = {
+    "iso20022-v1": (_ISO20022_TAGS + serializer.dumps_str(_ISO20022_TAGS)[1:-1] + _PAYOUT_KEYS).encode("utf-8"),
+}
+
+_frames_in = metrics.counter("iso.compression.frames_in")
+_frames_out = metrics.counter("iso.compression.frames_out")
+_bytes_saved = metrics.counter("iso.compression.bytes_saved")
+_negotiated = metrics.counter("iso.compression.negotiated")
+
+
+def parse_params(de48: Optional[str]) -> dict:
+    """'zlib;dict=iso20022-v1;min=1024' -> {'algo': 'zlib', 'dict': 'iso20022-v1', 'min': '1024'}."""
+    parts = [p.strip() for p in (de48 or "").split(";") if p.strip()]
+    params = {"algo": parts[0].lower() if parts else DECLINED}
+    for part in parts[1:]:
+        key, _, value = part.partition("=")
+        params[key.strip().lower()] = value.strip()
+    return params
+
+
+def offer(dictionary: Optional[str] = "iso20022-v1") -> str:
+    """DE48 for a client's compression 0800."""
+    return f"zlib;dict={dictionary}" if dictionary else "zlib"
+
+
+class FrameCompression:
+    """
+    Compression state of one connection: an outgoing and an incoming zlib stream.
+    Inactive until negotiate() (server) or accept() (client) succeeds.
+    """
+
+    __slots__ = ("enabled", "min_bytes", "level", "active", "dictionary", "_deflate", "_inflate")
+
+    def __init__(self, enabled: Optional[bool] = None, min_bytes: Optional[int] = None, level: Optional[int] = None):
+        self.enabled = ENABLED if enabled is None else enabled
+        self.min_bytes = MIN_BYTES if min_bytes is None else min_bytes
+        self.level = LEVEL if level is None else level
+        self.active = False
+        self.dictionary: Optional[str] = None
+        self._deflate = None
+        self._inflate = None
+
+    def negotiate(self, de48: Optional[str]) -> str:
+        """Server side: answer a compression offer; returns the DE48 for the 0810."""
+        params = parse_params(de48)
+        if not self.enabled or params["algo"] != "zlib":
+            return DECLINED
+        dictionary = params.get("dict") or None
+        if dictionary is not None and dictionary not in PRESET_DICTIONARIES:
+            # unknown dictionary: compress without one rather than refuse
+            dictionary = None
+        self._start(dictionary)
+        return f"zlib;dict={dictionary};min={self.min_bytes}" if dictionary else f"zlib;min={self.min_bytes}"
+
+    def accept(self, de48: Optional[str]) -> bool:
+        """Client side: apply the server's 0810 DE48; False if compression was declined."""
+        params = parse_params(de48)
+        if params["algo"] != "zlib":
+            return False
+        self._start(params.get("dict") or None)
+        return True
+
+    def _start(self, dictionary: Optional[str]):
+        if self.active:
+            # renegotiation would desynchronise the peer's stream state
+            raise ValueError("compression already negotiated on this connection")
+        zdict = PRESET_DICTIONARIES[dictionary] if dictionary else None
+        if zdict:
+            self._deflate = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=zdict)
+            self._inflate = zlib.decompressobj(-zlib.MAX_WBITS, zdict=zdict)
+        else:
+            self._deflate = zlib.compressobj(self.level, zlib.DEFLATED, -zlib.MAX_WBITS)
+            self._inflate = zlib.decompressobj(-zlib.MAX_WBITS)
+        self.dictionary = dictionary
+        self.active = True
+        _negotiated.inc()
+
+    def deflate(self, payload: bytes) -> bytes:
+        """Outgoing frame payload: compressed and marked when active and large enough."""
+        if not self.active or len(payload) < self.min_bytes:
+            return payload
+        out = COMPRESSED_MARKER + self._deflate.compress(payload) + self._deflate.flush(zlib.Z_SYNC_FLUSH)
+        _frames_out.inc()
+        _bytes_saved.inc(len(payload) - len(out))
+        return out
+
+    def inflate(self, payload: bytes) -> bytes:
+        """Incoming frame payload: decompressed when it carries the marker, else returned as is."""
+        if payload[:1] != COMPRESSED_MARKER:
+            return payload
+        if not self.active:
+            raise ValueError("compressed frame on a connection that did not negotiate compression")
+        try:
+            out = self._inflate.decompress(memoryview(payload)[1:], MAX_FRAME)
+        except zlib.error as e:
+            raise ValueError(f"corrupt compressed frame: {e}") from None
+        if self._inflate.unconsumed_tail:
+            raise ValueError(f"compressed frame inflates beyond {MAX_FRAME} bytes")
+        _frames_in.inc()
+        _bytes_saved.inc(len(out) - len(payload))
+        return out
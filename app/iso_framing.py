@@ -0,0 +1,315 @@
+# processor/app/iso_framing.py
+"""
+Protocol-based framing for the ISO listener.
+
+FrameProtocol receives straight into the reusable bytearray of an
+app.iso_codec.IsoStreamDecoder (asyncio.BufferedProtocol), splits out every complete
+4-byte big-endian length-prefixed frame already in the buffer and queues them.
+They are read through FrameReader / FrameWriter, which are drop-in stand-ins for
+the StreamReader / StreamWriter pair that app.iso_listener.handle_client expects
+(async_read_frame / send_frame). A queued frame is returned without suspending, so
+while pipeline slots are free the listener dispatches every frame of one read in the
+same loop iteration (and app.iso_processing.BatchDispatcher can group them).
+"""
+import asyncio
+import logging
+import os
+import struct
+from collections import deque
+from typing import Callable, Optional
+
+from app import metrics
+from app.iso_codec import MAX_FRAME, IsoStreamDecoder
+
+LOG = logging.getLogger("processor.iso_framing")
+LOG.addHandler(logging.NullHandler())
+
+_LEN = struct.Struct(">I")
+
+INITIAL_BUFFER = 64 * 1024
+MIN_READ = 16 * 1024
+# pause the transport when this many frames are queued and not yet read
+MAX_QUEUED_FRAMES = 1024
+# FrameOutput only awaits drain() once this much is buffered for the peer
+OUTPUT_HIGH_WATER = int(os.environ.get("ISO_OUTPUT_HIGH_WATER", str(256 * 1024)))
+
+
+class FrameReader:
+    """Read side of a FrameProtocol connection (replaces StreamReader + async_read_frame)."""
+
+    def __init__(self, protocol: "FrameProtocol"):
+        self._protocol = protocol
+
+    async def read_frame(self) -> Optional[bytes]:
+        """Next payload, or None once the peer has closed and the queue is empty."""
+        return await self._protocol._next_frame()
+
+
+class FrameWriter:
+    """Write side of a FrameProtocol connection, StreamWriter-compatible where the listener needs it."""
+
+    def __init__(self, protocol: "FrameProtocol"):
+        self._protocol = protocol
+
+    @property
+    def transport(self):
+        return self._protocol.transport
+
+    def write(self, data):
+        self._protocol.transport.write(data)
+
+    def writelines(self, data):
+        self._protocol.transport.writelines(data)
+
+    def send_frame_nowait(self, payload: bytes):
+        """Queue one framed payload without concatenating header and body."""
+        self._protocol.transport.writelines((_LEN.pack(len(payload)), payload))
+
+    async def send_frame(self, payload: bytes):
+        self.send_frame_nowait(payload)
+        await self.drain()
+
+    async def drain(self):
+        await self._protocol._drain_helper()
+
+    def can_write_eof(self) -> bool:
+        return self._protocol.transport.can_write_eof()
+
+    def write_eof(self):
+        self._protocol.transport.write_eof()
+
+    def get_extra_info(self, name, default=None):
+        return self._protocol.transport.get_extra_info(name, default)
+
+    def is_closing(self) -> bool:
+        return self._protocol.transport is None or self._protocol.transport.is_closing()
+
+    def close(self):
+        if self._protocol.transport is not None:
+            self._protocol.transport.close()
+
+    async def wait_closed(self):
+        await self._protocol._closed
+
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    def __init__(
+        self,
+        client_connected_cb: Optional[Callable] = None,
+        max_frame: int = MAX_FRAME,
+        initial_buffer: int = INITIAL_BUFFER,
+        max_queued: int = MAX_QUEUED_FRAMES,
+    ):
+        self._client_connected_cb = client_connected_cb
+        self._max_queued = max_queued
+
+        self._decoder = IsoStreamDecoder(max_frame, decode=None, initial_buffer=initial_buffer, min_read=MIN_READ)
+
+        self.transport: Optional[asyncio.Transport] = None
+        self.reader = FrameReader(self)
+        self.writer = FrameWriter(self)
+        self._frames: deque = deque()
+        self._waiter: Optional[asyncio.Future] = None
+        self._eof = False
+        self._read_paused = False
+        self._write_paused = False
+        self._drain_waiters: deque = deque()
+        self._loop = asyncio.get_running_loop()
+        self._closed = self._loop.create_future()
+        self._task: Optional[asyncio.Task] = None
+
+    # -- connection lifecycle -------------------------------------------------
+
+    def connection_made(self, transport):
+        self.transport = transport
+        if self._client_connected_cb is not None:
+            res = self._client_connected_cb(self.reader, self.writer)
+            if asyncio.iscoroutine(res):
+                self._task = self._loop.create_task(res)
+
+    def connection_lost(self, exc):
+        self._eof = True
+        self._wake()
+        for fut in self._drain_waiters:
+            if not fut.done():
+                fut.set_exception(exc or ConnectionResetError("Connection lost"))
+        self._drain_waiters.clear()
+        if not self._closed.done():
+            self._closed.set_result(None)
+        self.transport = None
+
+    def eof_received(self):
+        self._eof = True
+        self._wake()
+        # returning a false value closes the transport once our side is done writing
+        return False
+
+    # -- receive path ---------------------------------------------------------
+
+    def get_buffer(self, sizehint):
+        return self._decoder.get_buffer(sizehint)
+
+    def buffer_updated(self, nbytes):
+        decoder = self._decoder
+        decoder.buffer_updated(nbytes)
+        try:
+            batch = decoder.split()
+        except ValueError as e:
+            LOG.warning("%s; closing %s", e, self.transport.get_extra_info("peername") if self.transport else None)
+            if self.transport:
+                self.transport.close()
+            return
+        if batch:
+            for mv in batch:
+                self._frames.append(bytes(mv))
+                mv.release()
+            self._wake()
+            if len(self._frames) >= self._max_queued and not self._read_paused and self.transport:
+                self._read_paused = True
+                self.transport.pause_reading()
+        decoder.compact()
+
+    def _wake(self):
+        waiter, self._waiter = self._waiter, None
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def _wait_for_frames(self):
+        while not self._frames and not self._eof:
+            self._waiter = self._loop.create_future()
+            await self._waiter
+
+    def _maybe_resume_reading(self):
+        if self._read_paused and len(self._frames) < self._max_queued // 2 and self.transport:
+            self._read_paused = False
+            self.transport.resume_reading()
+
+    async def _next_frame(self) -> Optional[bytes]:
+        if not self._frames:
+            await self._wait_for_frames()
+            if not self._frames:
+                return None
+        frame = self._frames.popleft()
+        self._maybe_resume_reading()
+        return frame
+
+    # -- write flow control ---------------------------------------------------
+
+    def pause_writing(self):
+        self._write_paused = True
+
+    def resume_writing(self):
+        self._write_paused = False
+        for fut in self._drain_waiters:
+            if not fut.done():
+                fut.set_result(None)
+        self._drain_waiters.clear()
+
+    async def _drain_helper(self):
+        if self.transport is None:
+            raise ConnectionResetError("Connection lost")
+        if not self._write_paused:
+            return
+        fut = self._loop.create_future()
+        self._drain_waiters.append(fut)
+        await fut
+
+
+class FrameOutput:
+    """
+    Per-connection output stage. Responses completed within the same event-loop
+    iteration are gathered and handed to the transport in one writelines() call,
+    length headers and payloads as separate buffers. What that costs depends on
+    the runtime: CPython 3.12+ sends the buffers with one sendmsg() and no copy;
+    on 3.11 (the Docker image) the transport joins them into one bytes object
+    (one copy of the burst) and sends that with one send(). Either way a burst
+    is one syscall instead of one per response; python -m app.bench.framing
+    measures it. drain() is only awaited once the buffered output passes the
+    high-water mark.
+    """
+
+    def __init__(self, writer, high_water: int = OUTPUT_HIGH_WATER, compression=None):
+        self._writer = writer
+        self._high_water = high_water
+        # app.iso_compression.FrameCompression, applied in send() order so the zlib stream stays in sync
+        self._compression = compression
+        self._pending: list = []
+        self._pending_bytes = 0
+        self._scheduled = False
+        self._loop = asyncio.get_running_loop()
+        self._frames = metrics.counter("iso.output.frames")
+        self._writes = metrics.counter("iso.output.writes")
+
+    def send(self, payload: bytes, compress: bool = True):
+        """Queue one response frame; it is written at the end of this loop iteration."""
+        if compress and self._compression is not None:
+            payload = self._compression.deflate(payload)
+        self._pending.append(_LEN.pack(len(payload)))
+        self._pending.append(payload)
+        self._pending_bytes += 4 + len(payload)
+        if self._pending_bytes >= self._high_water:
+            self.flush()
+        elif not self._scheduled:
+            self._scheduled = True
+            self._loop.call_soon(self.flush)
+
+    def flush(self):
+        """Hand everything queued to the transport now."""
+        self._scheduled = False
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        self._pending_bytes = 0
+        if self._writer.is_closing():
+            return
+        self._writer.writelines(pending)
+        self._frames.inc(len(pending) // 2)
+        self._writes.inc()
+
+    def buffered(self) -> int:
+        transport = self._writer.transport
+        size = transport.get_write_buffer_size() if transport is not None else 0
+        return size + self._pending_bytes
+
+    async def drain_if_needed(self):
+        if self.buffered() <= self._high_water:
+            return
+        self.flush()
+        try:
+            await self._writer.drain()
+        except Exception:
+            # writer may be closed by peer
+            pass
+
+
+async def read_frame(reader) -> Optional[bytes]:
+    """Framing-agnostic async_read_frame: FrameReader fast path, StreamReader otherwise."""
+    if isinstance(reader, FrameReader):
+        return await reader.read_frame()
+    try:
+        raw_len = await reader.readexactly(4)
+    except asyncio.IncompleteReadError:
+        return None
+    (size,) = _LEN.unpack(raw_len)
+    if size == 0:
+        return b""
+    return await reader.readexactly(size)
+
+
+async def send_frame(writer, payload: bytes):
+    """Write one frame as header + payload buffers (no concatenation) and drain."""
+    writer.writelines((_LEN.pack(len(payload)), payload))
+    try:
+        await writer.drain()
+    except Exception:
+        # writer may be closed by peer
+        pass
+
+
+async def start_framed_server(client_connected_cb, host: str, port: int, **kwargs) -> asyncio.AbstractServer:
+    """
+    asyncio.start_server() equivalent built on FrameProtocol: client_connected_cb is
+    called with (FrameReader, FrameWriter) for each connection.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.create_server(lambda: FrameProtocol(client_connected_cb), host, port, **kwargs)
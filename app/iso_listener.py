@@ -1,10 +1,24 @@
 # /app/app/iso_listener.py
 import asyncio
-import struct
-import json
+import os
 import logging
+import ssl
+import time
+import weakref
+from functools import partial
 from typing import Optional
 
+# framing helpers live in app.iso_framing; re-exported here under their historical names
+from app.iso_framing import FrameOutput, FrameProtocol, read_frame as async_read_frame, send_frame, start_framed_server
+from app.iso_admission import SHED_PER_CONNECTION, AdmissionController, ConnectionAdmission
+from app.iso_netmgmt import PeerLiveness, PeerSession, build_0810, is_network_management, request_fields
+from app.iso_compression import NMI_COMPRESSION, FrameCompression
+from app.iso_tls import create_tls_server, server_context_from_env
+from app.iso_codec import CodecSession, get_codec, response_mti
+from app.iso_processing import BatchDispatcher, process_incoming_iso
+from app import dedupe, event_sink, metrics, tracing, velocity
+from app.dedupe import DedupeStore, DuplicateDetector
+
 LOG = logging.getLogger("processor.iso_listener")
 LOG.setLevel(logging.INFO)
 if not LOG.handlers:
@@ -13,110 +27,396 @@ if not LOG.handlers:
     LOG.addHandler(h)
 
 
-async def async_read_frame(reader: asyncio.StreamReader) -> Optional[bytes]:
-    """Read a length-prefixed frame (4-byte big-endian length). Returns payload bytes or None on EOF."""
-    try:
-        raw_len = await reader.readexactly(4)
-    except asyncio.IncompleteReadError:
+def _env_flag(name: str, default: str = "0") -> bool:
+    return os.environ.get(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+# Pipelined mode: every frame on a connection runs as its own task, so one slow
+# persist does not stall the authorizations queued behind it on the same socket.
+# ISO_PIPELINE_MAX_INFLIGHT bounds the frames read but not yet answered per
+# connection; ISO_PIPELINE_ORDERED keeps responses in request order for peers
+# that cannot match out-of-order replies by STAN / txn_id / correlation_id.
+PIPELINE_ENABLED = _env_flag("ISO_PIPELINE")
+PIPELINE_MAX_INFLIGHT = int(os.environ.get("ISO_PIPELINE_MAX_INFLIGHT", "32"))
+PIPELINE_ORDERED = _env_flag("ISO_PIPELINE_ORDERED")
+# ISO_BATCH routes ISO20022 payouts arriving together (pipelined bursts) through
+# app.iso_processing.process_incoming_iso_batch: one validation pass and one
+# transaction per burst. ISO_BATCH_WINDOW_MS widens the coalescing window.
+BATCH_ENABLED = _env_flag("ISO_BATCH")
+BATCH_WINDOW_MS = float(os.environ.get("ISO_BATCH_WINDOW_MS", "0"))
+BATCH_MAX = int(os.environ.get("ISO_BATCH_MAX", "256"))
+
+# "stream": asyncio streams (StreamReader.readexactly per frame);
+# "protocol": app.iso_framing.FrameProtocol, receiving into a reusable buffer
+FRAMING = os.environ.get("ISO_FRAMING", "stream").strip().lower()
+
+# "auto" sniffs each connection's first frame and locks that codec; or pin one (json, ascii, binary)
+CODEC = os.environ.get("ISO_CODEC", "auto").strip().lower()
+
+# global / per-connection in-flight limits and queue-time budget (see app.iso_admission)
+ADMISSION = AdmissionController.from_env()
+
+# heartbeat tracking and idle-connection eviction (ISO_IDLE_TIMEOUT seconds, 0 = off)
+LIVENESS = PeerLiveness.from_env()
+
+
+def _match_keys(msg: dict, result: Optional[dict] = None) -> dict:
+    """
+    Identifiers echoed back so a pipelining peer can pair a response with its request:
+    STAN (DE11) in the response fields, txn_id / correlation_id at the top level.
+    """
+    keys = {}
+    fields = msg.get("fields") if isinstance(msg.get("fields"), dict) else {}
+    stan = fields.get("11") or msg.get("stan") or msg.get("11")
+    if stan:
+        keys["11"] = str(stan)
+    result = result or {}
+    for name in ("txn_id", "correlation_id"):
+        value = msg.get(name) or result.get(name)
+        if value:
+            keys[name] = str(value)
+    return keys
+
+
+def _with_match_keys(resp: dict, msg: dict, result: Optional[dict] = None) -> dict:
+    keys = _match_keys(msg, result)
+    if "11" in keys:
+        resp["fields"]["11"] = keys.pop("11")
+    resp.update(keys)
+    return resp
+
+
+_BATCHERS = weakref.WeakKeyDictionary()
+
+
+def _batcher() -> BatchDispatcher:
+    # one per event loop (the embedded listener and tests run their own loops)
+    loop = asyncio.get_running_loop()
+    batcher = _BATCHERS.get(loop)
+    if batcher is None:
+        batcher = _BATCHERS[loop] = BatchDispatcher(BATCH_WINDOW_MS, BATCH_MAX)
+    return batcher
+
+
+_DETECTORS = weakref.WeakKeyDictionary()
+
+
+def _detector() -> Optional[DuplicateDetector]:
+    """The running loop's duplicate detector (None with ISO_DEDUPE=0)."""
+    if not dedupe.ENABLED:
         return None
-    if not raw_len:
+    loop = asyncio.get_running_loop()
+    detector = _DETECTORS.get(loop)
+    if detector is None:
+        store = None
+        if dedupe.DB_FALLBACK:
+            try:
+                from app.db import get_session
+                store = DedupeStore(get_session)
+            except Exception as e:
+                LOG.warning("Dedupe DB fallback unavailable: %r", e)
+        detector = _DETECTORS[loop] = DuplicateDetector(store=store)
+    return detector
+
+
+async def process_frame(framed: bytes, peer=None, codecs: Optional[CodecSession] = None) -> dict:
+    """
+    Decode one frame, run it through the processing pipeline and return the response
+    dict ({"fields": {...}} plus match keys). Never raises: failures map to DE39 96.
+    Retransmissions (app.dedupe) get the original response back without being processed again.
+    """
+    codecs = codecs if codecs is not None else CodecSession()
+    try:
+        with tracing.span("decode"):
+            codec, msg = codecs.decode(framed)
+    except Exception as e:
+        LOG.debug("Failed to decode ISO frame from %s: %s", peer, e)
+        # Default fallback response (system malfunction)
+        return {"fields": {"39": "96"}}
+
+    detector = _detector()
+    if detector is not None:
+        try:
+            # a replay answers with this transmission's match keys (correlation_id may differ)
+            return _with_match_keys(await detector.run(msg, partial(_process_message, msg)), msg)
+        except Exception as e:
+            LOG.exception("Processing failed for %s: %s", peer, e)
+            return _with_match_keys({"fields": {"39": "96"}}, msg)
+    return await _process_message(msg)
+
+
+# authorization and financial requests (and their repeats) that are authorized when they carry a PAN (DE2)
+CARD_MTIS = frozenset({"0100", "0101", "0200", "0201"})
+
+
+def _card_request(msg: dict, fields: dict) -> Optional[dict]:
+    """The flat message process_incoming_iso takes for a card request, or None when msg is not one."""
+    if str(msg.get("mti") or "") not in CARD_MTIS or not fields.get("2"):
         return None
-    size = struct.unpack(">I", raw_len)[0]
-    if size == 0:
-        return b""
-    data = await reader.readexactly(size)
-    return data
+    card = {**fields, "mti": str(msg["mti"])}
+    for name in ("txn_id", "correlation_id"):
+        if msg.get(name):
+            card[name] = msg[name]
+    return card
+
+
+async def _process_message(msg: dict) -> dict:
+    if msg.get("type") == "iso20022":
+        LOG.info("ISO20022 JSON detected — delegating to app.iso_processing.process_incoming_iso")
+        try:
+            result = await (_batcher().submit(msg) if BATCH_ENABLED else process_incoming_iso(msg))
+        except Exception as e:
+            LOG.exception("process_incoming_iso raised exception: %s", e)
+            result = {"de39": "96"}
+
+        de39 = str(result.get("de39") or result.get("DE39") or "96")
+        auth_code = result.get("auth_code") or msg.get("auth_code") or None
+        resp = {"fields": {"39": de39}}
+        if auth_code:
+            resp["fields"]["38"] = str(auth_code)
+        return _with_match_keys(resp, msg, result)
+
+    fields = msg.get("fields") if isinstance(msg.get("fields"), dict) else {}
+    card = _card_request(msg, fields)
+    if card is not None:
+        # BIN routing, velocity, issuer / stand-in and persistence, as for cards sent over HTTP
+        try:
+            result = await process_incoming_iso(card)
+        except Exception as e:
+            LOG.exception("process_incoming_iso raised exception: %s", e)
+            result = {"de39": "96"}
+        resp = {"mti": response_mti(msg.get("mti")), "fields": {"39": str(result.get("de39") or "96")}}
+        if result.get("auth_code"):
+            resp["fields"]["38"] = str(result["auth_code"])
+        return _with_match_keys(resp, msg, result)
+
+    # ISO8583 (gateway JSON / legacy MTI frames) without a PAN
+    # minimal behavior: if we get de39 in the message -> reflect it
+    de39 = fields.get("39") or "96"
+    resp = {"mti": response_mti(msg.get("mti")), "fields": {"39": str(de39)}}
+    return _with_match_keys(resp, msg)
 
 
-async def send_frame(writer: asyncio.StreamWriter, payload: bytes):
-    frame = struct.pack(">I", len(payload)) + payload
-    writer.write(frame)
+def _netmgmt_reply(framed: bytes, codecs: CodecSession, compression: FrameCompression) -> bytes:
+    codec = codecs.codec_for(framed)
+    codec_name = codec.name if codec is not None else None
     try:
-        await writer.drain()
+        extra = None
+        # plain echoes (no DE70, or DE70 301) skip the field lookup
+        if b"70" in framed or codec_name == "binary":
+            fields = request_fields(framed, codec_name)
+            if fields.get("70") == NMI_COMPRESSION:
+                extra = {"48": compression.negotiate(fields.get("48"))}
+                LOG.info("Compression offer %r answered with %r", fields.get("48"), extra["48"])
+        return build_0810(framed, codec_name, extra)
+    except ValueError as e:
+        LOG.debug("Malformed 0800 frame: %s", e)
+        return codecs.encode_response({"mti": "0810", "fields": {"39": "30"}})
+
+
+def shed_response(framed: bytes, de39: str, codecs: Optional[CodecSession] = None) -> dict:
+    """Immediate decline for a frame that was not admitted; never touches the database."""
+    resp = {"fields": {"39": str(de39)}}
+    try:
+        _, msg = (codecs if codecs is not None else CodecSession()).decode(framed)
+        _with_match_keys(resp, msg)
     except Exception:
-        # writer may be closed by peer
         pass
+    return resp
 
 
-async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-    peer = writer.get_extra_info("peername")
-    LOG.info("Client connected: %s", peer)
+async def _admit_and_process(framed: bytes, peer, admission: AdmissionController, conn: ConnectionAdmission,
+                             arrived_at: float, codecs: CodecSession) -> dict:
+    with tracing.span("admission"):
+        reason = await admission.acquire(conn, arrived_at)
+    if reason is not None:
+        LOG.warning("Shedding frame from %s (%s): de39=%s", peer, reason, admission.shed_de39)
+        return shed_response(framed, admission.shed_de39, codecs)
     try:
-        # read one frame, process, respond — loop to support multiple frames per connection
-        while True:
-            framed = await async_read_frame(reader)
-            if framed is None:
-                # client closed connection
-                LOG.info("Client disconnected (incomplete): %s", peer)
-                break
+        return await process_frame(framed, peer, codecs)
+    finally:
+        admission.release(conn)
 
-            # Default fallback response (system malfunction)
-            resp = {"fields": {"39": "96"}}
 
-            # First try to detect / treat as JSON (ISO20022)
-            text = None
-            try:
-                text = framed.decode("utf-8", errors="replace")
-            except Exception:
-                text = None
-
-            if text:
-                try:
-                    js = json.loads(text)
-                    if isinstance(js, dict) and js.get("type") == "iso20022":
-                        # import inside handler to avoid circular import at module-level
-                        from app.iso_processing import process_incoming_iso
-
-                        LOG.info("ISO20022 JSON detected — delegating to app.iso_processing.process_incoming_iso")
-                        # IMPORTANT: await the coroutine (do NOT call asyncio.run inside an already-running loop)
-                        try:
-                            result = await process_incoming_iso(js)
-                        except Exception as e:
-                            LOG.exception("process_incoming_iso raised exception: %s", e)
-                            result = {"de39": "96"}
-
-                        de39 = str(result.get("de39") or result.get("DE39") or "96")
-                        auth_code = result.get("auth_code") or js.get("auth_code") or None
-                        resp = {"fields": {"39": de39}}
-                        if auth_code:
-                            resp["fields"]["38"] = str(auth_code)
-
-                except Exception as e:
-                    # JSON parsing / ISO20022 handling failed — fall back to other formats
-                    LOG.debug("ISO20022 detection skipped/failed: %s", e)
-
-            # If not ISO20022, try to parse as ISO8583 (legacy) using local iso_codec if present
-            if resp["fields"]["39"] == "96":
-                try:
-                    # try to import local iso codec if available
-                    from app.iso_codec import unpack_iso, pack_iso  # optional
-                    try:
-                        unpacked = unpack_iso(framed)
-                        # unpacked expected to be dict with 'mti' and 'fields'
-                        # minimal behavior: if we get de39 in unpacked -> reflect it
-                        if isinstance(unpacked, dict):
-                            de39 = unpacked.get("fields", {}).get("39") or "96"
-                            resp = {"fields": {"39": str(de39)}}
-                    except Exception as e:
-                        LOG.debug("Failed to unpack ISO from %s: %s", peer, e)
-                except Exception:
-                    # iso_codec not present or import failed — ignore and continue
-                    pass
-
-            # send response as framed JSON payload prefixed with '0210' (legacy behavior)
+async def _serve_sequential(reader, writer, peer, admission: AdmissionController, session: PeerSession,
+                            codecs: CodecSession, compression: FrameCompression):
+    conn = admission.connection(peer)
+    output = FrameOutput(writer, compression=compression)
+    # read one frame, process, respond — loop to support multiple frames per connection
+    while True:
+        framed = await async_read_frame(reader)
+        if framed is None:
+            # client closed connection
+            LOG.info("Client disconnected (incomplete): %s", peer)
+            break
+        framed = compression.inflate(framed)
+
+        if is_network_management(framed):
+            # 0800 echo / sign-on: answered from the header alone, no processing or logging
+            PeerLiveness.heartbeat(session)
+            output.send(_netmgmt_reply(framed, codecs, compression), compress=False)
+            output.flush()
+            continue
+        PeerLiveness.touch(session)
+
+        with tracing.trace("iso.frame", peer=peer):
+            resp = await _admit_and_process(framed, peer, admission, conn, time.monotonic(), codecs)
+
             try:
-                resp_payload = b"0210" + json.dumps(resp, separators=(",", ":")).encode("utf-8")
-                await send_frame(writer, resp_payload)
+                with tracing.span("write"):
+                    resp_payload = codecs.encode_response(resp)
+                    output.send(resp_payload)
+                    # one response in flight: no one to coalesce with, write it now
+                    output.flush()
+                    await output.drain_if_needed()
                 LOG.info("Sent response to %s (%d bytes) de39=%s", peer, len(resp_payload), resp["fields"].get("39"))
             except Exception as e:
                 LOG.exception("Failed to send response to %s: %s", peer, e)
                 break
 
+
+async def _serve_pipelined(reader, writer, peer, max_inflight: int, ordered: bool, admission: AdmissionController,
+                           session: PeerSession, codecs: CodecSession, compression: FrameCompression):
+    """
+    Read frames ahead of their responses. Each frame is processed in its own task;
+    a slot is held from read until the response has been queued for writing, so at
+    most `max_inflight` frames per connection are buffered or being processed.
+    With admission control on, a frame read while every slot is taken is shed
+    (per_connection) instead of making the reader wait; with it off the reader
+    waits for a slot.
+    Responses go through a FrameOutput, so those finishing together share a write.
+    Network-management frames are answered inline and bypass ordering.
+    """
+    slots = asyncio.Semaphore(max(1, max_inflight))
+    pending = set()
+    order_q: Optional[asyncio.Queue] = asyncio.Queue() if ordered else None
+    conn = admission.connection(peer)
+    output = FrameOutput(writer, compression=compression)
+
+    async def _write(resp: dict):
+        resp_payload = codecs.encode_response(resp)
+        try:
+            output.send(resp_payload)
+            await output.drain_if_needed()
+            LOG.info("Sent response to %s (%d bytes) de39=%s", peer, len(resp_payload), resp["fields"].get("39"))
+        except Exception as e:
+            LOG.exception("Failed to send response to %s: %s", peer, e)
+
+    async def _run(framed: bytes, arrived_at: float) -> dict:
+        with tracing.trace("iso.frame", peer=peer):
+            resp = await _admit_and_process(framed, peer, admission, conn, arrived_at, codecs)
+            if ordered:
+                # the ordered writer owns the write and the slot (outside this frame's trace)
+                return resp
+            try:
+                with tracing.span("write"):
+                    await _write(resp)
+            finally:
+                slots.release()
+        return resp
+
+    async def _ordered_writer():
+        while True:
+            item = await order_q.get()
+            if item is None:
+                return
+            task, holds_slot = item
+            try:
+                resp = await task
+                await _write(resp)
+            except Exception as e:
+                LOG.exception("Pipelined frame failed for %s: %s", peer, e)
+            finally:
+                if holds_slot:
+                    slots.release()
+
+    writer_task = asyncio.create_task(_ordered_writer()) if ordered else None
+    try:
+        while True:
+            if not admission.enabled:
+                # no shedding: backpressure, the next frame is not read until a slot frees up
+                await slots.acquire()
+                slots.release()
+            framed = await async_read_frame(reader)
+            if framed is None:
+                LOG.info("Client disconnected (incomplete): %s", peer)
+                break
+            framed = compression.inflate(framed)
+            if is_network_management(framed):
+                PeerLiveness.heartbeat(session)
+                output.send(_netmgmt_reply(framed, codecs, compression), compress=False)
+                continue
+            PeerLiveness.touch(session)
+            if slots.locked():
+                # every pipeline slot is taken: this connection is over its limit
+                admission.shed(SHED_PER_CONNECTION)
+                LOG.warning("Shedding frame from %s (%s): de39=%s", peer, SHED_PER_CONNECTION, admission.shed_de39)
+                resp = shed_response(framed, admission.shed_de39, codecs)
+                if ordered:
+                    done = asyncio.get_running_loop().create_future()
+                    done.set_result(resp)
+                    order_q.put_nowait((done, False))
+                else:
+                    await _write(resp)
+                continue
+            await slots.acquire()
+            task = asyncio.create_task(_run(framed, time.monotonic()))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            if ordered:
+                order_q.put_nowait((task, True))
+    finally:
+        # let frames already read finish (their events may still need persisting)
+        if writer_task is not None:
+            order_q.put_nowait(None)
+            await asyncio.gather(writer_task, return_exceptions=True)
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+        output.flush()
+
+
+async def handle_client(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    pipeline: Optional[bool] = None,
+    max_inflight: Optional[int] = None,
+    ordered: Optional[bool] = None,
+    admission: Optional[AdmissionController] = None,
+    liveness: Optional[PeerLiveness] = None,
+    codec: Optional[str] = None,
+    compression: Optional[bool] = None,
+):
+    peer = writer.get_extra_info("peername")
+    LOG.info("Client connected: %s", peer)
+    pipeline = PIPELINE_ENABLED if pipeline is None else pipeline
+    admission = admission or ADMISSION
+    liveness = liveness or LIVENESS
+    session = liveness.register(peer, writer)
+    codecs = CodecSession(codec or CODEC)
+    # negotiated per connection by an 0800 compression offer; ISO_COMPRESSION allows it
+    compressor = FrameCompression(enabled=compression)
+    try:
+        if pipeline:
+            await _serve_pipelined(
+                reader,
+                writer,
+                peer,
+                PIPELINE_MAX_INFLIGHT if max_inflight is None else max_inflight,
+                PIPELINE_ORDERED if ordered is None else ordered,
+                admission,
+                session,
+                codecs,
+                compressor,
+            )
+        else:
+            await _serve_sequential(reader, writer, peer, admission, session, codecs, compressor)
+
     except asyncio.IncompleteReadError:
         LOG.info("Client disconnected (incomplete): %s", peer)
     except Exception as e:
         LOG.exception("Listener error for %s: %s", peer, e)
     finally:
+        liveness.unregister(session)
         try:
             writer.close()
             await writer.wait_closed()
@@ -125,11 +425,72 @@ async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
         LOG.info("Client disconnected: %s", peer)
 
 
-async def start_server(host: str = "0.0.0.0", port: int = 9000):
-    server = await asyncio.start_server(handle_client, host, port)
-    LOG.info("ISO Listener serving on (%s, %d)", host, port)
-    async with server:
-        await server.serve_forever()
+async def start_server(
+    host: str = "0.0.0.0",
+    port: int = 9000,
+    pipeline: Optional[bool] = None,
+    max_inflight: Optional[int] = None,
+    ordered: Optional[bool] = None,
+    reuse_port: bool = False,
+    framing: Optional[str] = None,
+    admission: Optional[AdmissionController] = None,
+    liveness: Optional[PeerLiveness] = None,
+    codec: Optional[str] = None,
+    compression: Optional[bool] = None,
+    ssl_context: Optional[ssl.SSLContext] = None,
+):
+    """ssl_context (default: from ISO_TLS_CERT / ISO_TLS_KEY, see app.iso_tls) makes the listener TLS-only."""
+    liveness = liveness or LIVENESS
+    if codec and codec != "auto":
+        get_codec(codec)  # fail at startup, not on the first frame
+    handler = partial(handle_client, pipeline=pipeline, max_inflight=max_inflight, ordered=ordered,
+                      admission=admission, liveness=liveness, codec=codec, compression=compression)
+    framing = (framing or FRAMING).lower()
+    if framing not in ("stream", "protocol"):
+        raise ValueError(f"unknown ISO framing {framing!r} (expected 'stream' or 'protocol')")
+    tls = ssl_context if ssl_context is not None else server_context_from_env()
+    # reuse_port lets several worker processes bind the same port (see app.iso_supervisor)
+    if tls is not None:
+        if framing == "protocol":
+            app_factory = partial(FrameProtocol, handler)
+        else:
+            app_factory = lambda: asyncio.StreamReaderProtocol(asyncio.StreamReader(), handler)  # noqa: E731
+        server = await create_tls_server(app_factory, host, port, tls, reuse_port=reuse_port or None)
+    elif framing == "protocol":
+        server = await start_framed_server(handler, host, port, reuse_port=reuse_port or None)
+    else:
+        server = await asyncio.start_server(handler, host, port, reuse_port=reuse_port or None)
+    LOG.info("ISO Listener serving on (%s, %d) pid=%d framing=%s tls=%s", host, port, os.getpid(), framing,
+             "on" if tls is not None else "off")
+    sweeper = asyncio.create_task(liveness.run_sweeper()) if liveness.idle_timeout > 0 else None
+    detector = _detector()
+    if detector is not None:
+        # behind SO_REUSEPORT other workers record keys this one's Bloom filter never sees
+        detector.shared = detector.shared or reuse_port
+        # retransmits of messages answered before a restart are found through the database
+        LOG.info("Dedupe: %d recent keys loaded", await detector.warm())
+    snapshots = None
+    if velocity.ENABLED and velocity.snapshot_path():
+        await asyncio.to_thread(velocity.restore)
+        snapshots = asyncio.create_task(velocity.run_snapshots())
+    exports = None
+    if metrics.EXPORT_DIR:
+        # the admin app serves these (GET /metrics); the listener has no HTTP endpoint of its own
+        exports = asyncio.create_task(metrics.run_exports(metrics.EXPORT_DIR, f"listener-{os.getpid()}"))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        if sweeper is not None:
+            sweeper.cancel()
+        if exports is not None:
+            exports.cancel()
+            await asyncio.gather(exports, return_exceptions=True)
+        if snapshots is not None:
+            snapshots.cancel()
+            await asyncio.to_thread(velocity.save_snapshot)
+        # events queued for write-behind are committed before the process goes away
+        await event_sink.close_sink()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,194 @@
+# processor/app/iso_netmgmt.py
+"""
+Network-management fast path (0800 echo / sign-on / sign-off -> 0810).
+
+The MTI is read straight from the frame header — ASCII MTI frames ("0800...") or
+gateway JSON frames, where pack_iso writes "mti" as the first key — so these
+messages never reach JSON decoding, admission control, processing, logging or
+persistence. The 0810 is assembled from pre-serialized pieces with STAN (DE11),
+transmission time (DE7) and network management code (DE70) echoed. Binary ISO8583
+peers get the same echo encoded with the binary codec. An 0800 with DE70 901 is a
+compression offer (app.iso_compression); its 0810 carries the answer in DE48.
+
+PeerLiveness tracks when each connection last sent anything and last sent a
+heartbeat, and closes connections idle for longer than ISO_IDLE_TIMEOUT seconds.
+"""
+import asyncio
+import logging
+import os
+import re
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from app import iso8583_binary, metrics, serializer
+
+LOG = logging.getLogger("processor.iso_netmgmt")
+LOG.addHandler(logging.NullHandler())
+
+NETWORK_MGMT_REQUEST = b"0800"
+
+_JSON_MTI = re.compile(rb'\{\s*"mti"\s*:\s*"(\d{4})"')
+_STAN = re.compile(rb'"11"\s*:\s*"?(\d{1,12})')
+_TIME = re.compile(rb'"7"\s*:\s*"?(\d{10})')
+_NMI = re.compile(rb'"70"\s*:\s*"?(\d{1,3})')
+_DE48 = re.compile(rb'"48"\s*:\s*("(?:[^"\\]|\\.)*")')
+
+# 0810 pieces; only the echoed values are filled in per message
+_0810_HEAD = b'0810{"fields":{"39":"00"'
+_0810_STAN = b',"11":"'
+_0810_TIME = b',"7":"'
+_0810_NMI = b',"70":"'
+_QUOTE = b'"'
+_0810_TAIL = b"}}"
+
+_ECHOES = metrics.counter("iso.netmgmt.echo")
+
+
+def header_mti(framed: bytes) -> Optional[bytes]:
+    """MTI from the first bytes of a frame payload, without decoding it; None if not recognisable."""
+    head = framed[:4]
+    if len(head) == 4 and head.isdigit():
+        return head
+    if framed[:1] == b"{":
+        m = _JSON_MTI.match(framed, 0, 64)
+        if m:
+            return m.group(1)
+    return None
+
+
+def is_network_management(framed: bytes) -> bool:
+    return header_mti(framed) == NETWORK_MGMT_REQUEST
+
+
+def request_fields(framed: bytes, codec_name: Optional[str] = None) -> Dict[str, str]:
+    """DE70 and DE48 of an 0800, for requests that need more than an echo (e.g. compression offers)."""
+    if codec_name == "binary":
+        fields = iso8583_binary.decode(framed)["fields"]
+        return {k: fields[k] for k in ("70", "48") if k in fields}
+    out = {}
+    nmi = _NMI.search(framed)
+    if nmi:
+        out["70"] = nmi.group(1).decode("ascii")
+    de48 = _DE48.search(framed)
+    if de48:
+        out["48"] = serializer.loads(de48.group(1))
+    return out
+
+
+def build_0810(framed: bytes, codec_name: Optional[str] = None, extra: Optional[Dict[str, str]] = None) -> bytes:
+    """Approved 0810 for an 0800 frame, echoing DE11 / DE7 / DE70 when present, plus any `extra` fields."""
+    if codec_name == "binary":
+        return _build_binary_0810(framed, extra)
+    stan = _STAN.search(framed)
+    sent_at = _TIME.search(framed)
+    nmi = _NMI.search(framed)
+    parts = [_0810_HEAD]
+    if stan:
+        parts += (_0810_STAN, stan.group(1), _QUOTE)
+    parts += (_0810_TIME, sent_at.group(1) if sent_at else _transmission_time(), _QUOTE)
+    if nmi:
+        parts += (_0810_NMI, nmi.group(1), _QUOTE)
+    for field, value in (extra or {}).items():
+        parts += (b',"', field.encode("ascii"), b'":', serializer.dumps(str(value)))
+    parts.append(_0810_TAIL)
+    _ECHOES.inc()
+    return b"".join(parts)
+
+
+def _build_binary_0810(framed: bytes, extra: Optional[Dict[str, str]] = None) -> bytes:
+    fields = iso8583_binary.decode(framed)["fields"]
+    reply = {"39": "00", "7": fields.get("7") or _transmission_time().decode("ascii")}
+    for field in ("11", "70"):
+        if field in fields:
+            reply[field] = fields[field]
+    if extra:
+        reply.update(extra)
+    _ECHOES.inc()
+    return iso8583_binary.encode("0810", reply)
+
+
+def _transmission_time() -> bytes:
+    # DE7 format MMDDhhmmss, UTC
+    return datetime.now(timezone.utc).strftime("%m%d%H%M%S").encode("ascii")
+
+
+class PeerSession:
+    __slots__ = ("peer", "writer", "connected_at", "last_seen", "last_heartbeat", "heartbeats")
+
+    def __init__(self, peer, writer, now: float):
+        self.peer = peer
+        self.writer = writer
+        self.connected_at = now
+        self.last_seen = now
+        self.last_heartbeat: Optional[float] = None
+        self.heartbeats = 0
+
+
+class PeerLiveness:
+    def __init__(self, idle_timeout: float = 0.0, sweep_interval: Optional[float] = None):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval or max(1.0, idle_timeout / 4.0)
+        self._sessions: Dict[int, PeerSession] = {}
+        self._peers = metrics.gauge("iso.netmgmt.peers")
+        self._evicted = metrics.counter("iso.netmgmt.evicted")
+
+    @classmethod
+    def from_env(cls) -> "PeerLiveness":
+        return cls(idle_timeout=float(os.environ.get("ISO_IDLE_TIMEOUT", "0")))
+
+    def register(self, peer, writer) -> PeerSession:
+        session = PeerSession(peer, writer, time.monotonic())
+        self._sessions[id(session)] = session
+        self._peers.set(len(self._sessions))
+        return session
+
+    def unregister(self, session: PeerSession):
+        self._sessions.pop(id(session), None)
+        self._peers.set(len(self._sessions))
+
+    @staticmethod
+    def touch(session: PeerSession):
+        session.last_seen = time.monotonic()
+
+    @staticmethod
+    def heartbeat(session: PeerSession):
+        session.last_seen = session.last_heartbeat = time.monotonic()
+        session.heartbeats += 1
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """Close every connection silent for longer than idle_timeout. Returns how many were closed."""
+        if self.idle_timeout <= 0:
+            return 0
+        now = time.monotonic() if now is None else now
+        evicted = 0
+        for session in list(self._sessions.values()):
+            if now - session.last_seen > self.idle_timeout:
+                LOG.warning("Evicting idle ISO connection %s (silent %.0fs, %d heartbeats)",
+                            session.peer, now - session.last_seen, session.heartbeats)
+                try:
+                    session.writer.close()
+                except Exception:
+                    pass
+                self.unregister(session)
+                evicted += 1
+        self._evicted.inc(evicted)
+        return evicted
+
+    async def run_sweeper(self):
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            self.evict_idle()
+
+    def snapshot(self) -> list:
+        now = time.monotonic()
+        return [
+            {
+                "peer": str(s.peer),
+                "connected_s": round(now - s.connected_at, 1),
+                "idle_s": round(now - s.last_seen, 1),
+                "last_heartbeat_s": None if s.last_heartbeat is None else round(now - s.last_heartbeat, 1),
+                "heartbeats": s.heartbeats,
+            }
+            for s in self._sessions.values()
+        ]
@@ -1,12 +1,15 @@
 # processor/app/iso_processing.py
 import uuid
-import json
 import logging
 import inspect
 import asyncio
 from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
 from sqlalchemy import text
 
+from app import bin_index, event_sink, serializer, stip, tracing, validation, velocity
+from app.connectors import framework as connectors
+
 log = logging.getLogger("app.iso_processing")
 logging.basicConfig(level=logging.INFO)
 
@@ -49,8 +52,11 @@ async def _run_sync_persist_with_conn_factory(conn_factory, insert_sql, params):
                 sql_text = str(insert_sql)
                 # params is a dict; sqlite3 requires tuple in order - use named param style if present
                 try:
-                    # Try named params
-                    cur.execute(sql_text, params)
+                    # Try named params (a list of rows: one executemany)
+                    if isinstance(params, list):
+                        cur.executemany(sql_text, params)
+                    else:
+                        cur.execute(sql_text, params)
                 except Exception:
                     # Fallback: positional params
                     ordered = tuple(params[k] for k in params)
@@ -73,195 +79,426 @@ async def _run_sync_persist_with_conn_factory(conn_factory, insert_sql, params):
     await asyncio.to_thread(_blocking)
 
 
-async def persist_event(topic: str, payload: dict) -> dict:
+_INSERT_EVENT_SQL = text(
+    "INSERT INTO processor_events (id, topic, payload, created_at) VALUES (:id, :topic, :payload, :created_at)"
+)
+
+# app.db.get_session is an async context manager factory: events can go through the
+# batched app.event_sink writer. Decided once here rather than probed per event.
+_ASYNC_SESSIONS = _get_session is not None and inspect.isasyncgenfunction(getattr(_get_session, "__wrapped__", None))
+_SINK_ENABLED = event_sink.ENABLED and _ASYNC_SESSIONS
+
+
+def _event_row(topic: str, payload: dict) -> dict:
+    try:
+        payload_json = serializer.dumps_str(payload)
+    except Exception:
+        payload_json = serializer.dumps_str({"repr": str(payload)})
+    return {"id": str(uuid.uuid4()), "topic": topic, "payload": payload_json, "created_at": datetime.utcnow().isoformat()}
+
+
+async def _write_rows(insert_sql, params):
+    """One INSERT (params: dict) or one executemany in one transaction (params: list of dicts)."""
+    # If a get_session factory was imported, call it
+    if _get_session:
+        sess_obj = _get_session()
+        # If call returned awaitable, await it
+        if inspect.isawaitable(sess_obj):
+            sess_obj = await sess_obj
+
+        # Async context manager (async SQLAlchemy)
+        if hasattr(sess_obj, "__aenter__"):
+            async with sess_obj as session:
+                await session.execute(insert_sql, params)
+                await session.commit()
+        # Sync context manager factory returned
+        elif hasattr(sess_obj, "__enter__"):
+            # run blocking work in a thread
+            def _blocking_with_session():
+                with sess_obj as session:
+                    session.execute(insert_sql, params)
+                    try:
+                        session.commit()
+                    except Exception:
+                        pass
+            await asyncio.to_thread(_blocking_with_session)
+        else:
+            raise RuntimeError("get_session() returned unsupported object: %r" % (sess_obj,))
+    else:
+        # No get_session available; try storage_db.get_conn() fallback
+        if storage_db and hasattr(storage_db, "get_conn"):
+            # use conn factory inside thread
+            await _run_sync_persist_with_conn_factory(storage_db.get_conn, insert_sql, params)
+        else:
+            raise RuntimeError(
+                "No DB session factory available (checked .db, .storage.db, app.storage.db)"
+            )
+
+
+async def persist_event(topic: str, payload: dict, durable: bool = True) -> dict:
     """
     Persist an event into processor_events table.
     Accepts either async session factory or sync connection factory fallback.
+
+    With the event sink (EVENT_SINK_ENABLED, default on) the row is group-committed with
+    other events: durable=True waits for that commit, durable=False returns once the
+    row is queued (write-behind).
+    """
+    params = _event_row(topic, payload)
+    event_id, created_at = params["id"], params["created_at"]
+
+    with tracing.span("persist_event", topic=topic, durable=durable):
+        if _SINK_ENABLED:
+            try:
+                await event_sink.get_sink(_get_session, _INSERT_EVENT_SQL).submit(params, wait=durable)
+            except Exception as e:
+                log.exception("Failed to persist event: %s", e)
+                raise
+            return {"event_id": event_id, "created_at": created_at}
+
+        try:
+            await _write_rows(_INSERT_EVENT_SQL, params)
+            log.info("Persisted event topic=%s id=%s", topic, event_id)
+            return {"event_id": event_id, "created_at": created_at}
+        except Exception as e:
+            log.exception("Failed to persist event: %s", e)
+            raise
+
+
+async def persist_events(events: List[Tuple[str, dict]]) -> List[dict]:
+    """Persist (topic, payload) events in one transaction; all or nothing. Bypasses the event sink."""
+    rows = [_event_row(topic, payload) for topic, payload in events]
+    if rows:
+        with tracing.span("persist_events", rows=len(rows)):
+            try:
+                await _write_rows(_INSERT_EVENT_SQL, rows)
+            except Exception as e:
+                log.exception("Failed to persist %d events: %s", len(rows), e)
+                raise
+        log.info("Persisted %d events in one transaction", len(rows))
+    return [{"event_id": row["id"], "created_at": row["created_at"]} for row in rows]
+
+
+class _Decision(NamedTuple):
+    result: dict
+    # (topic, payload) to persist, or None
+    event: Optional[Tuple[str, dict]] = None
+    # wait for the commit (accepted payouts, approved cards); otherwise write-behind (rejects)
+    durable: bool = False
+    # a failed write does not change the result (audit of rejected payouts)
+    best_effort: bool = False
+    # stand-in decision to advise the issuer of (app.stip), persisted as a stip.advice event
+    advice: Optional[dict] = None
+
+
+def _decide(fields: dict, reasons: List[str]) -> _Decision:
+    """The response and the event to persist for one message; no I/O. `reasons`: its validation failures."""
+    topic = "clearing.incoming"
+    # ISO20022 payout flow (production validation)
+    if fields.get("type") == "iso20022":
+        if reasons:
+            log.warning("Rejected ISO20022 payout due validation failure: %s", reasons)
+            result = {
+                "approved": False,
+                "de39": "05",  # do not honor (validation/decline)
+                "error": "validation_failed:" + ",".join(reasons),
+                "de38": None,
+                "gateway_txn_id": None,
+                "txn_id": fields.get("txn_id") or None,
+                "correlation_id": fields.get("correlation_id"),
+            }
+            # persist the rejected attempt for audit / troubleshooting
+            event = ("payout.incoming.rejected", {"reason": ";".join(reasons), "incoming": fields})
+            return _Decision(result, event, best_effort=True)
+
+        # passed validation -> create payout record/event
+        protocol = str(fields.get("protocol") or "").strip()
+        auth_code = str(fields.get("auth_code") or fields.get("authCode") or "").strip()
+        payout_details = fields.get("payoutDetails") or {}
+        payout = {
+            "txn_id": fields.get("txn_id") or str(uuid.uuid4()),
+            "correlation_id": fields.get("correlation_id"),
+            "type": "iso20022",
+            "creditor_name": fields.get("creditor_name"),
+            "amount": fields.get("amount"),
+            "currency": fields.get("currency"),
+            "pain_xml": fields.get("pain_xml"),
+            "protocol": protocol,
+            "auth_code": auth_code,
+            "payoutDetails": payout_details,
+        }
+        result = {
+            "approved": True,
+            "de39": "00",
+            "gateway_txn_id": f"ISS-{uuid.uuid4()}",
+            "txn_id": payout["txn_id"],
+            "correlation_id": payout.get("correlation_id"),
+            # filled in once the event is persisted
+            "payout_event_id": None,
+            "payout_created_at": None,
+        }
+        return _Decision(result, ("payout.incoming", payout), durable=True)
+
+    # Card auth / ISO8583 fallback (existing behavior)
+    if reasons:
+        # rules for the message's own type (app.validation, "iso8583" for card messages)
+        log.warning("Rejected ISO message due validation failure: %s", reasons)
+        result = {
+            "approved": False,
+            "de39": "05",
+            "error": "validation_failed:" + ",".join(reasons),
+            "de38": None,
+            "gateway_txn_id": None,
+            "txn_id": fields.get("txn_id") or None,
+            "correlation_id": fields.get("correlation_id"),
+        }
+        return _Decision(result, (topic, {**fields, **{"response": result}}), best_effort=True)
+    card = str(fields.get("2") or fields.get("cardNumber") or "")
+    route = bin_index.lookup(card) if len(card) in (15, 16, 19) else None
+    velocity_hit = None
+    if route is not None and velocity.ENABLED:
+        merchant = str(fields.get("42") or fields.get("merchant_id") or "")
+        velocity_hit = velocity.check(card, merchant, stip.amount_minor(fields) or 0)
+    if velocity_hit is not None:
+        de39, reason = velocity_hit
+        result = {
+            "approved": False,
+            "de39": de39,
+            "error": reason,
+            "de38": None,
+            "gateway_txn_id": None,
+            "txn_id": fields.get("txn_id") or str(uuid.uuid4()),
+            "correlation_id": fields.get("correlation_id"),
+            "scheme": route.scheme,
+        }
+        log.warning("Declined card transaction over velocity limit (%s): %s", reason, result["txn_id"])
+        return _Decision(result, (topic, {**fields, **{"response": result}}))
+    if route is not None:
+        result = {
+            "approved": True,
+            "de39": "00",
+            "gateway_txn_id": f"ISS-{uuid.uuid4()}",
+            "txn_id": fields.get("txn_id") or str(uuid.uuid4()),
+            "correlation_id": fields.get("correlation_id"),
+            "scheme": route.scheme,
+            "issuer": route.issuer,
+            "product": route.product,
+        }
+        log.info("Approved card transaction: %s", result["txn_id"])
+        # the clearing record must be committed before the approval goes out
+        return _Decision(result, (topic, {**fields, **{"response": result}}), durable=True)
+
+    # default: unknown -> reject
+    result = {
+        "approved": False,
+        "de39": "96",
+        "error": None,
+        "de38": None,
+        "gateway_txn_id": None,
+        "txn_id": fields.get("txn_id"),
+        "correlation_id": fields.get("correlation_id"),
+    }
+    log.warning("Unhandled ISO message, rejecting: %s", result)
+    return _Decision(result, (topic, {**fields, **{"response": result}}))
+
+
+def _routed_to_issuer(decision: _Decision) -> bool:
+    return connectors.ENABLED and bool(decision.result.get("issuer"))
+
+
+async def _issuer_decision(fields: dict, decision: _Decision) -> _Decision:
     """
-    event_id = str(uuid.uuid4())
-    created_at = datetime.utcnow().isoformat()
+    A card decision routed by BIN, with the issuer's reply (app.connectors.framework) as the
+    result, or the processor's stand-in answer (app.stip) when the issuer is unavailable.
+    """
+    reply = await stip.authorize(decision.result["issuer"], fields)
+    result = {
+        **decision.result,
+        "approved": bool(reply.get("approved")),
+        "de39": str(reply.get("de39") or "96"),
+        "gateway_txn_id": reply.get("gateway_txn_id"),
+    }
+    if reply.get("error"):
+        result["error"] = reply["error"]
+    if reply.get("stand_in"):
+        result.update(stand_in=True, stand_in_reason=reply.get("stand_in_reason"))
+        result.pop("error", None)
+    if reply.get("auth_code"):
+        result["auth_code"] = reply["auth_code"]
+    return decision._replace(result=result, event=(decision.event[0], {**fields, **{"response": result}}),
+                             durable=decision.durable or "advice" in reply, advice=reply.get("advice"))
+
 
+async def _batch_issuer_decision(fields: dict, decision: _Decision):
+    """_issuer_decision for one batch item; an exception is returned instead of raised, so it fails that item only."""
     try:
-        payload_json = json.dumps(payload, default=str, ensure_ascii=False)
-    except Exception:
-        payload_json = json.dumps({"repr": str(payload)}, ensure_ascii=False)
+        return await _issuer_decision(fields, decision)
+    except Exception as e:
+        return e
+
 
-    insert_sql = text(
-        "INSERT INTO processor_events (id, topic, payload, created_at) VALUES (:id, :topic, :payload, :created_at)"
-    )
-    params = {"id": event_id, "topic": topic, "payload": payload_json, "created_at": created_at}
+def _link_event(result: dict, rv: dict):
+    if "payout_event_id" in result:
+        result["payout_event_id"] = rv.get("event_id")
+        result["payout_created_at"] = rv.get("created_at")
+        log.info("Processed ISO20022 payout (validated): txn=%s event=%s", result["txn_id"], rv.get("event_id"))
 
+
+def _error_result(fields, e: Exception) -> dict:
+    log.exception("Unexpected error in process_incoming_iso: %s", e)
+    fields = fields if isinstance(fields, dict) else {}
     try:
-        # If a get_session factory was imported, call it
-        if _get_session:
-            sess_obj = _get_session()
-            # If call returned awaitable, await it
-            if inspect.isawaitable(sess_obj):
-                sess_obj = await sess_obj
-
-            # Async context manager (async SQLAlchemy)
-            if hasattr(sess_obj, "__aenter__"):
-                async with sess_obj as session:
-                    await session.execute(insert_sql, params)
-                    await session.commit()
-            # Sync context manager factory returned
-            elif hasattr(sess_obj, "__enter__"):
-                # run blocking work in a thread
-                def _blocking_with_session():
-                    with sess_obj as session:
-                        session.execute(insert_sql, params)
-                        try:
-                            session.commit()
-                        except Exception:
-                            pass
-                await asyncio.to_thread(_blocking_with_session)
-            else:
-                raise RuntimeError("get_session() returned unsupported object: %r" % (sess_obj,))
-        else:
-            # No get_session available; try storage_db.get_conn() fallback
-            if storage_db and hasattr(storage_db, "get_conn"):
-                # use conn factory inside thread
-                await _run_sync_persist_with_conn_factory(storage_db.get_conn, insert_sql, params)
-            else:
-                raise RuntimeError(
-                    "No DB session factory available (checked .db, .storage.db, app.storage.db)"
-                )
+        fn = globals().get("debug_iso_decision")
+        if callable(fn):
+            try:
+                fn({"fields": fields, "error_reason": str(e)})
+            except Exception:
+                pass
+    except Exception:
+        pass
 
-        log.info("Persisted event topic=%s id=%s", topic, event_id)
-        return {"event_id": event_id, "created_at": created_at}
-    except Exception as e:
-        log.exception("Failed to persist event: %s", e)
-        raise
+    return {
+        "approved": False,
+        "de39": "96",
+        "error": str(e),
+        "de38": None,
+        "gateway_txn_id": None,
+        "txn_id": fields.get("txn_id"),
+        "correlation_id": fields.get("correlation_id"),
+    }
 
 
 async def process_incoming_iso(fields: dict) -> dict:
     """
     Handle both ISO8583 card messages and ISO20022 payout JSONs.
 
-    Validation rules added for production:
+    Validation rules for production (app.validation.DEFAULT_RULES, overridable per file):
       - For type == 'iso20022' require a trusted protocol pattern and a numeric auth_code (3-6 digits)
-      - Require payoutDetails.iban
+      - Require a valid payoutDetails.iban (country length, BBAN format, mod-97; app.iban), and a
+        well-formed payoutDetails.bic when one is given
+      - Every other message is checked against the rules for its own type ("iso8583" for card
+        messages without a type; none by default) and declined with DE39 05 when it fails them
     Returns a dict with de39 and other metadata suitable for the listener/app.
     """
-    topic = "clearing.incoming"
-    try:
-        # ISO20022 payout flow (production validation)
-        if fields.get("type") == "iso20022":
-            protocol = (fields.get("protocol") or "").strip()
-            auth_code = (fields.get("auth_code") or fields.get("authCode") or "").strip()
-            payout_details = fields.get("payoutDetails") or {}
-
-            # basic validations (tune regex / rules to your production policy)
-            import re
-            protocol_ok = bool(re.match(r"^101\.\d+$", protocol))
-            auth_ok = bool(re.match(r"^\d{3,6}$", auth_code))
-            iban_ok = bool(payout_details.get("iban"))
-
-            if not protocol_ok or not auth_ok or not iban_ok:
-                # Log reasons for audit
-                reasons = []
-                if not protocol_ok:
-                    reasons.append(f"invalid_protocol:{protocol!s}")
-                if not auth_ok:
-                    reasons.append(f"invalid_auth_code:{auth_code!s}")
-                if not iban_ok:
-                    reasons.append("missing_iban")
-                log.warning("Rejected ISO20022 payout due validation failure: %s", reasons)
-
-                # Optionally persist the rejected attempt for audit / troubleshooting
+    with tracing.span("process_incoming_iso"):
+        try:
+            # rules live in app.validation (DEFAULT_RULES / VALIDATION_RULES_FILE)
+            with tracing.span("validate"):
+                reasons = validation.validate(fields)
+            # BIN routing and velocity checks for card messages
+            with tracing.span("decide"):
+                decision = _decide(fields, reasons)
+            if _routed_to_issuer(decision):
+                decision = await _issuer_decision(fields, decision)
+            if decision.event is not None:
                 try:
-                    await persist_event("payout.incoming.rejected", {
-                        "reason": ";".join(reasons),
-                        "incoming": fields,
-                    })
+                    rv = await persist_event(*decision.event, durable=decision.durable)
                 except Exception:
+                    if not decision.best_effort:
+                        raise
                     # don't mask the validation response on persistence failure
                     log.exception("Failed to persist rejected payout event")
+                else:
+                    _link_event(decision.result, rv)
+            if decision.advice is not None:
+                await persist_event("stip.advice", decision.advice, durable=True)
+            return decision.result
+        except Exception as e:
+            return _error_result(fields, e)
 
-                return {
-                    "approved": False,
-                    "de39": "05",  # do not honor (validation/decline)
-                    "error": "validation_failed:" + ",".join(reasons),
-                    "de38": None,
-                    "gateway_txn_id": None,
-                    "txn_id": fields.get("txn_id") or None,
-                    "correlation_id": fields.get("correlation_id"),
-                }
-
-            # passed validation -> create payout record/event
-            payout = {
-                "txn_id": fields.get("txn_id") or str(uuid.uuid4()),
-                "correlation_id": fields.get("correlation_id"),
-                "type": "iso20022",
-                "creditor_name": fields.get("creditor_name"),
-                "amount": fields.get("amount"),
-                "currency": fields.get("currency"),
-                "pain_xml": fields.get("pain_xml"),
-                "protocol": protocol,
-                "auth_code": auth_code,
-                "payoutDetails": payout_details,
-            }
-            rv = await persist_event("payout.incoming", payout)
-
-            resp = {
-                "approved": True,
-                "de39": "00",
-                "gateway_txn_id": f"ISS-{uuid.uuid4()}",
-                "txn_id": payout["txn_id"],
-                "correlation_id": payout.get("correlation_id"),
-                "payout_event_id": rv.get("event_id"),
-                "payout_created_at": rv.get("created_at"),
-            }
-            log.info("Processed ISO20022 payout (validated): txn=%s event=%s", resp["txn_id"], rv.get("event_id"))
-            return resp
-
-        # Card auth / ISO8583 fallback (existing behavior)
-        card = str(fields.get("2") or fields.get("cardNumber") or "")
-        if card.startswith(("4", "5", "6")) and len(card) in (15, 16, 19):
-            resp = {
-                "approved": True,
-                "de39": "00",
-                "gateway_txn_id": f"ISS-{uuid.uuid4()}",
-                "txn_id": fields.get("txn_id") or str(uuid.uuid4()),
-                "correlation_id": fields.get("correlation_id"),
-            }
-            await persist_event(topic, {**fields, **{"response": resp}})
-            log.info("Approved card transaction: %s", resp["txn_id"])
-            return resp
 
-        # default: unknown -> reject
-        result = {
-            "approved": False,
-            "de39": "96",
-            "error": None,
-            "de38": None,
-            "gateway_txn_id": None,
-            "txn_id": fields.get("txn_id"),
-            "correlation_id": fields.get("correlation_id"),
-        }
-        await persist_event(topic, {**fields, **{"response": result}})
-        log.warning("Unhandled ISO message, rejecting: %s", result)
-        return result
+async def process_incoming_iso_batch(items: List[dict]) -> List[dict]:
+    """
+    process_incoming_iso for a burst of messages: one validation pass over all of them and
+    one transaction for all their events (accepted and rejected). Results come back in input
+    order. An item that fails on its own gets DE39 96 without affecting the others. If the
+    transaction fails, every item whose event mattered (all but rejected messages) gets 96.
+    """
+    items = list(items)
+    results: List[Optional[dict]] = [None] * len(items)
+    objects = [i for i, fields in enumerate(items) if isinstance(fields, dict)]
+    reasons = dict(zip(objects, validation.validate_many(items[i] for i in objects)))
 
-    except Exception as e:
-        log.exception("Unexpected error in process_incoming_iso: %s", e)
+    decisions: List[Tuple[int, _Decision]] = []
+    for i, fields in enumerate(items):
         try:
-            fn = globals().get("debug_iso_decision")
-            if callable(fn):
-                try:
-                    fn({"fields": fields, "error_reason": str(e)})
-                except Exception:
-                    pass
-        except Exception:
-            pass
+            if not isinstance(fields, dict):
+                raise ValueError(f"batch item {i} is not a JSON object")
+            decision = _decide(fields, reasons.get(i, []))
+        except Exception as e:
+            results[i] = _error_result(fields, e)
+            continue
+        results[i] = decision.result
+        if decision.event is not None:
+            decisions.append((i, decision))
 
-        return {
-            "approved": False,
-            "de39": "96",
-            "error": str(e),
-            "de38": None,
-            "gateway_txn_id": None,
-            "txn_id": fields.get("txn_id"),
-            "correlation_id": fields.get("correlation_id"),
-        }
+    # issuer round trips run concurrently, before the one transaction
+    routed = [n for n, (_, decision) in enumerate(decisions) if _routed_to_issuer(decision)]
+    if routed:
+        replies = await asyncio.gather(*(_batch_issuer_decision(items[decisions[n][0]], decisions[n][1])
+                                         for n in routed))
+        failed = set()
+        for n, reply in zip(routed, replies):
+            i = decisions[n][0]
+            if isinstance(reply, Exception):
+                # only this item fails; its event is not persisted, as in process_incoming_iso
+                results[i] = _error_result(items[i], reply)
+                failed.add(n)
+            else:
+                decisions[n] = (i, reply)
+                results[i] = reply.result
+        decisions = [d for n, d in enumerate(decisions) if n not in failed]
 
+    events = [d.event for _, d in decisions] + [("stip.advice", d.advice) for _, d in decisions if d.advice]
+    try:
+        stored = await persist_events(events)
+    except Exception as e:
+        for i, decision in decisions:
+            if not decision.best_effort:
+                results[i] = _error_result(items[i], e)
+    else:
+        for (_, decision), rv in zip(decisions, stored):
+            _link_event(decision.result, rv)
+    return results
+
+
+class BatchDispatcher:
+    """
+    Coalesces concurrent process_incoming_iso calls into process_incoming_iso_batch calls.
+    Messages submitted within `window_ms` of the first one (0: within the same event-loop
+    pass, e.g. frames read from one burst) go out as one batch of at most `max_batch`.
+    """
+
+    def __init__(self, window_ms: float = 0.0, max_batch: int = 256):
+        self.window = max(0.0, window_ms) / 1000.0
+        self.max_batch = max(1, max_batch)
+        self._items: List[Tuple[dict, asyncio.Future]] = []
+        self._timer = None
+
+    async def submit(self, fields: dict) -> dict:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._items.append((fields, fut))
+        if len(self._items) >= self.max_batch:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch) if self.window else loop.call_soon(self._dispatch)
+        return await fut
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items, self._items = self._items, []
+        if items:
+            asyncio.get_running_loop().create_task(self._run(items))
+
+    @staticmethod
+    async def _run(items: List[Tuple[dict, asyncio.Future]]):
+        try:
+            results = await process_incoming_iso_batch([fields for fields, _ in items])
+        except Exception as e:
+            results = [_error_result(fields, e) for fields, _ in items]
+        for (_, fut), result in zip(items, results):
+            if not fut.done():
+                fut.set_result(result)
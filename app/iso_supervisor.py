@@ -0,0 +1,201 @@
+# processor/app/iso_supervisor.py
+"""
+Multi-process ISO listener.
+
+N worker processes each run their own asyncio listener bound to the same port with
+SO_REUSEPORT, so the kernel spreads incoming connections across cores. A small
+supervisor loop restarts workers that die, with a growing delay when they crash
+right after start.
+
+    python -m app.iso_supervisor --workers 4 --port 9000 --pipeline
+
+Listener options (pipelining, framing, codec, admission control, compression,
+TLS) are passed on to every worker; those not given fall back to the ISO_*
+environment the workers inherit.
+
+Run the HTTP app with ISO_LISTENER_EMBEDDED=0 alongside this so uvicorn workers do
+not also try to bind the ISO port.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+from typing import Dict, Optional
+
+LOG = logging.getLogger("processor.iso_supervisor")
+
+# a worker that dies sooner than this after start counts as a crash loop
+MIN_HEALTHY_UPTIME = 5.0
+MAX_RESTART_DELAY = 30.0
+
+
+def _worker_options(options: dict) -> dict:
+    """
+    Supervisor options (plain, picklable values) -> start_server keyword arguments.
+    "admission" holds AdmissionController settings that override ISO_ADMIT_* / ISO_ADMISSION,
+    "tls" holds certfile / keyfile / cafile for app.iso_tls.server_context.
+    """
+    from app.iso_admission import AdmissionController
+    from app.iso_tls import server_context
+
+    kwargs = {k: v for k, v in options.items() if k not in ("admission", "tls")}
+    admission = {k: v for k, v in (options.get("admission") or {}).items() if v is not None}
+    if admission:
+        env = AdmissionController.from_env()
+        settings = {"max_inflight": env.max_inflight, "max_per_connection": env.max_per_connection,
+                    "queue_budget_ms": env.queue_budget * 1000.0, "shed_de39": env.shed_de39, "enabled": env.enabled}
+        kwargs["admission"] = AdmissionController(**{**settings, **admission})
+    tls = options.get("tls") or {}
+    if tls.get("certfile"):
+        kwargs["ssl_context"] = server_context(tls["certfile"], tls.get("keyfile"), tls.get("cafile"))
+    return kwargs
+
+
+def _worker_main(host: str, port: int, options: dict):
+    """Entry point of one worker process."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the supervisor owns Ctrl-C
+    # stopped while still starting up: nothing to drain yet, exit cleanly
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    # imported here so the supervisor itself never touches the DB / processing stack
+    from app.iso_listener import start_server
+
+    logging.basicConfig(level=logging.INFO)
+    options = _worker_options(options)
+
+    async def serve():
+        # SIGTERM from the supervisor cancels the server so start_server's cleanup
+        # (draining the event sink) runs before the process exits
+        task = asyncio.current_task()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, task.cancel)
+        try:
+            await start_server(host=host, port=port, reuse_port=True, **options)
+        except asyncio.CancelledError:
+            pass
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+class ListenerSupervisor:
+    """Start, watch and restart the listener worker processes."""
+
+    def __init__(self, host: str = "0.0.0.0", port: int = 9000, workers: Optional[int] = None, options: Optional[dict] = None):
+        if not hasattr(socket, "SO_REUSEPORT"):
+            raise RuntimeError("SO_REUSEPORT is not available on this platform")
+        self.host = host
+        self.port = port
+        self.workers = workers or os.cpu_count() or 1
+        self.options = dict(options or {})
+        self._ctx = multiprocessing.get_context("spawn")
+        self._procs: Dict[int, multiprocessing.Process] = {}
+        self._started_at: Dict[int, float] = {}
+        self._restart_delay: Dict[int, float] = {}
+        self._restart_due: Dict[int, float] = {}
+        self._stopping = False
+
+    def _spawn(self, slot: int):
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(self.host, self.port, self.options),
+            name=f"iso-listener-{slot}",
+            daemon=False,
+        )
+        proc.start()
+        self._procs[slot] = proc
+        self._started_at[slot] = time.monotonic()
+        LOG.info("Started ISO listener worker %d pid=%s", slot, proc.pid)
+
+    def start(self):
+        for slot in range(self.workers):
+            self._spawn(slot)
+
+    def check(self):
+        """Restart any worker that has exited. Call periodically."""
+        now = time.monotonic()
+        for slot, proc in list(self._procs.items()):
+            if proc.is_alive() or self._stopping:
+                continue
+            if slot not in self._restart_due:
+                uptime = now - self._started_at.get(slot, now)
+                if uptime < MIN_HEALTHY_UPTIME:
+                    delay = min(MAX_RESTART_DELAY, max(0.5, self._restart_delay.get(slot, 0.0) * 2))
+                else:
+                    delay = 0.0
+                self._restart_delay[slot] = delay
+                self._restart_due[slot] = now + delay
+                LOG.warning("ISO listener worker %d pid=%s exited with %s; restarting in %.1fs", slot, proc.pid, proc.exitcode, delay)
+            if now >= self._restart_due[slot]:
+                del self._restart_due[slot]
+                self._spawn(slot)
+
+    def stop(self, timeout: float = 10.0):
+        self._stopping = True
+        for proc in self._procs.values():
+            if proc.is_alive():
+                proc.terminate()
+        deadline = time.monotonic() + timeout
+        for proc in self._procs.values():
+            proc.join(max(0.0, deadline - time.monotonic()))
+            if proc.is_alive():
+                proc.kill()
+                proc.join()
+        LOG.info("ISO listener workers stopped")
+
+    def run_forever(self, poll_interval: float = 0.5):
+        stop_requested = []
+
+        def _request_stop(signum, frame):
+            stop_requested.append(signum)
+
+        signal.signal(signal.SIGTERM, _request_stop)
+        signal.signal(signal.SIGINT, _request_stop)
+        self.start()
+        try:
+            while not stop_requested:
+                self.check()
+                time.sleep(poll_interval)
+        finally:
+            self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the ISO listener as N SO_REUSEPORT worker processes")
+    parser.add_argument("--host", default=os.environ.get("ISO_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("ISO_PORT", "9000")))
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("ISO_WORKERS", "0")) or None,
+                        help="number of worker processes (default: CPU count)")
+    parser.add_argument("--pipeline", action="store_true", default=None, help="enable pipelined frame handling")
+    parser.add_argument("--max-inflight", type=int, default=None)
+    parser.add_argument("--ordered", action="store_true", default=None)
+    parser.add_argument("--framing", choices=("stream", "protocol"), default=None)
+    parser.add_argument("--codec", default=None, help="auto (sniff per connection) or a codec name")
+    parser.add_argument("--no-admission", dest="admission", action="store_false", default=None,
+                        help="disable admission control / load shedding")
+    parser.add_argument("--admit-max-inflight", type=int, default=None)
+    parser.add_argument("--admit-max-per-conn", type=int, default=None)
+    parser.add_argument("--admit-queue-ms", type=float, default=None)
+    parser.add_argument("--compression", action="store_true", default=None, help="allow negotiated compression")
+    parser.add_argument("--tls-cert", default=None, help="serve TLS only, with this certificate (PEM)")
+    parser.add_argument("--tls-key", default=None)
+    parser.add_argument("--tls-ca", default=None, help="require client certificates signed by this CA")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # options left as None fall back to the ISO_* environment inherited by the workers
+    options = {"pipeline": args.pipeline, "max_inflight": args.max_inflight, "ordered": args.ordered, "framing": args.framing,
+               "codec": args.codec, "compression": args.compression,
+               "admission": {"enabled": args.admission, "max_inflight": args.admit_max_inflight,
+                             "max_per_connection": args.admit_max_per_conn, "queue_budget_ms": args.admit_queue_ms},
+               "tls": {"certfile": args.tls_cert, "keyfile": args.tls_key, "cafile": args.tls_ca}}
+    ListenerSupervisor(args.host, args.port, args.workers, options).run_forever()
+
+
+if __name__ == "__main__":
+    main()
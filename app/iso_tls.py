@@ -0,0 +1,162 @@
+# processor/app/iso_tls.py
+"""
+TLS termination for the ISO listener.
+
+With ISO_TLS_CERT / ISO_TLS_KEY set, app.iso_listener.start_server accepts TLS only,
+for either framing (asyncio streams or FrameProtocol). Handshakes are timed from
+accept to completion:
+
+  - iso.tls.handshake_ms (histogram), iso.tls.accepted / handshakes / resumed (counters),
+  - HANDSHAKES: per peer host, count / resumed / last and max handshake time.
+
+Resumption: the server context keeps OpenSSL's session cache and issues
+ISO_TLS_TICKETS session tickets per handshake, so a reconnecting gateway that
+presents its previous session skips the full handshake. Ticket keys live in each
+process's SSLContext: behind app.iso_supervisor a peer resumes only when it lands
+on the same worker again.
+
+ISO_TLS_CA enables client-certificate verification (mutual TLS).
+generate_self_signed() creates a throwaway cert/key pair for local testing
+(requires the openssl CLI).
+"""
+import asyncio
+import logging
+import os
+import ssl
+import subprocess
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from app import metrics
+
+LOG = logging.getLogger("processor.iso_tls")
+LOG.addHandler(logging.NullHandler())
+
+HANDSHAKE_TIMEOUT = float(os.environ.get("ISO_TLS_HANDSHAKE_TIMEOUT", "10"))
+# per-host handshake stats kept for at most this many peer hosts
+MAX_TRACKED_PEERS = 1024
+
+_handshake_ms = metrics.histogram("iso.tls.handshake_ms")
+_handshakes = metrics.counter("iso.tls.handshakes")
+_resumed = metrics.counter("iso.tls.resumed")
+# accepted - handshakes = handshakes that failed or are still running
+_accepted = metrics.counter("iso.tls.accepted")
+
+
+def server_context(certfile: str, keyfile: Optional[str] = None, cafile: Optional[str] = None,
+                   tickets: int = 2) -> ssl.SSLContext:
+    ctx = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    ctx.minimum_version = ssl.TLSVersion.TLSv1_2
+    ctx.load_cert_chain(certfile, keyfile)
+    if cafile:
+        ctx.load_verify_locations(cafile)
+        ctx.verify_mode = ssl.CERT_REQUIRED
+    # TLS 1.3 resumption tickets sent after each full handshake (TLS 1.2 uses the session cache)
+    ctx.num_tickets = tickets
+    ctx.options &= ~ssl.OP_NO_TICKET
+    return ctx
+
+
+def client_context(cafile: Optional[str] = None, certfile: Optional[str] = None,
+                   keyfile: Optional[str] = None, verify: bool = True) -> ssl.SSLContext:
+    ctx = ssl.create_default_context(cafile=cafile)
+    if certfile:
+        ctx.load_cert_chain(certfile, keyfile)
+    if not verify:
+        ctx.check_hostname = False
+        ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+def server_context_from_env() -> Optional[ssl.SSLContext]:
+    """Server context from ISO_TLS_CERT / ISO_TLS_KEY / ISO_TLS_CA / ISO_TLS_TICKETS; None when TLS is off."""
+    certfile = os.environ.get("ISO_TLS_CERT", "").strip()
+    if not certfile:
+        return None
+    return server_context(
+        certfile,
+        os.environ.get("ISO_TLS_KEY", "").strip() or None,
+        os.environ.get("ISO_TLS_CA", "").strip() or None,
+        tickets=int(os.environ.get("ISO_TLS_TICKETS", "2")),
+    )
+
+
+def generate_self_signed(directory: str, common_name: str = "localhost", days: int = 30) -> Tuple[str, str]:
+    """Write a self-signed cert.pem / key.pem pair for common_name into directory; returns their paths."""
+    os.makedirs(directory, exist_ok=True)
+    certfile = os.path.join(directory, "cert.pem")
+    keyfile = os.path.join(directory, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "ec", "-pkeyopt", "ec_paramgen_curve:prime256v1", "-nodes",
+         "-keyout", keyfile, "-out", certfile, "-days", str(days), "-subj", f"/CN={common_name}",
+         "-addext", f"subjectAltName=DNS:{common_name},IP:127.0.0.1"],
+        check=True, capture_output=True,
+    )
+    return certfile, keyfile
+
+
+class HandshakeStats:
+    """Handshake count / resumptions / timings per peer host (LRU-bounded)."""
+
+    def __init__(self, max_peers: int = MAX_TRACKED_PEERS):
+        self.max_peers = max_peers
+        self._peers: "OrderedDict[str, dict]" = OrderedDict()
+
+    def record(self, host: str, elapsed_ms: float, resumed: bool):
+        stats = self._peers.pop(host, None) or {"handshakes": 0, "resumed": 0, "last_ms": 0.0, "max_ms": 0.0}
+        stats["handshakes"] += 1
+        stats["resumed"] += resumed
+        stats["last_ms"] = round(elapsed_ms, 3)
+        stats["max_ms"] = max(stats["max_ms"], stats["last_ms"])
+        self._peers[host] = stats
+        if len(self._peers) > self.max_peers:
+            self._peers.popitem(last=False)
+
+    def snapshot(self) -> dict:
+        return {host: dict(stats) for host, stats in self._peers.items()}
+
+
+HANDSHAKES = HandshakeStats()
+
+
+def _record_handshake(transport, started: float):
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    peer = transport.get_extra_info("peername")
+    ssl_object = transport.get_extra_info("ssl_object")
+    resumed = bool(ssl_object is not None and ssl_object.session_reused)
+    _handshakes.inc()
+    _resumed.inc(resumed)
+    _handshake_ms.observe(elapsed_ms)
+    HANDSHAKES.record(str(peer[0]) if isinstance(peer, tuple) else str(peer), elapsed_ms, resumed)
+    LOG.info("TLS handshake with %s: %.1f ms %s %s", peer, elapsed_ms,
+             ssl_object.version() if ssl_object else "?", "resumed" if resumed else "full")
+
+
+def timed_protocol_factory(app_factory: Callable[[], asyncio.BaseProtocol]) -> Callable[[], asyncio.BaseProtocol]:
+    """
+    Wrap the protocol factory handed to loop.create_server(ssl=...). asyncio builds the
+    protocol when it accepts the socket and calls its connection_made() once the handshake
+    has completed, so the time in between is the server-side handshake time.
+    """
+    def factory():
+        app = app_factory()
+        started = time.perf_counter()
+        _accepted.inc()
+        connection_made = app.connection_made
+
+        def _connection_made(transport):
+            _record_handshake(transport, started)
+            connection_made(transport)
+
+        app.connection_made = _connection_made
+        return app
+
+    return factory
+
+
+async def create_tls_server(app_factory: Callable[[], asyncio.BaseProtocol], host: str, port: int,
+                            ssl_context: ssl.SSLContext, **kwargs) -> asyncio.AbstractServer:
+    loop = asyncio.get_running_loop()
+    kwargs.setdefault("ssl_handshake_timeout", HANDSHAKE_TIMEOUT)
+    return await loop.create_server(timed_protocol_factory(app_factory), host, port, ssl=ssl_context, **kwargs)
@@ -0,0 +1,193 @@
+# processor/app/metrics.py
+"""
+Process-local metrics: counters, gauges and fixed-bucket latency histograms.
+
+Everything registers in one registry so the HTTP app can expose a single JSON
+snapshot (GET /metrics). Values are per process — with the multi-process
+listener each worker keeps its own.
+
+The listener has no HTTP endpoint, so with METRICS_DIR set each listener
+process writes its snapshot to <METRICS_DIR>/listener-<pid>.json every
+METRICS_EXPORT_S (5) seconds. The admin app serves those files at GET /metrics,
+skipping ones that stopped being refreshed (an exited worker).
+"""
+import asyncio
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+LOG = logging.getLogger("processor.metrics")
+LOG.addHandler(logging.NullHandler())
+
+EXPORT_DIR = os.environ.get("METRICS_DIR", "").strip() or None
+EXPORT_INTERVAL = float(os.environ.get("METRICS_EXPORT_S", "5"))
+
+# milliseconds
+DEFAULT_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+
+class Counter:
+    __slots__ = ("name", "value")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    __slots__ = ("name", "value")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, n=1):
+        self.value += n
+
+    def dec(self, n=1):
+        self.value -= n
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    """Fixed upper-bound buckets (last bucket is +inf); percentiles are bucket upper bounds."""
+
+    __slots__ = ("name", "bounds", "counts", "count", "sum", "max")
+
+    def __init__(self, name: str, buckets: Optional[Sequence[float]] = None):
+        self.name = name
+        self.bounds = tuple(sorted(buckets or DEFAULT_BUCKETS))
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p: float) -> Optional[float]:
+        """Upper bound of the bucket holding the p-th percentile (p in 0..100); None when empty."""
+        if not self.count:
+            return None
+        rank = max(1, int(round(self.count * p / 100.0)))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "max": round(self.max, 3),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": {("+inf" if i == len(self.bounds) else str(self.bounds[i])): n for i, n in enumerate(self.counts) if n},
+        }
+
+
+_LOCK = threading.Lock()
+_REGISTRY: Dict[str, object] = {}
+
+
+def _get_or_create(name: str, cls, *args):
+    metric = _REGISTRY.get(name)
+    if metric is None:
+        with _LOCK:
+            metric = _REGISTRY.get(name)
+            if metric is None:
+                metric = cls(name, *args)
+                _REGISTRY[name] = metric
+    if not isinstance(metric, cls):
+        raise TypeError(f"metric {name!r} already registered as {type(metric).__name__}")
+    return metric
+
+
+def counter(name: str) -> Counter:
+    return _get_or_create(name, Counter)
+
+
+def gauge(name: str) -> Gauge:
+    return _get_or_create(name, Gauge)
+
+
+def histogram(name: str, buckets: Optional[Sequence[float]] = None) -> Histogram:
+    return _get_or_create(name, Histogram, buckets)
+
+
+def snapshot(prefix: str = "") -> dict:
+    """All registered metrics (optionally only names starting with prefix) as plain JSON data."""
+    with _LOCK:
+        items = sorted(_REGISTRY.items())
+    return {name: metric.snapshot() for name, metric in items if name.startswith(prefix)}
+
+
+def export(directory: str, name: str) -> str:
+    """Write this process's snapshot to <directory>/<name>.json (replaced atomically); returns the path."""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{name}.json")
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"pid": os.getpid(), "exported_at": time.time(), "metrics": snapshot()}, fh)
+    os.replace(tmp, path)
+    return path
+
+
+def collect(directory: str, max_age: Optional[float] = None) -> dict:
+    """Snapshots exported into `directory`, by name, skipping ones older than `max_age` seconds."""
+    out = {}
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return out
+    now = time.time()
+    for fname in names:
+        if not fname.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(directory, fname), encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            continue
+        if max_age is not None and now - data.get("exported_at", 0) > max_age:
+            continue
+        out[fname[:-5]] = data
+    return out
+
+
+async def run_exports(directory: str, name: str, interval: float = EXPORT_INTERVAL):
+    """Export every `interval` seconds (off the event loop) until cancelled; the file is removed on exit."""
+    try:
+        while True:
+            try:
+                await asyncio.to_thread(export, directory, name)
+            except OSError as e:
+                LOG.warning("Could not export metrics to %s: %s", directory, e)
+            await asyncio.sleep(interval)
+    finally:
+        try:
+            os.remove(os.path.join(directory, f"{name}.json"))
+        except OSError:
+            pass
@@ -61,8 +61,21 @@ class ProcessorEvent(Base):
         return f"<ProcessorEvent id={self.id} topic={self.topic} created_at={self.created_at}>"
 
 
+class ProcessedMessage(Base):
+    """Response recorded for a processed ISO message, keyed by its dedupe digest (see app.dedupe)."""
+    __tablename__ = "processor_dedupe"
+
+    key = Column(String(32), primary_key=True)
+    response = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f"<ProcessedMessage key={self.key} created_at={self.created_at}>"
+
+
 Index("ix_clearing_txn_id", ClearingEntry.txn_id)
 Index("ix_event_topic", ProcessorEvent.topic)
+Index("ix_dedupe_created_at", ProcessedMessage.created_at)
 
 
 # -------------------------
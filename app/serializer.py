@@ -0,0 +1,95 @@
+# processor/app/serializer.py
+"""
+One JSON layer for the hot paths: ISO codec frames, listener responses, persisted
+event payloads and the /payout response.
+
+Output is always compact UTF-8 (separators=(",", ":"), ensure_ascii=False) with
+default=str for anything JSON cannot represent (datetimes, Decimals, dataclasses...).
+orjson is used when it is installed, the stdlib encoder otherwise, with
+byte-identical output for the payloads we handle (app/tests/serializer_test.py).
+Values orjson would write differently — integers beyond 64 bits, NaN/Infinity —
+are handed to the stdlib. The one remaining difference is exponent formatting of
+floats below 1e-4 or from 1e16 up (1e16 instead of 1e+16); both are valid JSON
+and amounts travel as strings.
+
+JSON_BACKEND=json forces the stdlib backend.
+
+    python -m app.bench.serializer   # bytes/sec per backend on ISO20022 payloads
+"""
+import json
+import logging
+import math
+import os
+
+LOG = logging.getLogger("processor.serializer")
+LOG.addHandler(logging.NullHandler())
+
+_STDLIB_ENCODER = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _stdlib_dumps(obj) -> bytes:
+    return _STDLIB_ENCODER.encode(obj).encode("utf-8")
+
+
+def _stdlib_loads(data):
+    return json.loads(data)
+
+
+try:
+    import orjson as _orjson
+except ImportError:
+    _orjson = None
+
+if _orjson is not None:
+    # datetimes and dataclasses go through default=str like they do with the stdlib;
+    # non-str keys are stringified the way json.dumps does it
+    _ORJSON_OPTIONS = _orjson.OPT_PASSTHROUGH_DATETIME | _orjson.OPT_PASSTHROUGH_DATACLASS | _orjson.OPT_NON_STR_KEYS
+
+    def _orjson_dumps(obj) -> bytes:
+        try:
+            out = _orjson.dumps(obj, default=str, option=_ORJSON_OPTIONS)
+        except _orjson.JSONEncodeError:
+            # > 64-bit integers and the like: the stdlib handles them (or raises the usual error)
+            return _stdlib_dumps(obj)
+        if b"null" in out and _has_non_finite(obj):
+            return _stdlib_dumps(obj)
+        return out
+
+    def _orjson_loads(data):
+        try:
+            return _orjson.loads(data)
+        except _orjson.JSONDecodeError:
+            # NaN/Infinity literals and big integers parse with the stdlib; real errors raise from there
+            return json.loads(data)
+
+
+def _has_non_finite(obj) -> bool:
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, dict):
+        return any(_has_non_finite(v) for v in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(v) for v in obj)
+    return False
+
+
+BACKENDS = {"json": (_stdlib_dumps, _stdlib_loads)}
+if _orjson is not None:
+    BACKENDS["orjson"] = (_orjson_dumps, _orjson_loads)
+
+
+def _select(requested: str) -> str:
+    if requested and requested != "auto":
+        if requested in BACKENDS:
+            return requested
+        LOG.warning("JSON_BACKEND=%s is not available; using %s", requested, "orjson" if _orjson else "json")
+    return "orjson" if _orjson is not None else "json"
+
+
+BACKEND = _select(os.environ.get("JSON_BACKEND", "auto").strip().lower())
+dumps, loads = BACKENDS[BACKEND]
+
+
+def dumps_str(obj) -> str:
+    """dumps() as text, for TEXT columns and log lines."""
+    return dumps(obj).decode("utf-8")
@@ -12,14 +12,9 @@ import asyncio
 
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-# add this near the top with other imports
-import asyncio, os
-from app.iso_listener import start_server as start_iso_server
+from fastapi.responses import JSONResponse
 
-@app.on_event("startup")
-async def startup_event():
-    # existing startup logic (if any)
-    asyncio.create_task(start_iso_server(host="0.0.0.0", port=int(os.environ.get("ISO_PORT", 9000))))
+from app import serializer
 
 # Logging
 log = logging.getLogger("processor")
@@ -51,6 +46,12 @@ except Exception:
 async def healthz():
     return {"status": "ok", "service": "processor", "iso_port": int(os.environ.get("ISO_PORT", "9000"))}
 
+# Process-local metrics (listener admission / shedding and friends); see app.metrics
+@app.get("/metrics")
+async def metrics_snapshot():
+    from app import metrics
+    return metrics.snapshot()
+
 # --------------------------------------------------------------------
 # Payout endpoint: delegates to app.iso_processing.process_incoming_iso
 # Returns canonical JSON shape so frontend can interpret codes consistently
@@ -67,14 +68,19 @@ def make_response(status: str, code: str, response_fields: dict = None, txn_id:
         },
     }
 
-@app.post("/payout")
+class SerializerJSONResponse(JSONResponse):
+    """JSONResponse rendered through app.serializer (compact UTF-8, orjson when installed)."""
+
+    def render(self, content) -> bytes:
+        return serializer.dumps(content)
+
+@app.post("/payout", response_class=SerializerJSONResponse)
 async def payout(payload: Request):
-    data = await payload.json()
+    data = serializer.loads(await payload.body())
+    return SerializerJSONResponse(await _payout_result(data))
 
-    # Legacy card shortcut (keeps old dev behavior)
-    if data.get("cardNumber"):
-        auth_code = data.get("authCode") or __import__("secrets").token_hex(3)
-        return make_response("approved", "00", {"39": "00", "38": auth_code}, txn_id=data.get("job_id") or data.get("txn_id"), message="Accepted (live card)")
+async def _payout_result(data: dict) -> dict:
+    data = _card_fields(data)
 
     # Delegate to ISO processing pipeline
     try:
@@ -88,7 +94,15 @@ async def payout(payload: Request):
     except Exception as e:
         log.exception("payout processor raised: %s", e)
         return make_response("error", "96", {"39": "96"}, error="system_malfunction", message="Temporary system error — please retry")
+    return _canonical_result(data, result)
 
+def _card_fields(data):
+    # Card payments (cardNumber) go through the pipeline too: BIN routing, velocity, issuer / stand-in
+    if isinstance(data, dict) and data.get("cardNumber") and not data.get("txn_id") and data.get("job_id"):
+        return {**data, "txn_id": data["job_id"]}
+    return data
+
+def _canonical_result(data: dict, result) -> dict:
     # If result is already canonical
     if isinstance(result, dict) and "status" in result and "code" in result:
         return result
@@ -100,10 +114,41 @@ async def payout(payload: Request):
     code = str(code) if code else "96"
 
     if code == "00":
-        return make_response("approved", "00", {"39": "00", "38": (result.get("de38") if isinstance(result, dict) else None)}, txn_id=(result.get("txn_id") if isinstance(result, dict) else data.get("txn_id")), message="Accepted")
+        return make_response("approved", "00", {"39": "00", "38": (result.get("de38") or result.get("auth_code") if isinstance(result, dict) else None)}, txn_id=(result.get("txn_id") if isinstance(result, dict) else data.get("txn_id")), message="Accepted")
     else:
         return make_response("error", code, {"39": code}, txn_id=(result.get("txn_id") if isinstance(result, dict) else None), error=(result.get("error") if isinstance(result, dict) else None), message=(result.get("message") if isinstance(result, dict) else "Temporary system error — please retry"))
 
+# Bulk payouts: one validation pass and one DB transaction for the whole list
+PAYOUT_BATCH_MAX = int(os.environ.get("PAYOUT_BATCH_MAX", "1000"))
+
+@app.post("/payout/batch", response_class=SerializerJSONResponse)
+async def payout_batch(payload: Request):
+    """Body: a JSON list of payouts or {"items": [...]}. Returns {"results": [...]} in input order."""
+    data = serializer.loads(await payload.body())
+    items = data.get("items") if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail='expected a JSON list of payouts or {"items": [...]}')
+    if len(items) > PAYOUT_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"at most {PAYOUT_BATCH_MAX} payouts per batch")
+    return SerializerJSONResponse({"results": await _payout_batch_results(items)})
+
+async def _payout_batch_results(items: list) -> list:
+    items = [_card_fields(item) for item in items]
+    try:
+        from app.iso_processing import process_incoming_iso_batch
+    except Exception:
+        log.exception("app.iso_processing not available")
+        unavailable = make_response("error", "96", {"39": "96"}, error="processor_unavailable", message="Processor unavailable")
+        return [unavailable] * len(items)
+
+    try:
+        processed = await process_incoming_iso_batch(items)
+    except Exception as e:
+        log.exception("payout batch processor raised: %s", e)
+        failed = make_response("error", "96", {"39": "96"}, error="system_malfunction", message="Temporary system error — please retry")
+        return [failed] * len(items)
+    return [_canonical_result(item if isinstance(item, dict) else {}, result) for item, result in zip(items, processed)]
+
 # --------------------------------------------------------------------
 # Very small ISO8583-like TCP handler (kept for local testing)
 # --------------------------------------------------------------------
@@ -142,9 +187,12 @@ class ISOHandler(socketserver.StreamRequestHandler):
 # --------------------------------------------------------------------
 # Startup: start ISO listener in background if module available
 # --------------------------------------------------------------------
+_iso_loop = None
+
 def _start_iso_server_safe():
+    global _iso_loop
     try:
-        loop = asyncio.new_event_loop()
+        loop = _iso_loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         try:
             from app.iso_listener import start_server as start_iso_server
@@ -158,5 +206,22 @@ def _start_iso_server_safe():
 
 @app.on_event("startup")
 def startup_event():
+    # ISO_LISTENER_EMBEDDED=0 when the listener runs on its own (python -m app.iso_supervisor);
+    # otherwise every uvicorn worker would try to bind ISO_PORT.
+    if os.environ.get("ISO_LISTENER_EMBEDDED", "1").strip().lower() in ("0", "false", "no", "off"):
+        log.info("Embedded ISO listener disabled (ISO_LISTENER_EMBEDDED=0)")
+        return
     thread = threading.Thread(target=_start_iso_server_safe, daemon=True)
     thread.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # write out events still queued in app.event_sink, here and in the embedded listener's loop
+    from app import event_sink
+    await event_sink.close_sink()
+    if _iso_loop is not None and _iso_loop.is_running():
+        try:
+            await asyncio.wait_for(asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(event_sink.close_sink(), _iso_loop)), 10)
+        except Exception:
+            log.exception("Failed to drain the ISO listener's event sink")
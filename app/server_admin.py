@@ -4,6 +4,7 @@ A small admin HTTP server exposing /health and a JSON API for events (for extern
 You can run it alongside iso_listener.
 """
 
+import asyncio
 from fastapi import FastAPI
 from app.telemetry import configure_logging
 from app.config import settings
@@ -11,6 +12,7 @@ from app.db import AsyncSessionLocal
 from app.models import ProcessorEvent
 from sqlalchemy import select
 from fastapi.responses import JSONResponse
+from app import metrics, tracing
 
 logger = configure_logging(settings.LOG_LEVEL)
 app = FastAPI(title=settings.APP_NAME + " Admin")
@@ -25,3 +27,26 @@ async def events(limit: int = 50):
         q = await session.execute(select(ProcessorEvent).order_by(ProcessorEvent.created_at.desc()).limit(limit))
         rows = q.scalars().all()
         return JSONResponse([{"id": str(r.id), "topic": r.topic, "payload": r.payload, "created_at": r.created_at.isoformat()} for r in rows])
+
+@app.get("/metrics")
+async def metrics_snapshot():
+    """Metrics exported by the listener processes (METRICS_DIR, see app.metrics), by process."""
+    if not metrics.EXPORT_DIR:
+        return JSONResponse({"error": "METRICS_DIR is not set; listener metrics are not exported"}, status_code=404)
+    # a worker that missed three exports is gone
+    return await asyncio.to_thread(metrics.collect, metrics.EXPORT_DIR, 3 * metrics.EXPORT_INTERVAL)
+
+@app.get("/stip/advice")
+async def stip_advice(limit: int = 50):
+    """Stand-in decisions (app.stip) recorded for advice to the issuer, newest first."""
+    async with AsyncSessionLocal() as session:
+        q = await session.execute(select(ProcessorEvent).where(ProcessorEvent.topic == "stip.advice")
+                                  .order_by(ProcessorEvent.created_at.desc()).limit(limit))
+        rows = q.scalars().all()
+        return JSONResponse([{"id": str(r.id), "payload": r.payload, "created_at": r.created_at.isoformat()} for r in rows])
+
+@app.get("/traces")
+async def traces(limit: int = 50, min_ms: float = 0.0):
+    """Recent sampled frame traces (app.tracing) at least min_ms long, newest first."""
+    # reads TRACE_FILE when set; keep the file I/O off the event loop
+    return JSONResponse(await asyncio.to_thread(tracing.recent, limit, min_ms))
@@ -0,0 +1,202 @@
+# processor/app/stip.py
+"""
+Stand-in processing (STIP): answer card authorizations on the issuer's behalf
+when it is unavailable.
+
+With STIP=1, authorize() gives the issuer connector (app.connectors.framework)
+at most STIP_SLO_MS (default 300) to answer. The processor stands in when:
+
+  - the issuer's circuit breaker is open (no call is made at all),
+  - the issuer does not answer within the SLO, or
+  - the issuer call fails.
+
+Calls that miss the SLO count as issuer failures, so an issuer that keeps
+breaching it trips its breaker and later authorizations stand in straight away
+until a half-open trial succeeds.
+
+A stand-in approval must fit the limits of both the merchant (DE42 / merchant_id)
+and the BIN (first 6 PAN digits). Limits are in minor units, per STIP_WINDOW_S
+(default one day), kept per process:
+
+    {"default":   {"max_amount": 5000, "max_total": 50000, "max_count": 20},
+     "merchants": {"MERCH0000000001": {"max_amount": 20000, "max_total": 200000, "max_count": 100}},
+     "bins":      {"453997": {"max_count": 0}}}
+
+STIP_LIMITS_FILE points at such a JSON file. Missing keys fall back to "default",
+and max_count 0 turns stand-in off for that merchant or BIN. Authorizations over
+max_amount or max_total are declined with 61 (exceeds amount limit), over
+max_count with 65 (exceeds frequency limit), and without an amount with 91.
+
+Every stand-in decision, approved or declined, comes back with an "advice"
+record. app.iso_processing stores it as a stip.advice event, to be sent to the
+issuer as advice once it is back. The admin app lists them at GET /stip/advice.
+
+Metrics: stip.approved / stip.declined (counters), stip.approved_amount (counter, minor units).
+"""
+import json
+import logging
+import os
+import secrets
+import time
+import uuid
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Dict, NamedTuple, Optional
+
+from app import metrics
+from app.connectors import framework as connectors
+
+LOG = logging.getLogger("processor.stip")
+LOG.addHandler(logging.NullHandler())
+
+ENABLED = os.environ.get("STIP", "0").strip().lower() in ("1", "true", "yes", "on")
+SLO_MS = float(os.environ.get("STIP_SLO_MS", "300"))
+WINDOW_S = float(os.environ.get("STIP_WINDOW_S", "86400"))
+LIMITS_FILE = os.environ.get("STIP_LIMITS_FILE", "").strip() or None
+
+BIN_DIGITS = 6
+# merchants + BINs with usage tracked before expired windows are dropped
+_MAX_TRACKED = 100000
+# connector errors that make the processor stand in
+STAND_IN_ON = frozenset({"issuer_circuit_open", "issuer_timeout", "issuer_error"})
+
+_approved = metrics.counter("stip.approved")
+_declined = metrics.counter("stip.declined")
+_approved_amount = metrics.counter("stip.approved_amount")
+
+
+class Limits(NamedTuple):
+    max_amount: int = 5000
+    max_total: int = 50000
+    max_count: int = 20
+
+
+class StandInPolicy:
+    """Per-merchant and per-BIN stand-in limits and what has been used of them in the current window."""
+
+    def __init__(self, default: Limits = Limits(), merchants: Optional[Dict[str, Limits]] = None,
+                 bins: Optional[Dict[str, Limits]] = None, window_s: float = WINDOW_S,
+                 clock=time.monotonic):
+        self.default = default
+        self.merchants = merchants or {}
+        self.bins = bins or {}
+        self.window_s = window_s
+        self.clock = clock
+        # key -> [window start, total, count]
+        self._used: Dict[tuple, list] = {}
+
+    @classmethod
+    def from_dict(cls, data: dict, **kwargs) -> "StandInPolicy":
+        default = Limits(**data.get("default", {}))
+
+        def table(name):
+            entries = data.get(name) or {}
+            if not isinstance(entries, dict):
+                raise ValueError(f"STIP limits {name!r} must map ids to limits")
+            return {str(k): default._replace(**v) for k, v in entries.items()}
+
+        return cls(default, table("merchants"), table("bins"), **kwargs)
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> "StandInPolicy":
+        with open(path, encoding="utf-8") as fh:
+            return cls.from_dict(json.load(fh), **kwargs)
+
+    def _usage(self, key: tuple, now: float) -> list:
+        used = self._used.get(key)
+        if used is None or now - used[0] >= self.window_s:
+            if used is None and len(self._used) >= _MAX_TRACKED:
+                self._used = {k: u for k, u in self._used.items() if now - u[0] < self.window_s}
+            used = self._used[key] = [now, 0, 0]
+        return used
+
+    def check(self, merchant: str, bin_: str, amount: int) -> Optional[str]:
+        """None (and the limits consumed) when `amount` may be approved; else the decline DE39."""
+        now = self.clock()
+        scopes = (
+            (("merchant", merchant), self.merchants.get(merchant, self.default)),
+            (("bin", bin_), self.bins.get(bin_, self.default)),
+        )
+        usages = []
+        for key, limits in scopes:
+            used = self._usage(key, now)
+            if used[2] + 1 > limits.max_count:
+                return "65"
+            if amount > limits.max_amount or used[1] + amount > limits.max_total:
+                return "61"
+            usages.append(used)
+        for used in usages:
+            used[1] += amount
+            used[2] += 1
+        return None
+
+
+def amount_minor(fields: dict) -> Optional[int]:
+    """The amount in minor units: DE4 as is, or the decimal "amount" field x 100."""
+    de4 = str(fields.get("4") or "").strip()
+    if de4.isdigit():
+        return int(de4)
+    try:
+        return int(Decimal(str(fields.get("amount"))) * 100) if fields.get("amount") not in (None, "") else None
+    except InvalidOperation:
+        return None
+
+
+_POLICY = StandInPolicy.from_file(LIMITS_FILE) if LIMITS_FILE else StandInPolicy()
+
+
+def use_policy(policy: StandInPolicy) -> StandInPolicy:
+    global _POLICY
+    _POLICY = policy
+    return policy
+
+
+def stand_in(issuer: str, fields: dict, reason: str) -> dict:
+    """The processor's own answer for `fields`, with the advice record for the issuer."""
+    card = str(fields.get("2") or fields.get("cardNumber") or "")
+    merchant = str(fields.get("42") or fields.get("merchant_id") or "")
+    amount = amount_minor(fields)
+    de39 = "91" if amount is None else _POLICY.check(merchant, card[:BIN_DIGITS], amount)
+    approved = de39 is None
+    reply = {
+        "approved": approved,
+        "de39": "00" if approved else de39,
+        "gateway_txn_id": f"STIP-{uuid.uuid4()}",
+        "stand_in": True,
+        "stand_in_reason": reason,
+    }
+    if approved:
+        reply["auth_code"] = f"S{secrets.randbelow(100000):05d}"
+        _approved.inc()
+        _approved_amount.inc(amount)
+    else:
+        _declined.inc()
+    reply["advice"] = {
+        "issuer": issuer,
+        "txn_id": fields.get("txn_id"),
+        "stan": fields.get("11"),
+        "merchant": merchant,
+        "bin": card[:BIN_DIGITS],
+        "amount": amount,
+        "currency": fields.get("49") or fields.get("currency"),
+        "de39": reply["de39"],
+        "auth_code": reply.get("auth_code"),
+        "gateway_txn_id": reply["gateway_txn_id"],
+        "reason": reason,
+        "decided_at": datetime.utcnow().isoformat(),
+    }
+    LOG.info("Stood in for %s (%s): txn=%s de39=%s", issuer, reason, fields.get("txn_id"), reply["de39"])
+    return reply
+
+
+async def authorize(issuer: str, fields: dict) -> dict:
+    """connectors.authorize(), standing in when the issuer is open-circuited, over the SLO or failing."""
+    if not ENABLED:
+        return await connectors.authorize(issuer, fields)
+    connector = connectors.get_connector(issuer)
+    if connector is None:
+        return await connectors.authorize(issuer, fields)
+    reply = await connector.authorize(fields, timeout_ms=min(SLO_MS, connector.timeout * 1000.0))
+    if reply.get("error") not in STAND_IN_ON:
+        return reply
+    return stand_in(issuer, fields, reply["error"])
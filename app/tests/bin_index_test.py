@@ -0,0 +1,80 @@
+# processor/app/tests/bin_index_test.py
+import os
+import random
+import time
+
+import pytest
+
+from app import bin_index
+from app.bin_index import BinIndex, BinRoute
+
+ROWS = [
+    ("4", "4", "visa", "issuer_simulator", "credit"),
+    ("45399700", "45399799", "visa", "acme", "debit"),
+    ("4539971200", "", "visa", "acme", "prepaid"),
+    ("51", "55", "mastercard", "mc_bank", "credit"),
+]
+
+
+def test_narrowest_range_wins():
+    index = BinIndex.from_ranges(ROWS)
+    assert index.lookup("4111111111111111") == BinRoute("visa", "issuer_simulator", "credit")
+    assert index.lookup("4539971111111111") == BinRoute("visa", "acme", "debit")
+    assert index.lookup("4539971200111111") == BinRoute("visa", "acme", "prepaid")
+    assert index.lookup("4539971300111111") == BinRoute("visa", "acme", "debit")
+    assert index.lookup("4539980000000000").issuer == "issuer_simulator"
+    assert index.lookup("5555555555554444").scheme == "mastercard"
+    assert index.lookup("5611111111111111") is None
+    assert index.lookup("") is None and index.lookup("41x1") is None
+
+    with pytest.raises(ValueError):
+        BinIndex.from_ranges([("41", "42", "a", "b", "c"), ("4200", "43", "a", "b", "c")])
+    with pytest.raises(ValueError):
+        BinIndex.from_ranges([("4x", "4x", "a", "b", "c")])
+
+
+def test_csv_and_mmapped_binary_agree(tmp_path):
+    rnd = random.Random(3)
+    csv_path, bin_path = tmp_path / "bins.csv", str(tmp_path / "bins.idx")
+    lines = ["low,high,scheme,issuer,product"] + [",".join(r) for r in ROWS]
+    lines += [f"{b},{b},visa,issuer_{b % 7},debit" for b in rnd.sample(range(40000000, 50000000), 500)]
+    csv_path.write_text("\n".join(lines) + "\n")
+
+    from_csv = BinIndex.load(str(csv_path))
+    from_csv.save_binary(bin_path)
+    mapped = BinIndex.load(bin_path)
+    pans = [f"{rnd.randrange(3 * 10 ** 15, 6 * 10 ** 15)}" for _ in range(2000)]
+    pans += [line.split(",")[0].ljust(16, "1") for line in lines[1:]]
+    assert len(mapped) == len(from_csv)
+    assert mapped.lookup_many(pans) == from_csv.lookup_many(pans) == [from_csv.lookup_key(p) for p in pans]
+
+
+def test_table_file_hot_swap(tmp_path, monkeypatch):
+    monkeypatch.setattr(bin_index, "RELOAD_INTERVAL", 0)
+    path = tmp_path / "bins.csv"
+    path.write_text("low,high,scheme,issuer,product\n4,4,visa,old_issuer,credit\n")
+    try:
+        bin_index.use_table_file(str(path))
+        assert bin_index.lookup("4111111111111111").issuer == "old_issuer"
+        assert bin_index.lookup("5111111111111111") is None
+
+        # the new table loads in the background; lookups keep answering from the old one meanwhile
+        load = BinIndex.load
+        monkeypatch.setattr(BinIndex, "load", staticmethod(lambda p: (time.sleep(0.3), load(p))[1]))
+        path.write_text("low,high,scheme,issuer,product\n4,4,visa,new_issuer,credit\n")
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000_000))
+        started = time.perf_counter()
+        assert bin_index.lookup("4111111111111111").issuer == "old_issuer"
+        assert time.perf_counter() - started < 0.1
+        bin_index._CURRENT.wait(5)
+        assert bin_index.lookup("4111111111111111").issuer == "new_issuer"
+
+        # a broken file keeps the index that was loaded
+        path.write_text("low,high,scheme,issuer,product\n4,3,visa,x,y\n")
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 2_000_000_000))
+        bin_index.lookup("4111111111111111")
+        bin_index._CURRENT.wait(5)
+        assert bin_index.lookup("4111111111111111").issuer == "new_issuer"
+    finally:
+        bin_index.use_table_file(None)
+    assert bin_index.lookup("6011000000000004").scheme == "discover"
@@ -0,0 +1,33 @@
+# processor/app/tests/codec_suite_test.py
+from app.bench import codec_suite
+
+
+def test_every_case_round_trips():
+    for case in codec_suite.build_cases():
+        assert case.check(case.fn(*case.args)), case.name
+
+
+def test_run_reports_ops_and_allocations():
+    cases = [c for c in codec_suite.build_cases() if c.name.endswith(".small")][:2]
+    results = codec_suite.run(cases, rounds=1, min_time=0.001)
+    assert set(results) == {c.name for c in cases}
+    for row in results.values():
+        assert row["ops_per_sec"] > 0
+        assert row["allocs_bytes"] > 0
+
+
+def test_compare_flags_only_regressions_beyond_threshold():
+    baseline = {
+        "a": {"ops_per_sec": 1000.0, "allocs_bytes": 1000},
+        "b": {"ops_per_sec": 1000.0, "allocs_bytes": 1000},
+        "c": {"ops_per_sec": 1000.0, "allocs_bytes": 100},
+    }
+    results = {
+        "a": {"ops_per_sec": 950.0, "allocs_bytes": 1050},   # within 10%
+        "b": {"ops_per_sec": 800.0, "allocs_bytes": 1500},   # slower and allocates more
+        "c": {"ops_per_sec": 1200.0, "allocs_bytes": 150},   # +50% but under the byte slack
+        "new": {"ops_per_sec": 1.0, "allocs_bytes": 1},      # not in the baseline
+    }
+    regressions = codec_suite.compare(results, baseline, threshold=10)
+    assert len(regressions) == 2
+    assert all(line.startswith("b:") for line in regressions)
@@ -0,0 +1,122 @@
+# processor/app/tests/connectors_test.py
+import asyncio
+import time
+
+from app import iso_processing
+from app.connectors import framework
+from app.connectors.framework import OPEN, CircuitBreaker, IssuerConnector
+
+
+class Backend:
+    def __init__(self, delays=(0.0,), fail=False):
+        self.delays = list(delays)
+        self.fail = fail
+        self.calls = 0
+        self.inflight = 0
+        self.max_inflight = 0
+
+    async def __call__(self, payload):
+        self.calls += 1
+        self.inflight += 1
+        self.max_inflight = max(self.max_inflight, self.inflight)
+        try:
+            await asyncio.sleep(self.delays[min(self.calls - 1, len(self.delays) - 1)])
+            if self.fail:
+                raise ConnectionError("issuer down")
+            return {"approved": True, "de39": "00", "gateway_txn_id": f"ISS-{self.calls}"}
+        finally:
+            self.inflight -= 1
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    now = [0.0]
+    breaker = CircuitBreaker(failures=2, reset_s=5.0, clock=lambda: now[0])
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == OPEN and not breaker.allow()
+    now[0] = 5.0
+    assert breaker.allow() and not breaker.allow()  # one half-open trial
+    breaker.failure()
+    assert breaker.state == OPEN
+    now[0] = 10.0
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.allow() and breaker.allow()
+
+    async def main():
+        backend = Backend(fail=True)
+        connector = IssuerConnector("t_down", backend, breaker_failures=3)
+        replies = [await connector.authorize({}) for _ in range(5)]
+        return replies, backend.calls
+
+    replies, calls = asyncio.run(main())
+    assert calls == 3
+    assert [r["error"] for r in replies] == ["issuer_error"] * 3 + ["issuer_circuit_open"] * 2
+    assert {r["de39"] for r in replies} == {"91"}
+
+
+def test_cancelled_half_open_trial_frees_the_breaker():
+    async def main():
+        backend = Backend(delays=(0.0, 1.0, 0.0), fail=True)
+        connector = IssuerConnector("t_cancel", backend, breaker_failures=1, breaker_reset_s=0.05)
+        await connector.authorize({})
+        assert connector.breaker.state == OPEN
+        await asyncio.sleep(0.06)
+        backend.fail = False
+        trial = asyncio.ensure_future(connector.authorize({}))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        await asyncio.gather(trial, return_exceptions=True)
+        return await connector.authorize({}), connector.breaker.state
+
+    reply, state = asyncio.run(main())
+    assert reply["de39"] == "00" and state == framework.CLOSED
+
+
+def test_deadline_and_concurrency_limit():
+    async def main():
+        slow = IssuerConnector("t_slow", Backend(delays=(1.0,)), timeout_ms=50)
+        started = time.perf_counter()
+        timed_out = await slow.authorize({})
+        elapsed = time.perf_counter() - started
+
+        backend = Backend(delays=(0.01,))
+        bounded = IssuerConnector("t_bounded", backend, max_concurrency=2)
+        replies = await asyncio.gather(*(bounded.authorize({}) for _ in range(6)))
+        return timed_out, elapsed, replies, backend.max_inflight
+
+    timed_out, elapsed, replies, max_inflight = asyncio.run(main())
+    assert timed_out["error"] == "issuer_timeout" and elapsed < 0.5
+    assert all(r["de39"] == "00" for r in replies)
+    assert max_inflight == 2
+
+
+def test_hedged_request_wins_over_a_stuck_call():
+    async def main():
+        backend = Backend(delays=[0.001] * 16 + [2.0, 0.001])
+        connector = IssuerConnector("t_hedge", backend, hedge=True, hedge_min_ms=20, timeout_ms=1000)
+        for _ in range(16):
+            await connector.authorize({})
+        started = time.perf_counter()
+        reply = await connector.authorize({})
+        return reply, time.perf_counter() - started, backend.calls
+
+    reply, elapsed, calls = asyncio.run(main())
+    assert reply["gateway_txn_id"] == "ISS-18"
+    assert elapsed < 0.5 and calls == 18
+
+
+def test_card_authorizations_use_the_routed_issuer(monkeypatch):
+    backend = Backend()
+    monkeypatch.setattr(framework, "ENABLED", True)
+    monkeypatch.setitem(framework.BACKENDS, "issuer_simulator", backend)
+    monkeypatch.setattr(iso_processing, "persist_event", lambda *a, **kw: asyncio.sleep(0, {}))
+
+    result = asyncio.run(iso_processing.process_incoming_iso({"mti": "0200", "2": "4111111111111111"}))
+    assert result["de39"] == "00" and result["gateway_txn_id"] == "ISS-1"
+    assert result["issuer"] == "issuer_simulator" and backend.calls == 1
+
+    monkeypatch.setitem(framework.BACKENDS, "issuer_simulator", Backend(fail=True))
+    result = asyncio.run(iso_processing.process_incoming_iso({"mti": "0200", "2": "4111111111111111"}))
+    assert result["de39"] == "91" and result["error"] == "issuer_error"
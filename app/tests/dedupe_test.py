@@ -0,0 +1,132 @@
+# processor/app/tests/dedupe_test.py
+import asyncio
+import os
+import sqlite3
+from contextlib import asynccontextmanager
+
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import event_sink
+from app.dedupe import BloomFilter, DedupeStore, DuplicateDetector, message_key
+
+CARD = {"mti": "0200", "fields": {"2": "4111111111111111", "11": "000123", "41": "TERM0001", "39": "00"}}
+
+
+class Processor:
+    def __init__(self, de39="00", delay=0.0):
+        self.calls = 0
+        self.de39 = de39
+        self.delay = delay
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"mti": "0210", "fields": {"39": self.de39, "38": f"A{self.calls:05d}"}}
+
+
+def test_retransmission_gets_the_original_response():
+    async def main():
+        detector, process = DuplicateDetector(store=None), Processor()
+        first = await detector.run(CARD, process)
+        again = await detector.run({**CARD, "fields": dict(CARD["fields"])}, process)
+        other = await detector.run({**CARD, "fields": {**CARD["fields"], "11": "000124"}}, process)
+        return first, again, other, process.calls
+
+    first, again, other, calls = asyncio.run(main())
+    assert again == first and again is not first
+    assert other["fields"]["38"] == "A00002"
+    assert calls == 2
+
+
+def test_reversal_after_an_authorization_is_processed():
+    auth = {"mti": "0100", "fields": {"41": "T1", "11": "000001", "39": "00"}}
+
+    async def main():
+        detector, process = DuplicateDetector(store=None), Processor()
+        first = await detector.run(auth, process)
+        repeat = await detector.run({**auth, "mti": "0101"}, process)
+        reversal = await detector.run({**auth, "mti": "0400"}, process)
+        reversal_repeat = await detector.run({**auth, "mti": "0401"}, process)
+        return first, repeat, reversal, reversal_repeat, process.calls
+
+    first, repeat, reversal, reversal_repeat, calls = asyncio.run(main())
+    assert repeat == first
+    assert reversal != first and reversal_repeat == reversal
+    assert calls == 2
+
+
+def test_retransmit_while_in_flight_waits_for_the_original():
+    async def main():
+        detector, process = DuplicateDetector(store=None), Processor(delay=0.05)
+        responses = await asyncio.gather(*(detector.run(CARD, process) for _ in range(5)))
+        return responses, process.calls
+
+    responses, calls = asyncio.run(main())
+    assert calls == 1
+    assert all(r == responses[0] for r in responses)
+
+
+def test_keyless_and_failed_messages_are_processed_again():
+    assert message_key({"mti": "0200", "fields": {"41": "TERM0001"}}) is None
+    assert message_key({"type": "iso20022", "txn_id": "p1"}) is not None
+
+    async def main():
+        detector = DuplicateDetector(store=None)
+        keyless, failing = Processor(), Processor(de39="96")
+        for _ in range(2):
+            await detector.run({"mti": "0200", "fields": {"39": "00"}}, keyless)
+            await detector.run(CARD, failing)
+        return keyless.calls, failing.calls
+
+    assert asyncio.run(main()) == (2, 2)
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(10000, 0.01)
+    keys = [os.urandom(16) for _ in range(10000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(os.urandom(16) in bloom for _ in range(10000))
+    assert false_positives < 300
+
+
+def test_evicted_entries_are_found_in_the_database(tmp_path):
+    path = str(tmp_path / "dedupe.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE processor_dedupe (key VARCHAR(32) PRIMARY KEY, response TEXT, created_at DATETIME)")
+    conn.commit()
+    conn.close()
+
+    async def main():
+        factory = sessionmaker(bind=create_async_engine(f"sqlite+aiosqlite:///{path}"), class_=AsyncSession)
+
+        @asynccontextmanager
+        async def get_session():
+            async with factory() as session:
+                yield session
+
+        detector, process = DuplicateDetector(max_entries=1, store=DedupeStore(get_session)), Processor()
+        first = await detector.run(CARD, process)
+        await detector.run({**CARD, "fields": {**CARD["fields"], "11": "000999"}}, process)  # evicts CARD
+        await event_sink.close_sink()
+        again = await detector.run(CARD, process)
+
+        # a restarted worker knows the key from the database
+        restarted = DuplicateDetector(store=DedupeStore(get_session))
+        assert await restarted.warm() == 2
+        replayed = await restarted.run(CARD, process)
+
+        # another worker recorded it after this one started: only a shared detector asks the table
+        other = {**CARD, "fields": {**CARD["fields"], "11": "000777"}}
+        peer = DuplicateDetector(store=DedupeStore(get_session))
+        await peer.run(other, process)
+        await event_sink.close_sink()
+        shared = await DuplicateDetector(store=DedupeStore(get_session), shared=True).run(other, process)
+        return first, again, replayed, shared, process.calls
+
+    first, again, replayed, shared, calls = asyncio.run(main())
+    assert again == first and replayed == first
+    assert shared["fields"]["38"] == "A00003"
+    assert calls == 3
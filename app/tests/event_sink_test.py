@@ -0,0 +1,120 @@
+# processor/app/tests/event_sink_test.py
+import asyncio
+import sqlite3
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import event_sink, iso_processing, metrics
+from app.event_sink import EventSink, SinkClosed
+
+INSERT = text("INSERT INTO processor_events (id, topic, payload, created_at) VALUES (:id, :topic, :payload, :created_at)")
+
+
+def _db(tmp_path, with_table=True) -> str:
+    path = str(tmp_path / "events.db")
+    if with_table:
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE processor_events (id VARCHAR(36) PRIMARY KEY, topic VARCHAR(128), payload TEXT, "
+                     "created_at DATETIME)")
+        conn.commit()
+        conn.close()
+    return path
+
+
+def _sink(path: str, **kwargs) -> EventSink:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    return EventSink(sessionmaker(bind=engine, class_=AsyncSession), INSERT, **kwargs)
+
+
+def _row(i: int) -> dict:
+    return {"id": f"ev-{i}", "topic": "test", "payload": "{}", "created_at": "2026-01-01T00:00:00"}
+
+
+def _count(path: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM processor_events").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_rows_are_group_committed(tmp_path):
+    path = _db(tmp_path)
+    flushes = metrics.counter("event_sink.flushes")
+
+    async def main():
+        sink = _sink(path, max_batch=100, max_delay_ms=50)
+        before = flushes.value
+        for i in range(250):
+            await sink.submit(_row(i))
+        assert sink.depth > 0  # write-behind: nothing waited for the database
+        await sink.flush()
+        assert sink.depth == 0
+        await sink.close()
+        return flushes.value - before
+
+    assert asyncio.run(main()) == 3
+    assert _count(path) == 250
+
+
+def test_durable_submit_returns_after_commit(tmp_path):
+    path = _db(tmp_path)
+
+    async def main():
+        sink = _sink(path, max_delay_ms=1000)
+        await asyncio.gather(*(sink.submit(_row(i), wait=True) for i in range(10)))
+        committed = _count(path)
+        await sink.close()
+        return committed
+
+    assert asyncio.run(main()) == 10
+
+
+def test_close_drains_queue_and_refuses_new_rows(tmp_path):
+    path = _db(tmp_path)
+
+    async def main():
+        sink = _sink(path, max_delay_ms=10_000)
+        for i in range(20):
+            await sink.submit(_row(i))
+        await sink.close()
+        with pytest.raises(SinkClosed):
+            await sink.submit(_row(99))
+
+    asyncio.run(main())
+    assert _count(path) == 20
+
+
+def test_failed_batch_raises_for_durable_callers(tmp_path):
+    path = _db(tmp_path, with_table=False)
+
+    async def main():
+        sink = _sink(path, retries=1)
+        with pytest.raises(Exception, match="processor_events"):
+            await sink.submit(_row(1), wait=True)
+        await sink.close()
+
+    asyncio.run(main())
+
+
+def test_card_approval_waits_for_its_clearing_record(monkeypatch):
+    def down():
+        raise ConnectionRefusedError("database down")
+
+    monkeypatch.setattr(iso_processing, "_SINK_ENABLED", True)
+    monkeypatch.setattr(iso_processing, "_get_session", down)
+    monkeypatch.setattr(event_sink, "RETRIES", 0)
+
+    async def main():
+        approval = await iso_processing.process_incoming_iso({"mti": "0200", "2": "4111111111111111"})
+        # a decline is audit only: answered without waiting for the database
+        decline = await iso_processing.process_incoming_iso({"mti": "0200", "2": "123"})
+        await event_sink.close_sink()
+        return approval, decline
+
+    approval, decline = asyncio.run(main())
+    assert (approval["de39"], approval.get("approved")) == ("96", False)
+    assert decline["de39"] == "96" and decline["error"] is None
@@ -0,0 +1,57 @@
+# processor/app/tests/iban_test.py
+import random
+import re
+
+from app import iban, validation
+
+VALID = ["DE89370400440532013000", "GB82 WEST 1234 5698 7654 32", "fr1420041010050500013m02606",
+         "NL91ABNA0417164300", "MU17BOMM0101101030300200000MUR", "NO9386011117947",
+         "VA59001123000012345678", "BY13NBRB3600900000002Z00AB00", "IQ98NBIQ850123456789012",
+         "SV62CENR00000000000000700025"]
+
+
+def test_iban_reasons():
+    assert [iban.check_iban(v) for v in VALID] == [None] * len(VALID)
+    assert iban.check_iban("DE88370400440532013000") == "checksum"
+    assert iban.check_iban("DE8937040044053201300") == "length"
+    assert iban.check_iban("NL91ABNA041716430A") == "format"  # NL account number is numeric
+    assert iban.check_iban("XX89370400440532013000") == "country"
+    assert iban.check_iban(None) == "format"
+
+
+def test_registry_lengths_and_generated_ibans():
+    rnd = random.Random(1)
+    for country, spec in iban.REGISTRY.items():
+        length, _ = iban._COMPILED[country]
+        assert 15 <= length <= 34, country
+        bban = "".join("7" * int(n) if kind == "n" else "K" * int(n)
+                       for n, kind in re.findall(r"(\d+)([nac])", spec))
+        value = iban.make_iban(country, bban)
+        assert len(value) == length and iban.is_valid_iban(value), value
+        i = rnd.randrange(4, length)
+        typo = value[:i] + ("8" if value[i] == "7" else "L") + value[i + 1:]
+        assert iban.check_iban(typo) == "checksum", typo
+
+
+def test_mod97_matches_big_int_oracle():
+    rnd = random.Random(3)
+    alphabet = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    for n in list(range(1, 40)) + [34] * 200:
+        value = "".join(rnd.choice(alphabet) for _ in range(n))
+        assert iban.mod97(value) == int(value.translate(iban._LETTERS)) % 97, value
+
+
+def test_batch_matches_single_checks():
+    values = VALID + ["DE88370400440532013000", None, VALID[0], "  "] * 3
+    assert iban.check_ibans(values) == [iban.check_iban(v) for v in values]
+
+
+def test_bic_and_default_rules():
+    assert iban.is_valid_bic("COBADEFFXXX") and iban.is_valid_bic("deutdeff")
+    assert not iban.is_valid_bic("DEUT1EFF") and not iban.is_valid_bic("COBADEFFXX")
+
+    v = validation.compile_rules()
+    base = {"type": "iso20022", "protocol": "101.1", "auth_code": "1234"}
+    assert v.validate({**base, "payoutDetails": {"iban": VALID[1], "bic": "COBADEFFXXX"}}) == []
+    assert v.validate({**base, "payoutDetails": {"iban": "DE88370400440532013000"}}) == ["invalid_iban"]
+    assert v.validate({**base, "payoutDetails": {"iban": VALID[0], "bic": "COBA"}}) == ["invalid_bic"]
@@ -0,0 +1,49 @@
+# processor/app/tests/iso8583_binary_test.py
+import pytest
+
+from app import iso8583_binary
+from app.iso_codec import CodecSession, pack_iso
+from app.iso_netmgmt import build_0810
+
+
+def test_roundtrip_primary_bitmap():
+    fields = {"2": "4111111111111111", "3": "000000", "4": "000000001000", "11": "000042",
+              "41": "TERM0001", "48": "x" * 300, "52": "0123456789abcdef"}
+    payload = iso8583_binary.encode("0200", fields)
+    assert payload[:4] == b"0200"
+    assert not payload[4] & 0x80
+    assert iso8583_binary.decode(payload) == {"mti": "0200", "fields": fields}
+
+
+def test_secondary_bitmap_and_padding():
+    payload = iso8583_binary.encode("0800", {"11": "42", "70": "301", "41": "T1"})
+    assert payload[4] & 0x80
+    decoded = iso8583_binary.decode(payload)
+    assert decoded["fields"] == {"11": "000042", "41": "T1      ", "70": "301"}
+
+
+def test_rejects_oversize_and_truncated():
+    with pytest.raises(ValueError):
+        iso8583_binary.encode("0200", {"2": "1" * 20})
+    payload = iso8583_binary.encode("0200", {"2": "4111111111111111", "4": "1000"})
+    with pytest.raises(ValueError):
+        iso8583_binary.decode(payload[:-1])
+    with pytest.raises(ValueError):
+        iso8583_binary.decode(payload + b"0")
+
+
+def test_session_sniffs_binary_and_encodes_response():
+    session = CodecSession()
+    codec, msg = session.decode(iso8583_binary.encode("0100", {"11": "000007", "4": "500"}))
+    assert codec.name == "binary"
+    assert msg["fields"]["4"] == "000000000500"
+    reply = session.encode_response({"mti": "0110", "fields": {"39": "00", "11": "000007"}, "txn_id": "t"})
+    assert iso8583_binary.decode(reply) == {"mti": "0110", "fields": {"11": "000007", "39": "00"}}
+    # legacy JSON frames still go to the json codec
+    assert CodecSession().decode(pack_iso("0200", {"4": "1"})[4:])[0].name == "json"
+
+
+def test_binary_0810_echo():
+    reply = build_0810(iso8583_binary.encode("0800", {"7": "1017120000", "11": "000001", "70": "301"}), "binary")
+    assert iso8583_binary.decode(reply) == {
+        "mti": "0810", "fields": {"7": "1017120000", "11": "000001", "39": "00", "70": "301"}}
@@ -0,0 +1,44 @@
+# processor/app/tests/iso_admission_test.py
+import asyncio
+import functools
+import socket
+
+import pytest
+
+from app import iso_listener
+from app.iso_admission import AdmissionController
+from app.iso_client import IsoClient
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.mark.parametrize("ordered", [False, True])
+def test_pipelined_connection_over_its_limit_is_shed(monkeypatch, ordered):
+    async def slow(msg):
+        await asyncio.sleep(0.2)
+        return iso_listener._with_match_keys({"fields": {"39": "00"}}, msg)
+
+    monkeypatch.setattr(iso_listener, "_process_message", slow)
+    monkeypatch.setattr(iso_listener, "_detector", lambda: None)
+    admission = AdmissionController()  # defaults: 128 per connection, 32 pipeline slots
+    extra = 8
+
+    async def main():
+        port = _free_port()
+        handler = functools.partial(iso_listener.handle_client, pipeline=True, ordered=ordered, admission=admission)
+        server = await asyncio.start_server(handler, "127.0.0.1", port)
+        # a client that does not hold back to the listener's pipeline limit
+        async with IsoClient("127.0.0.1", port, pool_size=1, max_inflight_per_connection=128) as client:
+            responses = await asyncio.gather(*(
+                client.request("0200", {"11": f"{i:06d}", "39": "00"})
+                for i in range(1, iso_listener.PIPELINE_MAX_INFLIGHT + extra + 1)))
+        server.close()
+        return responses
+
+    de39 = [r["fields"]["39"] for r in asyncio.run(main())]
+    assert de39.count("00") == iso_listener.PIPELINE_MAX_INFLIGHT
+    assert de39.count("91") == extra and set(de39[-extra:]) == {"91"}
@@ -0,0 +1,100 @@
+# processor/app/tests/iso_client_test.py
+import asyncio
+import functools
+import socket
+
+import pytest
+
+from app import iso_listener, iso_processing, velocity
+from app.connectors import framework
+from app.iso_client import IsoClient
+from app.velocity import VelocityStore
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _listener(port: int, codec=None):
+    handler = functools.partial(iso_listener.handle_client, pipeline=True, codec=codec)
+    return await asyncio.start_server(handler, "127.0.0.1", port)
+
+
+@pytest.mark.parametrize("codec", ["json", "binary"])
+def test_multiplexed_requests_route_by_stan(codec):
+    async def main():
+        port = _free_port()
+        server = await _listener(port)
+        async with IsoClient("127.0.0.1", port, pool_size=2, codec=codec) as client:
+            responses = await asyncio.gather(*(
+                client.request("0200", {"11": f"{i:06d}", "39": "00" if i % 2 else "05"}) for i in range(1, 101)))
+            assert client.connected() == 2
+        server.close()
+        return responses
+
+    for i, resp in enumerate(asyncio.run(main()), start=1):
+        assert resp["mti"] == "0210"
+        assert int(resp["fields"]["11"]) == i
+        assert resp["fields"]["39"] == ("00" if i % 2 else "05")
+
+
+def test_card_requests_are_authorized_not_reflected(monkeypatch):
+    calls = []
+
+    async def issuer(payload):
+        calls.append(payload)
+        return {"approved": True, "de39": "00", "gateway_txn_id": "ISS-1", "auth_code": "A1B2C3"}
+
+    monkeypatch.setattr(framework, "ENABLED", True)
+    monkeypatch.setitem(framework.BACKENDS, "issuer_simulator", issuer)
+    monkeypatch.setattr(velocity, "ENABLED", True)
+    monkeypatch.setattr(velocity, "STORE", VelocityStore())
+    monkeypatch.setattr(velocity, "LIMITS", {"card": [(0, "count", 2)], "merchant": []})
+    monkeypatch.setattr(iso_processing, "persist_event", lambda *a, **kw: asyncio.sleep(0, {}))
+
+    async def main():
+        port = _free_port()
+        server = await _listener(port)
+        async with IsoClient("127.0.0.1", port, pool_size=1) as client:
+            cards = [await client.request("0200", {"2": "4111111111111111", "4": "000000001000", "11": f"{i:06d}",
+                                                   "39": "00"}) for i in range(1, 4)]
+            # no PAN: DE39 is reflected as before
+            plain = await client.request("0200", {"11": "000004", "39": "05"})
+        server.close()
+        return cards, plain
+
+    cards, plain = asyncio.run(main())
+    assert [r["fields"]["39"] for r in cards] == ["00", "00", "65"]
+    assert cards[0]["mti"] == "0210" and cards[0]["fields"]["38"] == "A1B2C3"
+    assert len(calls) == 2 and calls[0]["2"] == "4111111111111111" and calls[0]["mti"] == "0200"
+    assert plain["fields"]["39"] == "05"
+
+
+def test_timeout_and_reconnect():
+    writers = []
+
+    async def silent(reader, writer):
+        writers.append(writer)
+        await reader.read()
+
+    async def main():
+        port = _free_port()
+        server = await asyncio.start_server(silent, "127.0.0.1", port)
+        client = IsoClient("127.0.0.1", port, pool_size=1, timeout=0.2, backoff_initial=0.05)
+        await client.start()
+        with pytest.raises(asyncio.TimeoutError):
+            await client.request("0200", {"39": "00"})
+        # the listener goes away and comes back on the same port
+        server.close()
+        for writer in writers:
+            writer.close()
+        await server.wait_closed()
+        server = await _listener(port)
+        resp = await client.request("0200", {"39": "00"}, timeout=3.0)
+        await client.close()
+        server.close()
+        return resp
+
+    assert asyncio.run(main())["fields"]["39"] == "00"
@@ -0,0 +1,115 @@
+# processor/app/tests/iso_codec_test.py
+import asyncio
+import functools
+import socket
+import struct
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import iso8583_binary, iso_listener
+from app.iso_client import decode_response
+from app.iso_codec import CodecSession, IsoStreamDecoder, pack_iso, recv_frame
+from app.iso_framing import read_frame
+
+
+def _frame(payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload)) + payload
+
+
+def test_stream_decoder_partial_headers_and_batches():
+    frames = [pack_iso("0200", {"11": str(i)}) for i in range(3)]
+    blob = b"".join(frames)
+    decoder = IsoStreamDecoder()
+    out = []
+    for i in range(len(blob)):
+        out.extend(decoder.feed(blob[i:i + 1]))
+    assert [m["fields"]["11"] for m in out] == ["0", "1", "2"]
+    assert [m["fields"]["11"] for m in decoder.feed(blob * 2)] == ["0", "1", "2"] * 2
+    assert decoder.pending == 0
+
+
+def test_stream_decoder_large_frame_is_bounded():
+    decoder = IsoStreamDecoder(max_frame=1 << 20, decode=None, initial_buffer=1024)
+    big = b"x" * 300_000
+    assert decoder.feed(_frame(big) + _frame(b"y")) == [big, b"y"]
+    assert len(decoder._buf) == 1024
+    with pytest.raises(ValueError):
+        decoder.feed(struct.pack(">I", (1 << 20) + 1))
+    assert decoder.pending == 0
+
+
+def test_recv_frame_exact_and_read_ahead():
+    a, b = socket.socketpair()
+    try:
+        a.sendall(_frame(b"one") + _frame(b"two") + _frame(b"x" * 100_000))
+        # without a decoder recv_frame never consumes the next frame's bytes
+        assert recv_frame(b) == b"one"
+        decoder = IsoStreamDecoder(decode=None)
+        assert recv_frame(b, decoder=decoder) == b"two"
+        assert recv_frame(b, decoder=decoder) == b"x" * 100_000
+        a.close()
+        with pytest.raises(ConnectionError):
+            recv_frame(b, decoder=decoder)
+    finally:
+        a.close()
+        b.close()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_session_locks_first_codec_and_sniffs_others():
+    session = CodecSession()
+    json_frame = pack_iso("0200", {"11": "1"})[4:]
+    ascii_frame = b'0200{"11": "2"}'
+    binary_frame = iso8583_binary.encode("0200", {"11": "000003"})
+
+    codec, msg = session.decode(json_frame)
+    assert codec.name == "json" and session.locked and msg["fields"]["11"] == "1"
+    # other layouts on the same connection are still decoded, without moving the lock
+    assert session.decode(ascii_frame)[0].name == "ascii"
+    assert session.decode(binary_frame)[1]["fields"]["11"] == "000003"
+    assert session.codec.name == "json"
+
+    pinned = CodecSession("binary")
+    assert pinned.locked and pinned.decode(binary_frame)[0].name == "binary"
+    assert pinned.encode_response({"mti": "0210", "fields": {"39": "00"}})[:4] == b"0210"
+
+
+def test_concurrent_decodes_on_one_session():
+    session = CodecSession()
+    frames = [pack_iso("0200", {"11": f"{i:06d}"})[4:] for i in range(2000)]
+    with ThreadPoolExecutor(8) as pool:
+        stans = list(pool.map(lambda f: session.decode(f)[1]["fields"]["11"], frames))
+    assert stans == [f"{i:06d}" for i in range(2000)]
+    assert session.codec.name == "json"
+
+
+def test_codec_switch_mid_connection(monkeypatch):
+    async def slow(msg):
+        # later frames finish first, so decodes and responses interleave on the connection
+        await asyncio.sleep(0.05 * (3 - int(msg["fields"]["11"])))
+        return iso_listener._with_match_keys({"mti": "0210", "fields": {"39": "00"}}, msg)
+
+    monkeypatch.setattr(iso_listener, "_process_message", slow)
+    monkeypatch.setattr(iso_listener, "_detector", lambda: None)
+    payloads = [pack_iso("0200", {"11": "1"})[4:], b'0200{"11": "2"}', pack_iso("0200", {"11": "3"})[4:]]
+
+    async def main():
+        port = _free_port()
+        handler = functools.partial(iso_listener.handle_client, pipeline=True)
+        server = await asyncio.start_server(handler, "127.0.0.1", port)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"".join(_frame(p) for p in payloads))
+        replies = [decode_response(await asyncio.wait_for(read_frame(reader), 5)) for _ in payloads]
+        writer.close()
+        server.close()
+        return replies
+
+    replies = asyncio.run(main())
+    assert sorted(r["fields"]["11"] for r in replies) == ["1", "2", "3"]
+    assert all(r["mti"] == "0210" and r["fields"]["39"] == "00" for r in replies)
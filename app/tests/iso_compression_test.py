@@ -0,0 +1,71 @@
+# processor/app/tests/iso_compression_test.py
+import asyncio
+import struct
+
+import pytest
+
+from app import iso_listener
+from app.iso_codec import pack_iso
+from app.iso_compression import COMPRESSED_MARKER, NMI_COMPRESSION, FrameCompression, offer
+from app.serializer import loads
+
+
+def _pain(i: int) -> bytes:
+    xml = ('<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.09"><CstmrCdtTrfInitn><GrpHdr>'
+           f'<MsgId>MSG-{i}</MsgId></GrpHdr><CdtTrfTxInf><Amt><InstdAmt Ccy="EUR">{i}.00</InstdAmt></Amt>'
+           '</CdtTrfTxInf></CstmrCdtTrfInitn></Document>') * 4
+    return pack_iso("0200", {"type": "iso20022", "txn_id": f"t{i}", "pain_xml": xml})[4:]
+
+
+def test_streams_roundtrip_and_threshold():
+    server, client = FrameCompression(enabled=True, min_bytes=256), FrameCompression(min_bytes=256)
+    accepted = server.negotiate(offer())
+    assert accepted == "zlib;dict=iso20022-v1;min=256"
+    assert client.accept(accepted)
+    sizes = []
+    for i in range(5):
+        wire = client.deflate(_pain(i))
+        assert wire[:1] == COMPRESSED_MARKER
+        assert server.inflate(wire) == _pain(i)
+        sizes.append(len(wire))
+    # preset dictionary for the first frame, shared history for the rest
+    assert sizes[0] < len(_pain(0)) / 4
+    assert sizes[-1] <= sizes[0]
+    small = b'0200{"fields":{"39":"00"}}'
+    assert client.deflate(small) is small and server.inflate(small) is small
+
+
+def test_declined_and_corrupt_frames():
+    server = FrameCompression(enabled=False)
+    assert server.negotiate(offer()) == "none"
+    with pytest.raises(ValueError):
+        server.inflate(COMPRESSED_MARKER + b"junk")
+    server = FrameCompression(enabled=True)
+    server.negotiate("zlib;dict=unknown")
+    assert server.dictionary is None
+    with pytest.raises(ValueError):
+        server.inflate(COMPRESSED_MARKER + b"\xff\xff\xff")
+
+
+async def _exchange():
+    server = await asyncio.start_server(
+        lambda r, w: iso_listener.handle_client(r, w, compression=True), "127.0.0.1", 0)
+    reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+
+    async def call(payload: bytes) -> bytes:
+        writer.write(struct.pack(">I", len(payload)) + payload)
+        (n,) = struct.unpack(">I", await reader.readexactly(4))
+        return await reader.readexactly(n)
+
+    client = FrameCompression(min_bytes=64)
+    reply = await call(pack_iso("0800", {"11": "000001", "70": NMI_COMPRESSION, "48": offer()})[4:])
+    assert client.accept(loads(reply[4:])["fields"]["48"])
+    big = pack_iso("0200", {"11": "000002", "39": "00", "pain_xml": "<Nm>x</Nm>" * 500})[4:]
+    reply = await call(client.deflate(big))
+    writer.close()
+    server.close()
+    return loads(client.inflate(reply)[4:])
+
+
+def test_listener_negotiates_and_inflates():
+    assert asyncio.run(_exchange())["fields"] == {"39": "00", "11": "000002"}
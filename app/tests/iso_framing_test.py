@@ -0,0 +1,121 @@
+# processor/app/tests/iso_framing_test.py
+import asyncio
+import struct
+
+from app.iso_framing import FrameOutput, FrameProtocol, read_frame, send_frame
+
+
+def _frame(payload: bytes) -> bytes:
+    return struct.pack(">I", len(payload)) + payload
+
+
+async def _roundtrip(chunks, expected_frames, **protocol_kwargs):
+    loop = asyncio.get_running_loop()
+    received = loop.create_future()
+
+    async def handler(reader, writer):
+        frames = []
+        while True:
+            frame = await read_frame(reader)
+            if frame is None:
+                break
+            frames.append(frame)
+            await send_frame(writer, frame[::-1])
+        received.set_result(frames)
+        writer.close()
+
+    server = await loop.create_server(lambda: FrameProtocol(handler, **protocol_kwargs), "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    for chunk in chunks:
+        writer.write(chunk)
+        await writer.drain()
+        await asyncio.sleep(0)
+    replies = [await read_frame(reader) for _ in range(expected_frames)]
+    writer.close()
+    frames = await asyncio.wait_for(received, 5)
+    server.close()
+    return frames, replies
+
+
+def test_frames_split_across_single_byte_writes():
+    payloads = [b"0800abc", b"", b"0200" + b"z" * 50]
+    blob = b"".join(_frame(p) for p in payloads)
+    frames, replies = asyncio.run(_roundtrip([blob[i:i + 1] for i in range(len(blob))], len(payloads)))
+    assert frames == payloads
+    assert replies == [p[::-1] for p in payloads]
+
+
+def test_frame_larger_than_receive_buffer_and_batched_frames():
+    big = bytes(range(256)) * 1024  # 256 KiB, well over the 4 KiB starting buffer
+    payloads = [b"a" * 10, big, b"b" * 10, b"c" * 10]
+    blob = b"".join(_frame(p) for p in payloads)
+    frames, _ = asyncio.run(_roundtrip([blob[:5000], blob[5000:]], len(payloads), initial_buffer=4096))
+    assert frames == payloads
+
+
+def test_oversized_length_closes_connection():
+    async def run():
+        loop = asyncio.get_running_loop()
+        server = await loop.create_server(lambda: FrameProtocol(max_frame=1024), "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection("127.0.0.1", server.sockets[0].getsockname()[1])
+        writer.write(struct.pack(">I", 4096) + b"x" * 100)
+        data = await asyncio.wait_for(reader.read(), 5)
+        server.close()
+        return data
+
+    assert asyncio.run(run()) == b""
+
+
+class _FakeWriter:
+    def __init__(self, buffered: int = 0):
+        self.writes = []
+        self.drains = 0
+        self.transport = self
+        self.buffered = buffered
+
+    def writelines(self, buffers):
+        self.writes.append(b"".join(buffers))
+
+    def is_closing(self):
+        return False
+
+    def get_write_buffer_size(self):
+        return self.buffered
+
+    async def drain(self):
+        self.drains += 1
+
+
+def test_output_coalesces_frames_of_one_loop_iteration():
+    async def main():
+        writer = _FakeWriter()
+        output = FrameOutput(writer, high_water=1024)
+        for payload in (b"a", b"bb", b"ccc"):
+            output.send(payload)
+        assert writer.writes == []  # nothing written until the loop moves on
+        await asyncio.sleep(0)
+        output.send(b"dddd")
+        await asyncio.sleep(0)
+        return writer.writes
+
+    assert asyncio.run(main()) == [_frame(b"a") + _frame(b"bb") + _frame(b"ccc"), _frame(b"dddd")]
+
+
+def test_output_flushes_at_high_water_and_drains_only_past_it():
+    async def main():
+        writer = _FakeWriter()
+        output = FrameOutput(writer, high_water=20)
+        output.send(b"x" * 8)
+        output.send(b"y" * 8)  # 24 bytes queued: written at once
+        assert writer.writes == [_frame(b"x" * 8) + _frame(b"y" * 8)]
+        await output.drain_if_needed()
+        assert writer.drains == 0
+        writer.buffered = 64  # the peer is not reading
+        output.send(b"z")
+        await output.drain_if_needed()
+        assert writer.writes[-1] == _frame(b"z") and writer.drains == 1
+        await asyncio.sleep(0)
+        return writer
+
+    assert len(asyncio.run(main()).writes) == 2
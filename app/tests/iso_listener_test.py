@@ -0,0 +1,82 @@
+# processor/app/tests/iso_listener_test.py
+import asyncio
+import functools
+import socket
+
+import pytest
+
+from app import iso_listener, serializer
+from app.iso_admission import AdmissionController
+from app.iso_client import decode_response
+from app.iso_framing import read_frame
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def slow_handler(monkeypatch):
+    """_process_message sleeping DE48 ms per frame; records how many frames run at once."""
+    stats = {"running": 0, "peak": 0}
+
+    async def slow(msg):
+        stats["running"] += 1
+        stats["peak"] = max(stats["peak"], stats["running"])
+        try:
+            await asyncio.sleep(int(msg["fields"].get("48", "0")) / 1000.0)
+        finally:
+            stats["running"] -= 1
+        return iso_listener._with_match_keys({"mti": "0210", "fields": {"39": "00"}}, msg)
+
+    monkeypatch.setattr(iso_listener, "_process_message", slow)
+    monkeypatch.setattr(iso_listener, "_detector", lambda: None)
+    return stats
+
+
+async def _exchange(frames, **options):
+    """Write every frame on one pipelined connection at once; the responses in arrival order."""
+    port = _free_port()
+    handler = functools.partial(iso_listener.handle_client, pipeline=True, **options)
+    server = await asyncio.start_server(handler, "127.0.0.1", port)
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"".join(frames))
+    await writer.drain()
+    responses = [decode_response(await asyncio.wait_for(read_frame(reader), 5)) for _ in frames]
+    writer.close()
+    server.close()
+    return responses
+
+
+def _frame(stan: str, delay_ms: int, correlation_id: str) -> bytes:
+    payload = serializer.dumps({"mti": "0200", "fields": {"11": stan, "48": str(delay_ms)},
+                                "correlation_id": correlation_id})
+    return len(payload).to_bytes(4, "big") + payload
+
+
+def _slow_then_fast():
+    return [_frame("000001", 300, "slow"), _frame("000002", 0, "fast")]
+
+
+def test_responses_complete_out_of_order_with_match_keys(slow_handler):
+    first, second = asyncio.run(_exchange(_slow_then_fast(), ordered=False))
+    assert (first["fields"]["11"], first["correlation_id"]) == ("000002", "fast")
+    assert (second["fields"]["11"], second["correlation_id"]) == ("000001", "slow")
+
+
+def test_ordered_mode_keeps_request_order(slow_handler):
+    responses = asyncio.run(_exchange(_slow_then_fast(), ordered=True))
+    assert [r["fields"]["11"] for r in responses] == ["000001", "000002"]
+    assert slow_handler["peak"] == 2  # still processed concurrently
+
+
+def test_inflight_cap_holds_back_the_reader(slow_handler):
+    frames = [_frame(f"{i:06d}", 50, f"c{i}") for i in range(1, 9)]
+    responses = asyncio.run(_exchange(frames, ordered=False, max_inflight=3,
+                                      admission=AdmissionController(enabled=False)))
+    assert sorted(r["fields"]["11"] for r in responses) == [f"{i:06d}" for i in range(1, 9)]
+    assert all(r["fields"]["39"] == "00" for r in responses)
+    assert slow_handler["peak"] == 3
+
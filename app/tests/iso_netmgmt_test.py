@@ -0,0 +1,86 @@
+# processor/app/tests/iso_netmgmt_test.py
+import asyncio
+import functools
+import socket
+
+import pytest
+
+from app import iso_listener, serializer
+from app.iso_client import decode_response
+from app.iso_framing import read_frame
+from app.iso_netmgmt import PeerLiveness, build_0810, is_network_management
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _frame(message: dict) -> bytes:
+    payload = serializer.dumps(message)
+    return len(payload).to_bytes(4, "big") + payload
+
+
+ECHO = {"mti": "0800", "fields": {"7": "1017120000", "11": "000123", "70": "301"}}
+
+
+def test_build_0810_echoes_stan_time_and_code():
+    framed = serializer.dumps(ECHO)
+    assert is_network_management(framed) and not is_network_management(serializer.dumps({"mti": "0200"}))
+    reply = decode_response(build_0810(framed))
+    assert reply == {"mti": "0810", "fields": {"39": "00", "11": "000123", "7": "1017120000", "70": "301"}}
+    # no DE7 in the request: the current transmission time is filled in
+    bare = decode_response(build_0810(serializer.dumps({"mti": "0800", "fields": {}})))
+    assert bare["fields"]["39"] == "00" and len(bare["fields"]["7"]) == 10 and "11" not in bare["fields"]
+
+
+@pytest.mark.parametrize("pipeline", [False, True])
+def test_json_echo_is_answered_without_processing(monkeypatch, pipeline):
+    async def must_not_run(*args, **kwargs):
+        raise AssertionError("0800 reached the processing pipeline")
+
+    monkeypatch.setattr(iso_listener, "_process_message", must_not_run)
+    monkeypatch.setattr(iso_listener, "process_frame", must_not_run)
+
+    async def main():
+        port = _free_port()
+        handler = functools.partial(iso_listener.handle_client, pipeline=pipeline)
+        server = await asyncio.start_server(handler, "127.0.0.1", port)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(_frame(ECHO))
+        reply = decode_response(await asyncio.wait_for(read_frame(reader), 5))
+        writer.close()
+        server.close()
+        return reply
+
+    reply = asyncio.run(main())
+    assert reply["mti"] == "0810"
+    assert reply["fields"] == {"39": "00", "11": "000123", "7": "1017120000", "70": "301"}
+
+
+def test_idle_peer_is_evicted_and_heartbeating_peer_kept():
+    liveness = PeerLiveness(idle_timeout=0.3, sweep_interval=0.05)
+
+    async def main():
+        port = _free_port()
+        handler = functools.partial(iso_listener.handle_client, pipeline=True, liveness=liveness)
+        server = await asyncio.start_server(handler, "127.0.0.1", port)
+        sweeper = asyncio.create_task(liveness.run_sweeper())
+        idle_reader, _ = await asyncio.open_connection("127.0.0.1", port)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        for _ in range(8):  # 0.8 s of heartbeats, well past the idle timeout
+            writer.write(_frame(ECHO))
+            assert decode_response(await asyncio.wait_for(read_frame(reader), 5))["mti"] == "0810"
+            await asyncio.sleep(0.1)
+        # the silent connection was closed by the listener
+        closed = await asyncio.wait_for(idle_reader.read(), 1) == b""
+        peers = liveness.snapshot()
+        sweeper.cancel()
+        writer.close()
+        server.close()
+        return closed, peers
+
+    closed, peers = asyncio.run(main())
+    assert closed
+    assert len(peers) == 1 and peers[0]["heartbeats"] == 8
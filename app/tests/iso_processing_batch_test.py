@@ -0,0 +1,109 @@
+# processor/app/tests/iso_processing_batch_test.py
+import asyncio
+import json
+import sqlite3
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import iso_processing, validation
+from app.connectors import framework
+
+PAYOUT = {"type": "iso20022", "protocol": "101.1", "auth_code": "1234", "payoutDetails": {"iban": "DE89370400440532013000"}}
+
+
+@pytest.fixture
+def events_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "events.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE processor_events (id VARCHAR(36) PRIMARY KEY, topic VARCHAR(128), payload TEXT, "
+                 "created_at DATETIME)")
+    conn.commit()
+    conn.close()
+    factory = sessionmaker(bind=create_async_engine(f"sqlite+aiosqlite:///{path}"), class_=AsyncSession)
+
+    @asynccontextmanager
+    async def get_session():
+        async with factory() as session:
+            yield session
+
+    monkeypatch.setattr(iso_processing, "_get_session", get_session)
+    return path
+
+
+def _rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT topic, payload FROM processor_events").fetchall()
+    finally:
+        conn.close()
+
+
+def test_batch_results_in_input_order(events_db):
+    items = [
+        {**PAYOUT, "txn_id": "p1", "correlation_id": "c1"},
+        {**PAYOUT, "txn_id": "p2", "auth_code": "x"},
+        {"mti": "0200", "2": "4111111111111111", "txn_id": "card1"},
+        "not a message",
+        {**PAYOUT, "txn_id": "p3"},
+    ]
+    results = asyncio.run(iso_processing.process_incoming_iso_batch(items))
+
+    assert [r["de39"] for r in results] == ["00", "05", "00", "96", "00"]
+    assert [r["txn_id"] for r in results] == ["p1", "p2", "card1", None, "p3"]
+    assert results[0]["correlation_id"] == "c1"
+    assert results[1]["error"] == "validation_failed:invalid_auth_code:x"
+
+    rows = _rows(events_db)
+    assert sorted(topic for topic, _ in rows) == ["clearing.incoming", "payout.incoming", "payout.incoming",
+                                                  "payout.incoming.rejected"]
+    stored = {json.loads(p).get("txn_id") for t, p in rows if t == "payout.incoming"}
+    assert stored == {"p1", "p3"}
+    ids = {r["payout_event_id"] for r in results if r.get("payout_event_id")}
+    assert len(ids) == 2
+
+
+def test_failed_transaction_fails_only_items_that_needed_it(events_db):
+    conn = sqlite3.connect(events_db)
+    conn.execute("DROP TABLE processor_events")
+    conn.commit()
+    conn.close()
+
+    results = asyncio.run(iso_processing.process_incoming_iso_batch([PAYOUT, {**PAYOUT, "protocol": "9"}]))
+    assert [r["de39"] for r in results] == ["96", "05"]
+
+
+def test_card_messages_are_validated_by_their_own_rules(events_db, tmp_path, monkeypatch):
+    monkeypatch.setattr(iso_processing, "_SINK_ENABLED", False)
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"iso8583": [{"field": "4", "required": True, "regex": r"^\d{12}$",
+                                             "reason": "invalid_amount:{value}"}]}))
+    card = {"mti": "0200", "2": "4111111111111111", "4": "000000001000", "txn_id": "card1"}
+    try:
+        validation.use_rules_file(str(path))
+        single = asyncio.run(iso_processing.process_incoming_iso({**card, "4": "10.00"}))
+        batch = asyncio.run(iso_processing.process_incoming_iso_batch([card, {**card, "4": None}, PAYOUT]))
+    finally:
+        validation.use_rules_file(None)
+
+    assert (single["de39"], single["error"]) == ("05", "validation_failed:invalid_amount:10.00")
+    assert [r["de39"] for r in batch] == ["00", "05", "00"]
+    assert batch[1]["error"] == "validation_failed:invalid_amount:"
+
+
+def test_issuer_error_fails_only_its_item(events_db, monkeypatch):
+    async def authorize(issuer, fields):
+        if fields["2"].endswith("2"):
+            raise RuntimeError("connector bug")
+        return {"approved": True, "de39": "00", "gateway_txn_id": "ISS-1"}
+
+    monkeypatch.setattr(framework, "ENABLED", True)
+    monkeypatch.setattr(iso_processing.stip, "authorize", authorize)
+    cards = [{"mti": "0200", "2": f"411111111111111{d}", "txn_id": f"card{d}"} for d in (1, 2, 3)]
+    results = asyncio.run(iso_processing.process_incoming_iso_batch(cards + [PAYOUT]))
+
+    assert [r["de39"] for r in results] == ["00", "96", "00", "00"]
+    stored = sorted(json.loads(p).get("txn_id") for t, p in _rows(events_db) if t == "clearing.incoming")
+    assert stored == ["card1", "card3"]
@@ -0,0 +1,73 @@
+# processor/app/tests/iso_supervisor_test.py
+import socket
+import struct
+import time
+
+from app import iso_supervisor, serializer
+from app.iso_client import decode_response
+from app.iso_supervisor import ListenerSupervisor
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _echo(port: int, timeout: float = 2.0) -> dict:
+    """One 0800 echo on a fresh connection; answered by the listener without the DB."""
+    payload = serializer.dumps({"mti": "0800", "fields": {"70": "301"}})
+    with socket.create_connection(("127.0.0.1", port), timeout=timeout) as s:
+        s.sendall(struct.pack(">I", len(payload)) + payload)
+        size = struct.unpack(">I", s.recv(4, socket.MSG_WAITALL))[0]
+        return decode_response(s.recv(size, socket.MSG_WAITALL))
+
+
+def _wait(predicate, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if predicate():
+                return
+        except OSError:
+            pass
+        time.sleep(0.1)
+    raise AssertionError("timed out")
+
+
+def test_worker_options_are_built_in_the_worker(monkeypatch):
+    monkeypatch.setenv("ISO_ADMIT_QUEUE_MS", "750")
+    options = iso_supervisor._worker_options({
+        "pipeline": True, "compression": True,
+        "admission": {"enabled": True, "max_per_connection": 8, "max_inflight": None},
+        "tls": {"certfile": None},
+    })
+    admission = options.pop("admission")
+    assert options == {"pipeline": True, "compression": True}
+    assert (admission.max_per_connection, admission.max_inflight, admission.queue_budget) == (8, 512, 0.75)
+    assert iso_supervisor._worker_options({"admission": {"enabled": None}}) == {}
+
+
+def test_crashed_worker_is_restarted_and_stop_is_graceful(monkeypatch):
+    # workers inherit the environment: keep them off the database
+    monkeypatch.setenv("ISO_DEDUPE", "0")
+    monkeypatch.setenv("VELOCITY", "0")
+    port = _free_port()
+    supervisor = ListenerSupervisor("127.0.0.1", port, workers=2, options={"pipeline": True})
+    supervisor.start()
+    try:
+        _wait(lambda: _echo(port)["fields"]["39"] == "00")
+        victim = supervisor._procs[0]
+        victim.kill()
+        victim.join(5)
+        _wait(lambda: supervisor.check() or supervisor._procs[0].pid != victim.pid)
+        _wait(lambda: supervisor._procs[0].is_alive())
+        # both workers share the port: every connection is still answered
+        for _ in range(10):
+            assert _echo(port)["mti"] == "0810"
+        # a worker stopped before its interpreter is up dies from the signal; give it time to start
+        _wait(lambda: time.monotonic() - supervisor._started_at[0] > 2.0)
+    finally:
+        supervisor.stop()
+    # SIGTERM lets each worker run start_server's cleanup and exit normally
+    assert [p.exitcode for p in supervisor._procs.values()] == [0, 0]
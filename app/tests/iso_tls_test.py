@@ -0,0 +1,50 @@
+# processor/app/tests/iso_tls_test.py
+import asyncio
+import shutil
+import socket
+import struct
+
+import pytest
+
+from app import iso_tls, metrics
+from app.iso_codec import pack_iso
+from app.iso_listener import start_server
+
+pytestmark = pytest.mark.skipif(shutil.which("openssl") is None, reason="needs the openssl CLI")
+
+
+def _echo(port: int, ctx, session=None):
+    with socket.create_connection(("127.0.0.1", port)) as raw:
+        with ctx.wrap_socket(raw, server_hostname="localhost", session=session) as sock:
+            sock.sendall(pack_iso("0800", {"11": "000001", "70": "301"}))
+            data = b""
+            while len(data) < 4 or len(data) < 4 + struct.unpack(">I", data[:4])[0]:
+                data += sock.recv(4096)
+            return data[4:], sock.session, sock.session_reused
+
+
+@pytest.mark.parametrize("framing", ["stream", "protocol"])
+def test_tls_listener_resumes_sessions(tmp_path, framing):
+    certfile, keyfile = iso_tls.generate_self_signed(str(tmp_path))
+    client_ctx = iso_tls.client_context(cafile=certfile)
+
+    async def main():
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        server = asyncio.create_task(start_server("127.0.0.1", port, framing=framing,
+                                                  ssl_context=iso_tls.server_context(certfile, keyfile)))
+        await asyncio.sleep(0.2)
+        try:
+            first = await asyncio.to_thread(_echo, port, client_ctx)
+            second = await asyncio.to_thread(_echo, port, client_ctx, first[1])
+        finally:
+            server.cancel()
+        return first, second
+
+    resumed_before = metrics.counter("iso.tls.resumed").value
+    first, second = asyncio.run(main())
+    assert first[0].startswith(b'0810{"fields":{"39":"00"')
+    assert not first[2] and second[2]
+    assert metrics.counter("iso.tls.resumed").value == resumed_before + 1
+    assert iso_tls.HANDSHAKES.snapshot()["127.0.0.1"]["resumed"] >= 1
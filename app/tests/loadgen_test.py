@@ -0,0 +1,66 @@
+# processor/app/tests/loadgen_test.py
+import asyncio
+
+from app import iso_listener
+from app.bench import loadgen
+
+
+async def _processed(msg):
+    # payouts are declined so the per-type DE39 counts differ
+    await asyncio.sleep(0.002)
+    de39 = "05" if msg.get("type") == "iso20022" else "00"
+    return iso_listener._with_match_keys({"mti": "0210", "fields": {"39": de39}}, msg)
+
+
+def _run(monkeypatch, argv):
+    monkeypatch.setattr(iso_listener, "_process_message", _processed)
+    monkeypatch.setattr(iso_listener, "_detector", lambda: None)
+
+    async def main():
+        handlers = []
+
+        async def handler(reader, writer):
+            handlers.append(asyncio.current_task())
+            await iso_listener.handle_client(reader, writer, pipeline=True)
+
+        server = await asyncio.start_server(handler, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            return await loadgen.main_async(loadgen.parse_args(argv + ["--connections", "2"]), port)
+        finally:
+            server.close()
+            # the client has closed its connections; let the listener see EOF
+            await asyncio.wait_for(asyncio.gather(*handlers), 5)
+
+    return asyncio.run(main())
+
+
+def _check_counts_and_latencies(report, sent):
+    everything = report["all"]
+    assert everything["ok"] + everything["errors"] == sent
+    assert sum(row["ok"] for row in report["by_type"].values()) == everything["ok"]
+    assert sum(row["errors"] for row in report["by_type"].values()) == everything["errors"]
+    for row in list(report["by_type"].values()) + [everything]:
+        latencies = [row[f"{name}_ms"] for name, _ in loadgen.PERCENTILES] + [row["max_ms"]]
+        assert latencies == sorted(latencies) and latencies[0] > 0
+        assert latencies[0] <= row["max_ms"] and 0 < row["mean_ms"] <= row["max_ms"]
+        assert abs(row["rps"] - row["ok"] / report["elapsed_s"]) <= 0.1 * row["rps"] + 1
+    for row in report["by_type"].values():
+        assert sum(row["de39"].values()) == row["ok"]
+
+
+def test_closed_loop_report_adds_up(monkeypatch):
+    report = _run(monkeypatch, ["--concurrency", "8", "--requests", "300", "--mix", "card=3,payout=1,echo=1"])
+    _check_counts_and_latencies(report, 300)
+    assert report["all"]["errors"] == 0 and set(report["by_type"]) == {"card", "echo", "payout"}
+    assert report["by_type"]["payout"]["de39"] == {"05": report["by_type"]["payout"]["ok"]}
+    assert report["by_type"]["echo"]["de39"] == {"00": report["by_type"]["echo"]["ok"]}
+    assert report["settings"]["mode"] == "closed_loop"
+
+
+def test_fixed_rate_report_adds_up(monkeypatch):
+    report = _run(monkeypatch, ["--rate", "1000", "--requests", "200", "--mix", "card"])
+    _check_counts_and_latencies(report, 200)
+    assert report["all"]["errors"] == 0 and report["settings"]["mode"] == "fixed_rate"
+    # 200 requests on a 1000/s schedule take at least 0.2 s
+    assert report["elapsed_s"] >= 0.19
@@ -0,0 +1,53 @@
+# processor/app/tests/serializer_test.py
+import dataclasses
+import json
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from app import serializer
+from app.iso_codec import pack_iso, unpack_iso
+
+
+@dataclasses.dataclass
+class _Ref:
+    scheme: str
+    value: str
+
+
+PAYLOADS = [
+    {"mti": "0200", "fields": {"2": "4111111111111111", "4": "000000001000", "11": "000042", "41": "TERM0001"}},
+    {
+        "txn_id": str(uuid.UUID(int=7)),
+        "type": "iso20022",
+        "creditor_name": "Zoë Müller — Ünïcode ✓",
+        "amount": Decimal("1234.50"),
+        "pain_xml": '<Document xmlns="urn:iso:std:iso:20022:tech:xsd:pain.001.001.09">\n\t<Nm>"quoted" & \\</Nm>',
+        "payoutDetails": {"iban": "DE89370400440532013000", "ref": _Ref("SCOR", "RF18")},
+        "received_at": datetime(2026, 1, 2, 3, 4, 5, 678, tzinfo=timezone.utc),
+        "value_date": date(2026, 1, 2),
+        "uuid": uuid.UUID(int=9),
+        "numbers": [0, -1, 2 ** 63 - 1, 0.1, 1.5, 123.456, True, False, None],
+        "tuple": (1, "a"),
+        "big": 2 ** 70,
+        "nan": float("nan"),
+        7: "int key",
+    },
+]
+
+
+@pytest.mark.parametrize("backend", sorted(serializer.BACKENDS))
+@pytest.mark.parametrize("payload", PAYLOADS)
+def test_backends_match_stdlib_output(backend, payload):
+    dumps, loads = serializer.BACKENDS[backend]
+    expected = json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+    assert dumps(payload) == expected
+    assert json.dumps(loads(expected), allow_nan=True) == json.dumps(json.loads(expected), allow_nan=True)
+
+
+def test_codec_frames_use_serializer():
+    frame = pack_iso("0200", {"41": "TÉRM", 4: "1000"})
+    assert frame[4:] == serializer.dumps({"mti": "0200", "fields": {"41": "TÉRM", "4": "1000"}})
+    assert unpack_iso(frame) == {"mti": "0200", "fields": {"41": "TÉRM", "4": "1000"}}
@@ -0,0 +1,102 @@
+# processor/app/tests/stip_test.py
+import asyncio
+
+from app import iso_processing, stip
+from app.connectors import framework, issuer_simulator
+from app.stip import Limits, StandInPolicy
+
+CARD = {"mti": "0200", "2": "4539971111111111", "4": "000000001000", "11": "000042", "42": "MERCH1",
+        "49": "978", "auth_code": "1234", "txn_id": "card-1"}
+
+
+def test_merchant_and_bin_limits():
+    now = [0.0]
+    policy = StandInPolicy.from_dict({
+        "default": {"max_amount": 5000, "max_total": 8000, "max_count": 3},
+        "merchants": {"BIG": {"max_amount": 50000, "max_total": 100000}},
+        "bins": {"999999": {"max_count": 0}, "411111": {"max_amount": 50000, "max_total": 100000}},
+    }, window_s=60, clock=lambda: now[0])
+    assert policy.merchants["BIG"] == Limits(50000, 100000, 3)
+
+    assert policy.check("M1", "453997", 6000) == "61"  # over max_amount
+    assert policy.check("M1", "453997", 4000) is None
+    assert policy.check("M1", "453997", 4000) is None
+    assert policy.check("M1", "453997", 100) == "61"  # over max_total
+    assert policy.check("M2", "453997", 100) == "61"  # the BIN's total is used up too
+    assert policy.check("BIG", "411111", 20000) is None
+    assert policy.check("M4", "411111", 20000) == "61"  # both the merchant's and the BIN's limits apply
+    assert policy.check("M3", "999999", 1) == "65"
+    now[0] = 60.0
+    assert policy.check("M1", "453997", 4000) is None  # new window
+
+
+def test_stands_in_when_the_issuer_misses_the_slo(monkeypatch):
+    monkeypatch.setattr(stip, "ENABLED", True)
+    monkeypatch.setattr(stip, "SLO_MS", 20)
+    monkeypatch.setenv("ISSUER_BREAKER_FAILURES", "2")
+    monkeypatch.setitem(framework.BACKENDS, "t_stip", issuer_simulator.authorize)
+    stip.use_policy(StandInPolicy(Limits(max_amount=5000, max_total=5000, max_count=10)))
+    issuer_simulator.set_latency(200)
+    try:
+        async def main():
+            timed_out = await stip.authorize("t_stip", CARD)
+            over_limit = await stip.authorize("t_stip", {**CARD, "4": "000000004500"})  # trips the breaker
+            fast = await stip.authorize("t_stip", {**CARD, "4": "000000000100"})
+            return timed_out, over_limit, fast, framework.get_connector("t_stip")
+
+        timed_out, over_limit, fast, connector = asyncio.run(main())
+    finally:
+        issuer_simulator.set_latency()
+        stip.use_policy(StandInPolicy())
+
+    assert timed_out["stand_in"] and timed_out["de39"] == "00" and timed_out["stand_in_reason"] == "issuer_timeout"
+    assert timed_out["auth_code"].startswith("S")
+    advice = timed_out["advice"]
+    assert (advice["amount"], advice["merchant"], advice["bin"], advice["de39"]) == (1000, "MERCH1", "453997", "00")
+    assert over_limit["de39"] == "61" and over_limit["advice"]["de39"] == "61"
+    assert fast["stand_in_reason"] == "issuer_circuit_open" and fast["de39"] == "00"
+    assert connector.breaker.state == framework.OPEN
+
+
+def test_stand_in_advice_is_persisted(monkeypatch):
+    monkeypatch.setattr(framework, "ENABLED", True)
+    monkeypatch.setattr(stip, "ENABLED", True)
+
+    async def down(payload):
+        raise ConnectionError("issuer down")
+
+    monkeypatch.setitem(framework.BACKENDS, "issuer_simulator", down)
+    events = []
+
+    async def persist_events(batch):
+        events.extend(batch)
+        return [{"event_id": str(n), "created_at": None} for n in range(len(batch))]
+
+    monkeypatch.setattr(iso_processing, "persist_events", persist_events)
+    results = asyncio.run(iso_processing.process_incoming_iso_batch([CARD, {**CARD, "4": "999999999999"}]))
+
+    assert [(r["de39"], r["stand_in"]) for r in results] == [("00", True), ("61", True)]
+    assert "error" not in results[0]
+    assert [topic for topic, _ in events] == ["clearing.incoming", "clearing.incoming", "stip.advice", "stip.advice"]
+    assert events[2][1]["txn_id"] == "card-1" and events[2][1]["reason"] == "issuer_error"
+
+
+def test_simulator_decides_card_requests_without_an_auth_code(monkeypatch):
+    card = {k: v for k, v in CARD.items() if k != "auth_code"}
+    monkeypatch.setattr(issuer_simulator, "MAX_AMOUNT", 5000)
+    issuer_simulator.set_latency(30)
+    try:
+        async def main():
+            started = asyncio.get_running_loop().time()
+            replies = [await issuer_simulator.authorize(card),
+                       await issuer_simulator.authorize({**card, "2": "45399711111X"}),
+                       await issuer_simulator.authorize({**card, "4": "000000009000"})]
+            return replies, asyncio.get_running_loop().time() - started
+
+        (approved, bad_pan, over), elapsed = asyncio.run(main())
+    finally:
+        issuer_simulator.set_latency()
+
+    assert approved["approved"] and approved["de39"] == "00" and len(approved["auth_code"]) == 6
+    assert (bad_pan["de39"], over["de39"]) == ("14", "51")
+    assert elapsed >= 0.09  # the latency knob applies to card requests too
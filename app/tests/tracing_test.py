@@ -0,0 +1,119 @@
+# processor/app/tests/tracing_test.py
+import asyncio
+import functools
+import json
+import os
+import socket
+import time
+
+from app import iso_listener, iso_processing, metrics, tracing
+from app.connectors import framework
+from app.iso_client import IsoClient
+
+CARD = {"mti": "0200", "2": "4111111111111111", "4": "000000001000", "auth_code": "1234", "txn_id": "card-1"}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_nothing_is_recorded_when_not_sampled(monkeypatch):
+    monkeypatch.setattr(tracing, "SAMPLE_RATE", 0.0)
+    tracing.clear()
+    with tracing.trace("iso.frame") as root:
+        assert root is tracing.NOOP and tracing.span("decode") is tracing.NOOP
+        root.set(peer="x")
+    assert tracing.current() is None and tracing.recent() == []
+
+
+def test_card_authorization_stages(monkeypatch, tmp_path):
+    monkeypatch.setattr(tracing, "SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(tmp_path / "traces.jsonl"))
+    monkeypatch.setattr(framework, "ENABLED", True)
+    monkeypatch.setattr(iso_processing, "_SINK_ENABLED", False)
+    monkeypatch.setattr(iso_processing, "_write_rows", lambda sql, params: asyncio.sleep(0.01))
+
+    async def main():
+        with tracing.trace("iso.frame", peer="test"):
+            return await iso_processing.process_incoming_iso(CARD)
+
+    assert asyncio.run(main())["de39"] == "00"
+    [record] = tracing.recent(limit=5)
+    spans = {s["name"]: s for s in record["spans"]}
+    assert set(record["stages"]) == {"process_incoming_iso", "validate", "decide", "issuer", "persist_event"}
+    assert spans["iso.frame"]["parent_id"] is None and record["attrs"] == {"peer": "test"}
+    process_id = spans["process_incoming_iso"]["span_id"]
+    assert {spans[n]["parent_id"] for n in ("validate", "decide", "issuer", "persist_event")} == {process_id}
+    assert spans["issuer"]["attrs"] == {"issuer": "issuer_simulator"}
+    assert spans["issuer"]["duration_ms"] >= 40  # the simulator's default latency
+    assert spans["persist_event"]["offset_ms"] >= spans["issuer"]["offset_ms"] + spans["issuer"]["duration_ms"]
+    assert record["stages"]["persist_event"] >= 10
+    assert record["duration_ms"] >= record["stages"]["process_incoming_iso"]
+
+
+def test_listener_traces_each_frame(monkeypatch):
+    monkeypatch.setattr(tracing, "SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "TRACE_FILE", None)
+    tracing.clear()
+
+    async def main():
+        port = _free_port()
+        handler = functools.partial(iso_listener.handle_client, pipeline=True)
+        server = await asyncio.start_server(handler, "127.0.0.1", port)
+        async with IsoClient("127.0.0.1", port, pool_size=1) as client:
+            await asyncio.gather(*(client.request("0200", {"11": f"{i:06d}", "39": "00"}) for i in range(1, 4)))
+        server.close()
+
+    asyncio.run(main())
+    records = tracing.recent()
+    assert len(records) == 3
+    assert all(set(r["stages"]) == {"admission", "decode", "write"} for r in records)
+    assert all(r["name"] == "iso.frame" and r["attrs"]["peer"][0] == "127.0.0.1" for r in records)
+
+
+def test_trace_file_is_read_from_the_end_and_rotated(monkeypatch, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(tracing, "TRACE_FILE", str(path))
+    lines = [json.dumps({"trace_id": str(n), "duration_ms": float(n % 7)}) for n in range(500)]
+    path.write_text("\n".join(lines) + "\n" + '{"trace_id": "partial', encoding="utf-8")
+    backwards = [line.decode() for line in tracing._lines_backwards(str(path), block=100)]
+    assert backwards == ['{"trace_id": "partial'] + lines[::-1]
+    assert [r["trace_id"] for r in tracing.recent(limit=3)] == ["499", "498", "497"]
+    assert [r["trace_id"] for r in tracing.recent(limit=2, min_ms=6)] == ["496", "489"]
+
+    monkeypatch.setattr(tracing, "SAMPLE_RATE", 1.0)
+    monkeypatch.setattr(tracing, "FILE_MAX_BYTES", path.stat().st_size + 1)
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    with tracing.trace("iso.frame"):
+        pass
+    assert not path.exists() and os.path.exists(str(path) + ".1")
+    with tracing.trace("iso.frame", peer="new"):
+        pass
+    newest, after = tracing.recent(limit=2)
+    assert newest["attrs"] == {"peer": "new"} and after["name"] == "iso.frame"  # spans both files
+    assert len(tracing.recent(limit=1000)) == 502
+
+
+def test_listener_metrics_export(tmp_path):
+    metrics.counter("test.exported").inc(3)
+    path = metrics.export(str(tmp_path), "listener-1")
+    stale = json.loads(open(path).read())
+    stale["exported_at"] = time.time() - 60
+    (tmp_path / "listener-2.json").write_text(json.dumps(stale))
+
+    collected = metrics.collect(str(tmp_path), max_age=15)
+    assert list(collected) == ["listener-1"]
+    assert collected["listener-1"]["metrics"]["test.exported"] >= 3
+    assert set(metrics.collect(str(tmp_path))) == {"listener-1", "listener-2"}
+
+    async def main():
+        task = asyncio.create_task(metrics.run_exports(str(tmp_path), "listener-3", interval=0.01))
+        await asyncio.sleep(0.05)
+        running = (tmp_path / "listener-3.json").exists()
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+        return running
+
+    assert asyncio.run(main()) and not (tmp_path / "listener-3.json").exists()
@@ -0,0 +1,68 @@
+# processor/app/tests/validation_test.py
+import json
+import os
+
+import pytest
+
+from app import validation
+
+GOOD = {"type": "iso20022", "protocol": "101.1", "auth_code": "1234", "payoutDetails": {"iban": "DE89370400440532013000"}}
+
+
+def test_default_rules_collect_every_reason():
+    v = validation.compile_rules()
+    assert v.validate(GOOD) == []
+    assert v.validate({"type": "iso20022", "protocol": " 102.1 ", "authCode": "12"}) == [
+        "invalid_protocol:102.1", "invalid_auth_code:12", "missing_iban"]
+    assert v.validate({"type": "iso20022"}) == ["invalid_protocol:", "invalid_auth_code:", "missing_iban"]
+    assert v.validate({"mti": "0200", "fields": {}}) == []  # no rules for card messages
+
+
+def test_rule_kinds_and_batch():
+    v = validation.compile_rules({"iso20022": [
+        {"field": "currency", "enum": ["EUR", "GBP"]},
+        {"field": "creditor_name", "required": True, "min_len": 2, "max_len": 5, "reason": "bad_name"},
+        {"field": "payoutDetails.iban", "iban": True},
+    ]})
+    msgs = [
+        {"type": "iso20022", "currency": "EUR", "creditor_name": "Zoë", "payoutDetails": {"iban": "DE89 3704 0044 0532 0130 00"}},
+        {"type": "iso20022", "currency": "USD", "creditor_name": "Z", "payoutDetails": {"iban": "DE88370400440532013000"}},
+        {"type": "iso20022", "creditor_name": "Zoë Müller"},
+    ]
+    assert v.validate_many(msgs) == [
+        [],
+        ["invalid_currency:USD", "bad_name", "invalid_payoutDetails_iban:DE88370400440532013000"],
+        ["bad_name"],
+    ]
+
+
+def test_bad_rules_are_rejected():
+    with pytest.raises(ValueError):
+        validation.compile_rules({"iso20022": [{"field": "x", "regexp": "^a"}]})
+    with pytest.raises(ValueError):
+        validation.compile_rules({"iso20022": {"field": "x"}})
+    for template in ("invalid_x:{val}", "invalid_x:{0}", "invalid_x:{value:d}", "invalid_x:{"):
+        with pytest.raises(ValueError, match="may only use"):
+            validation.compile_rules({"iso20022": [{"field": "x", "reason": template}]})
+    assert validation.compile_rule({"field": "x", "required": True, "reason": "{field}:{value!r}"})({}) == "x:''"
+
+
+def test_rules_file_hot_reload(tmp_path, monkeypatch):
+    monkeypatch.setattr(validation, "RELOAD_INTERVAL", 0)
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"iso20022": [{"field": "amount", "required": True, "reason": "missing_amount"}]}))
+    try:
+        validation.use_rules_file(str(path))
+        assert validation.validate(GOOD) == ["missing_amount"]
+
+        path.write_text(json.dumps({"iso20022": [{"field": "protocol", "enum": ["101.1"]}]}))
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000_000))
+        assert validation.validate(GOOD) == []
+        assert validation.validate({**GOOD, "protocol": "101.2"}) == ["invalid_protocol:101.2"]
+
+        # a broken file keeps the rules that were loaded
+        path.write_text("{not json")
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 2_000_000_000))
+        assert validation.validate({**GOOD, "protocol": "101.2"}) == ["invalid_protocol:101.2"]
+    finally:
+        validation.use_rules_file(None)
@@ -0,0 +1,100 @@
+# processor/app/tests/velocity_test.py
+import asyncio
+import time
+
+from app import iso_processing, velocity
+from app.velocity import VelocityStore
+
+PAN = "4539971111111111"
+
+
+def test_windows_slide_and_expire():
+    store = VelocityStore([(60, 6), (3600, 12)], shards=1)
+    key = store.key("card", PAN)
+    store.add(key, 100, now=1000.0)
+    assert store.totals(key, now=1000.0) == ((1, 1), (100, 100))
+    store.add(key, 200, now=1035.0)
+    assert store.totals(key, now=1059.0) == ((2, 2), (300, 300))
+    assert store.totals(key, now=1065.0) == ((1, 2), (200, 300))  # the 1000s bucket left the minute
+    assert store.totals(key, now=1200.0) == ((0, 2), (0, 300))
+    assert store.totals(key, now=1000.0 + 3700) == ((0, 0), (0, 0))
+    assert store.totals(store.key("card", "4111111111111111"), now=1000.0) == ((0, 0), (0, 0))
+
+    assert store.sweep(now=1000.0 + 7300) == 1 and len(store) == 0
+    other = store.key("merchant", "M1")
+    store.add(other, 5, now=9000.0)
+    assert store.totals(other, now=9000.0) == ((1, 1), (5, 5))  # a reused slot starts from zero
+
+
+def test_idle_keys_are_freed_as_new_ones_arrive():
+    store = VelocityStore([(60, 6)], shards=1)
+    for n in range(100):
+        store.add(store.key("card", f"old{n}"), 1, now=0.0)
+    active = store.key("card", PAN)
+    for _ in range(60):
+        store.add(active, 1, now=200.0)
+    assert len(store) == 1
+    assert store.totals(active, now=200.0) == ((60,), (60,))
+    for n in range(50):
+        store.add(store.key("card", f"new{n}"), 1, now=200.0)
+    assert len(store) == 51 and len(store._shards[0].keys) == 101  # freed slots were reused
+
+
+def test_snapshot_round_trip_without_pans(tmp_path):
+    store = VelocityStore(shards=4, hash_key=b"k")
+    now = time.time()
+    for n in range(200):
+        store.add(store.key("card", f"45399711111{n:05d}"), 1000 + n, now=now)
+    path = tmp_path / "velocity.snap"
+    store.save(str(path))
+
+    data = path.read_bytes()
+    assert b"4539971111100007" not in data and b"45399711111" not in data
+    loaded = VelocityStore.load(str(path), hash_key=b"k")
+    assert len(loaded) == 200
+    key = loaded.key("card", "4539971111100007")
+    assert loaded.totals(key, now=now) == store.totals(key, now=now)
+    assert loaded.totals(key, now=now).amounts[0] == 1007
+
+
+def test_snapshots_need_a_configured_hash_key(tmp_path, monkeypatch):
+    path = tmp_path / "velocity.snap"
+    monkeypatch.setattr(velocity, "SNAPSHOT_FILE", str(path))
+    monkeypatch.setattr(velocity, "STORE", VelocityStore(shards=1))
+    velocity.STORE.add(velocity.STORE.key("card", PAN), 1000)
+
+    monkeypatch.setattr(velocity, "KEY_CONFIGURED", False)
+    assert velocity.snapshot_path() is None
+    velocity.save_snapshot()
+    assert not path.exists()
+
+    monkeypatch.setattr(velocity, "KEY_CONFIGURED", True)
+    velocity.save_snapshot()
+    assert path.exists()
+    # a snapshot is not read back with another key
+    monkeypatch.setattr(velocity, "STORE", VelocityStore(shards=1, hash_key=b"other"))
+    assert velocity.restore() == 0
+
+
+def test_card_over_the_limit_is_declined(monkeypatch):
+    monkeypatch.setattr(velocity, "ENABLED", True)
+    monkeypatch.setattr(velocity, "STORE", VelocityStore())
+    seconds = [s for s, _ in velocity.WINDOWS]
+    monkeypatch.setattr(velocity, "LIMITS", {
+        "card": [(0, "count", 2)],
+        "merchant": [(seconds.index(3600), "amount", 5000)],
+    })
+    monkeypatch.setattr(iso_processing, "persist_event", lambda *a, **kw: asyncio.sleep(0, {}))
+
+    def auth(card, amount, merchant="M1"):
+        fields = {"mti": "0200", "2": card, "4": f"{amount:012d}", "42": merchant}
+        return asyncio.run(iso_processing.process_incoming_iso(fields))
+
+    assert auth(PAN, 1000)["de39"] == "00"
+    assert auth(PAN, 1000)["de39"] == "00"
+    third = auth(PAN, 1000)
+    assert (third["de39"], third["error"], third["approved"]) == ("65", "velocity_card_count_60s", False)
+    assert auth("4111111111111111", 2500)["de39"] == "00"
+    over = auth("4222222222222222", 1000)
+    assert (over["de39"], over["error"]) == ("61", "velocity_merchant_amount_3600s")
+    assert auth("4222222222222222", 1000, merchant="M2")["de39"] == "00"
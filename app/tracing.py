@@ -0,0 +1,212 @@
+# processor/app/tracing.py
+"""
+Lightweight tracing: one trace per sampled ISO frame, with a span per stage.
+
+The listener opens a root span per frame with trace(). The code under it opens
+child spans with span(): admission, decode, process_incoming_iso (validate,
+issuer, persist_event) and the response encode and write. The current span
+lives in a contextvar, so spans nest across awaits and into tasks created
+under them.
+
+TRACE_SAMPLE_RATE (0..1, default 0) is the share of frames traced. When a
+frame is not sampled, trace() and span() return one shared no-op span. That
+costs a contextvar read per stage and nothing is recorded.
+
+A finished trace is kept in an in-memory ring of the last TRACE_BUFFER (1000)
+traces. With TRACE_FILE it is also appended to that file as one JSON line.
+TRACE_MIN_MS keeps only traces at least that slow. Each record has its spans
+(offset and duration from the start of the frame) and "stages", the total
+milliseconds per span name, i.e. where the frame's time went. Sampled stage
+durations also feed the trace.<stage>_ms histograms in app.metrics. The admin
+app lists recent traces at GET /traces. It reads TRACE_FILE when one is set,
+since the listener runs in other processes. Only the end of the file is read,
+backwards, until enough traces are found. Once the file passes
+TRACE_FILE_MAX_BYTES (64 MiB) it is rotated to TRACE_FILE.1, so at most two
+files' worth of traces are kept.
+"""
+import contextvars
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import List, Optional
+
+from app import metrics, serializer
+
+LOG = logging.getLogger("processor.tracing")
+LOG.addHandler(logging.NullHandler())
+
+SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "0"))
+BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER", "1000"))
+TRACE_FILE = os.environ.get("TRACE_FILE", "").strip() or None
+MIN_MS = float(os.environ.get("TRACE_MIN_MS", "0"))
+FILE_MAX_BYTES = int(os.environ.get("TRACE_FILE_MAX_BYTES", str(64 << 20)))
+
+_current: contextvars.ContextVar = contextvars.ContextVar("processor_span", default=None)
+_ids = itertools.count(1)
+_recent: deque = deque(maxlen=max(1, BUFFER_SIZE))
+_file_lock = threading.Lock()
+
+
+class _Trace:
+    __slots__ = ("trace_id", "started_at", "spans")
+
+    def __init__(self):
+        self.trace_id = os.urandom(8).hex()
+        self.started_at = datetime.utcnow().isoformat()
+        self.spans: List["Span"] = []
+
+
+class Span:
+    __slots__ = ("trace", "name", "span_id", "parent_id", "start", "duration_ms", "attrs", "_token")
+
+    def __init__(self, trace: _Trace, name: str, parent_id: Optional[int], attrs: dict):
+        self.trace = trace
+        self.name = name
+        self.span_id = next(_ids)
+        self.parent_id = parent_id
+        self.attrs = attrs
+        self.duration_ms: Optional[float] = None
+        self.start = time.perf_counter()
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.duration_ms = (time.perf_counter() - self.start) * 1000.0
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        _current.reset(self._token)
+        self.trace.spans.append(self)
+        if self.parent_id is None:
+            _export(self)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP = _NoopSpan()
+
+
+def trace(name: str, **attrs):
+    """Root span of a new trace for TRACE_SAMPLE_RATE of the calls; NOOP for the rest."""
+    if SAMPLE_RATE <= 0.0 or (SAMPLE_RATE < 1.0 and random.random() >= SAMPLE_RATE):
+        return NOOP
+    return Span(_Trace(), name, None, attrs)
+
+
+def span(name: str, **attrs):
+    """Child of the current span; NOOP outside a sampled trace."""
+    parent = _current.get()
+    if parent is None:
+        return NOOP
+    return Span(parent.trace, name, parent.span_id, attrs)
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+def _export(root: Span):
+    if root.duration_ms < MIN_MS:
+        return
+    spans = sorted(root.trace.spans, key=lambda s: s.start)
+    stages = {}
+    for s in spans:
+        if s is not root:
+            stages[s.name] = round(stages.get(s.name, 0.0) + s.duration_ms, 3)
+            metrics.histogram(f"trace.{s.name}_ms").observe(s.duration_ms)
+    metrics.histogram(f"trace.{root.name}_ms").observe(root.duration_ms)
+    record = {
+        "trace_id": root.trace.trace_id,
+        "name": root.name,
+        "started_at": root.trace.started_at,
+        "duration_ms": round(root.duration_ms, 3),
+        "attrs": root.attrs,
+        "stages": stages,
+        "spans": [
+            {"span_id": s.span_id, "parent_id": s.parent_id, "name": s.name,
+             "offset_ms": round((s.start - root.start) * 1000.0, 3), "duration_ms": round(s.duration_ms, 3),
+             "attrs": s.attrs}
+            for s in spans
+        ],
+    }
+    _recent.append(record)
+    if TRACE_FILE:
+        try:
+            line = serializer.dumps_str(record)
+        except Exception:
+            line = json.dumps(record, default=str)
+        try:
+            with _file_lock:
+                with open(TRACE_FILE, "a", encoding="utf-8") as fh:
+                    fh.write(line + "\n")
+                    full = FILE_MAX_BYTES > 0 and fh.tell() >= FILE_MAX_BYTES
+                if full:
+                    os.replace(TRACE_FILE, TRACE_FILE + ".1")
+        except OSError as e:
+            LOG.warning("Could not append trace to %s: %s", TRACE_FILE, e)
+
+
+def _lines_backwards(path: str, block: int = 64 * 1024):
+    """The lines of `path`, last first, reading it from the end in `block`-sized pieces."""
+    try:
+        fh = open(path, "rb")
+    except FileNotFoundError:
+        return
+    with fh:
+        pos = fh.seek(0, os.SEEK_END)
+        tail = b""
+        while pos > 0:
+            step = min(block, pos)
+            pos -= step
+            fh.seek(pos)
+            lines = (fh.read(step) + tail).split(b"\n")
+            # the first piece may be the end of a line that starts in an earlier block
+            tail = lines.pop(0)
+            yield from reversed(lines)
+        yield tail
+
+
+def _file_records(min_ms: float):
+    for path in (TRACE_FILE, TRACE_FILE + ".1"):
+        for line in _lines_backwards(path):
+            if line.strip():
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # a line still being appended
+                if record["duration_ms"] >= min_ms:
+                    yield record
+
+
+def recent(limit: int = 50, min_ms: float = 0.0) -> List[dict]:
+    """The latest traces at least `min_ms` long, newest first (from TRACE_FILE when set)."""
+    if TRACE_FILE:
+        return list(itertools.islice(_file_records(min_ms), max(0, limit)))
+    records = deque((r for r in list(_recent) if r["duration_ms"] >= min_ms), maxlen=max(0, limit))
+    return list(reversed(records))
+
+
+def clear():
+    _recent.clear()
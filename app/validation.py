@@ -0,0 +1,233 @@
+# processor/app/validation.py
+"""
+Declarative message validation, compiled once.
+
+Rules are plain data, listed per message type ("iso20022" = the message's
+"type"; card messages without a type use "iso8583"):
+
+    {"field": "protocol", "required": true, "regex": "^101\\\\.\\\\d+$", "reason": "invalid_protocol:{value}"}
+
+  field            dotted path into the message ("payoutDetails.iban"), or a list of
+                   alternatives where the first non-empty one is used (["auth_code", "authCode"])
+  required         missing / empty values fail; otherwise they skip the remaining checks
+  regex            value must match (re.match); compiled once
+  min_len/max_len  length bounds of the value's string form
+  enum             allowed values
+  iban             IBAN country length, BBAN structure and mod-97 checksum (app.iban)
+  bic              BIC structure (app.iban)
+  reason           failure reason, formatted with {field} and {value}
+                   (default "invalid_<field>:{value}"); other placeholders are
+                   rejected when the rule is compiled
+
+Each rule reports at most one reason (its first failing check). A Validator
+runs every rule of the message type and returns all reasons in one pass.
+validate_many() does the same for a list of messages.
+
+DEFAULT_RULES are the production rules. VALIDATION_RULES_FILE points at a JSON
+file in the same shape, which replaces them per message type. The file is
+re-read when its mtime changes, checked at most every VALIDATION_RELOAD_INTERVAL
+seconds (default 2). A file that fails to load or compile keeps the previous
+validator.
+"""
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from app import iban, metrics
+
+LOG = logging.getLogger("processor.validation")
+LOG.addHandler(logging.NullHandler())
+
+RULES_FILE = os.environ.get("VALIDATION_RULES_FILE", "").strip() or None
+RELOAD_INTERVAL = float(os.environ.get("VALIDATION_RELOAD_INTERVAL", "2"))
+
+DEFAULT_RULES = {
+    "iso20022": [
+        {"field": "protocol", "required": True, "regex": r"^101\.\d+$", "reason": "invalid_protocol:{value}"},
+        {"field": ["auth_code", "authCode"], "required": True, "regex": r"^\d{3,6}$",
+         "reason": "invalid_auth_code:{value}"},
+        {"field": "payoutDetails.iban", "required": True, "reason": "missing_iban"},
+        {"field": "payoutDetails.iban", "iban": True, "reason": "invalid_iban"},
+        {"field": "payoutDetails.bic", "bic": True, "reason": "invalid_bic"},
+    ],
+}
+
+_RULE_KEYS = {"field", "required", "regex", "min_len", "max_len", "enum", "iban", "bic", "reason"}
+_MISSING = object()
+
+_reloads = metrics.counter("validation.reloads")
+_reload_errors = metrics.counter("validation.reload_errors")
+_failures = metrics.counter("validation.failures")
+
+
+def _getter(path) -> Callable[[dict], object]:
+    paths = [path] if isinstance(path, str) else list(path)
+    if not paths or not all(isinstance(p, str) and p for p in paths):
+        raise ValueError(f"rule field must be a name or a list of names, got {path!r}")
+    split = [tuple(p.split(".")) for p in paths]
+
+    def get(msg: dict):
+        for keys in split:
+            value = msg
+            for key in keys:
+                value = value.get(key, _MISSING) if isinstance(value, dict) else _MISSING
+                if value is _MISSING:
+                    break
+            if value is not _MISSING and value is not None and value != "":
+                return value
+        return _MISSING
+
+    return get
+
+
+def compile_rule(rule: dict) -> Callable[[dict], Optional[str]]:
+    """One rule -> check(msg) returning its failure reason or None."""
+    unknown = set(rule) - _RULE_KEYS
+    if unknown:
+        raise ValueError(f"unknown rule keys {sorted(unknown)} in {rule!r}")
+    get = _getter(rule.get("field"))
+    field = rule["field"] if isinstance(rule["field"], str) else rule["field"][0]
+    reason = rule.get("reason") or f"invalid_{field.replace('.', '_')}:{{value}}"
+    try:
+        # a bad template would otherwise only fail when a message fails the rule
+        reason.format(field=field, value="")
+    except (KeyError, IndexError, ValueError, AttributeError) as e:
+        raise ValueError(f"reason {reason!r} may only use {{field}} and {{value}}: {e!r}") from None
+    required = bool(rule.get("required"))
+    checks = []
+    if rule.get("regex") is not None:
+        checks.append(re.compile(rule["regex"]).match)
+    if rule.get("min_len") is not None:
+        min_len = int(rule["min_len"])
+        checks.append(lambda v: len(v) >= min_len)
+    if rule.get("max_len") is not None:
+        max_len = int(rule["max_len"])
+        checks.append(lambda v: len(v) <= max_len)
+    if rule.get("enum") is not None:
+        allowed = frozenset(str(v) for v in rule["enum"])
+        checks.append(allowed.__contains__)
+    if rule.get("iban"):
+        checks.append(iban.is_valid_iban)
+    if rule.get("bic"):
+        checks.append(iban.is_valid_bic)
+
+    def check(msg: dict) -> Optional[str]:
+        value = get(msg)
+        if value is _MISSING:
+            return reason.format(field=field, value="") if required else None
+        text = value.strip() if isinstance(value, str) else str(value)
+        if required and not text:
+            return reason.format(field=field, value="")
+        for ok in checks:
+            if not ok(text):
+                return reason.format(field=field, value=text)
+        return None
+
+    return check
+
+
+class Validator:
+    """Compiled rules per message type."""
+
+    __slots__ = ("rules", "_checks")
+
+    def __init__(self, rules: Dict[str, List[dict]]):
+        self.rules = rules
+        self._checks = {msg_type: tuple(compile_rule(r) for r in type_rules) for msg_type, type_rules in rules.items()}
+
+    @staticmethod
+    def message_type(msg: dict) -> str:
+        return str(msg.get("type") or "iso8583")
+
+    def validate(self, msg: dict) -> List[str]:
+        """Every failure reason for msg (empty when valid)."""
+        reasons = []
+        for check in self._checks.get(self.message_type(msg), ()):
+            reason = check(msg)
+            if reason is not None:
+                reasons.append(reason)
+        if reasons:
+            _failures.inc()
+        return reasons
+
+    def validate_many(self, msgs: Iterable[dict]) -> List[List[str]]:
+        return [self.validate(msg) for msg in msgs]
+
+
+def compile_rules(overrides: Optional[Dict[str, List[dict]]] = None) -> Validator:
+    """DEFAULT_RULES with `overrides` replacing whole message types."""
+    rules = dict(DEFAULT_RULES)
+    if overrides:
+        if not isinstance(overrides, dict) or not all(isinstance(v, list) for v in overrides.values()):
+            raise ValueError("rules must map message types to lists of rules")
+        rules.update(overrides)
+    return Validator(rules)
+
+
+class _Current:
+    """The live validator plus the rules file it came from, swapped atomically on reload."""
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self.validator = compile_rules()
+        self._mtime = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        if path:
+            self.reload()
+
+    def reload(self) -> bool:
+        """Re-read the rules file; False (and the old validator kept) when it cannot be used."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+                with open(self.path, encoding="utf-8") as fh:
+                    validator = compile_rules(json.load(fh))
+            except (OSError, ValueError, TypeError, re.error) as e:
+                _reload_errors.inc()
+                LOG.error("Validation rules in %s not loaded, keeping the previous ones: %s", self.path, e)
+                return False
+            self.validator, self._mtime = validator, mtime
+            _reloads.inc()
+            LOG.info("Loaded validation rules from %s (%s)", self.path, ", ".join(sorted(validator.rules)))
+            return True
+
+    def get(self) -> Validator:
+        if self.path:
+            now = time.monotonic()
+            if now - self._checked >= RELOAD_INTERVAL:
+                self._checked = now
+                try:
+                    changed = os.stat(self.path).st_mtime_ns != self._mtime
+                except OSError:
+                    changed = False
+                if changed:
+                    self.reload()
+        return self.validator
+
+
+_CURRENT = _Current(RULES_FILE)
+
+
+def get_validator() -> Validator:
+    """The live validator (picks up rules file changes)."""
+    return _CURRENT.get()
+
+
+def use_rules_file(path: Optional[str]) -> Validator:
+    """Switch to another rules file (None: DEFAULT_RULES only) and return the new validator."""
+    global _CURRENT
+    _CURRENT = _Current(path)
+    return _CURRENT.validator
+
+
+def validate(msg: dict) -> List[str]:
+    return get_validator().validate(msg)
+
+
+def validate_many(msgs: Iterable[dict]) -> List[List[str]]:
+    return get_validator().validate_many(msgs)
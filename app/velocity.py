@@ -0,0 +1,389 @@
+# processor/app/velocity.py
+"""
+In-memory sliding-window velocity counters for cards and merchants.
+
+Each key (a card or a merchant) keeps, per window, a ring of time buckets with a
+count and an amount (minor units). VELOCITY_WINDOWS lists the windows as
+seconds:buckets. The default, "60:6,3600:12,86400:24", gives 1 minute in 10 s
+buckets, 1 hour in 5 min buckets and 24 hours in 1 h buckets. A window's
+totals are the sum of its ring, so the window slides one bucket at a time.
+Buckets that fell out of the window are zeroed lazily when the key is next
+touched.
+
+Keys never hold a PAN. They are 64-bit keyed BLAKE2b hashes of "<kind>:<value>"
+(VELOCITY_HASH_KEY is the secret). Without VELOCITY_HASH_KEY a random key is made
+per process: unkeyed 64-bit hashes of PANs can be reversed by trying every PAN.
+Storage is sharded (VELOCITY_SHARDS, default
+16), and each shard has its own lock. A shard maps key hashes to slot numbers.
+Every window's counts, amounts and last bucket number are kept in flat arrays
+(array.array) indexed by slot, as are running window totals, so a check reads
+three numbers instead of adding up the ring. That is about 0.65 KB per key with
+the default windows, and there is no Python object per bucket. Slots of keys
+idle for a whole longest window are freed for reuse. Every add() moves a clock
+hand over the next SWEEP_STEP slots of its shard, so the store stays bounded by
+the keys active in the longest window without a background task. Snapshots do a
+full sweep first.
+
+With VELOCITY=1, process_incoming_iso checks every card authorization that the
+BIN index routes. It declines when the card or the merchant would go over a
+limit in VELOCITY_LIMITS_FILE:
+
+    {"card":     {"60": {"count": 5}, "86400": {"count": 50, "amount": 500000}},
+     "merchant": {"3600": {"amount": 10000000}}}
+
+Over a count limit the decline is 65, over an amount limit it is 61. Only
+authorizations that pass are counted.
+
+The store is per process. With VELOCITY_SNAPSHOT_FILE the listener loads it at
+start, saves it every VELOCITY_SNAPSHOT_INTERVAL seconds (default 60) and on
+shutdown. A "{worker}" in the path is replaced with the worker process name,
+so supervised workers keep separate files. Snapshots need VELOCITY_HASH_KEY:
+without it they are disabled (a random per-process key could not read them back
+anyway). A snapshot records a check value of its key and is not loaded with
+another key.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from array import array
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from app import metrics
+
+LOG = logging.getLogger("processor.velocity")
+LOG.addHandler(logging.NullHandler())
+
+ENABLED = os.environ.get("VELOCITY", "0").strip().lower() in ("1", "true", "yes", "on")
+WINDOWS = tuple(tuple(int(x) for x in w.split(":"))
+                for w in os.environ.get("VELOCITY_WINDOWS", "60:6,3600:12,86400:24").split(",") if w.strip())
+SHARDS = int(os.environ.get("VELOCITY_SHARDS", "16"))
+HASH_KEY = os.environ.get("VELOCITY_HASH_KEY", "").encode("utf-8")
+# snapshots outlive the process, so they need a configured key
+KEY_CONFIGURED = bool(HASH_KEY)
+if not KEY_CONFIGURED:
+    HASH_KEY = os.urandom(32)
+LIMITS_FILE = os.environ.get("VELOCITY_LIMITS_FILE", "").strip() or None
+SNAPSHOT_FILE = os.environ.get("VELOCITY_SNAPSHOT_FILE", "").strip() or None
+SNAPSHOT_INTERVAL = float(os.environ.get("VELOCITY_SNAPSHOT_INTERVAL", "60"))
+# slots examined for expiry per add()
+SWEEP_STEP = 2
+
+_MAGIC = b"VELSNAP1"
+
+_declined = metrics.counter("velocity.declined")
+_keys = metrics.gauge("velocity.keys")
+_snapshot_ms = metrics.histogram("velocity.snapshot_ms")
+
+
+class Totals(NamedTuple):
+    # per window, in VELOCITY_WINDOWS order
+    counts: Tuple[int, ...]
+    amounts: Tuple[int, ...]
+
+
+class _Window:
+    """One window's buckets for every slot of a shard: bucket i of slot s is at s * buckets + i."""
+    __slots__ = ("buckets", "width", "counts", "amounts", "epochs", "count", "amount", "zero_counts", "zero_amounts")
+
+    def __init__(self, seconds: int, buckets: int):
+        self.buckets = buckets
+        self.width = seconds // buckets
+        self.counts = array("I")
+        self.amounts = array("q")
+        # slot -> bucket number (time // width) the slot was last rolled to
+        self.epochs = array("q")
+        # slot -> sum of its buckets, kept up to date so reads do not add up the ring
+        self.count = array("Q")
+        self.amount = array("q")
+        self.zero_counts = array("I", bytes(4 * buckets))
+        self.zero_amounts = array("q", bytes(8 * buckets))
+
+    def arrays(self):
+        return self.counts, self.amounts, self.epochs, self.count, self.amount
+
+    def append(self):
+        self.counts.extend(self.zero_counts)
+        self.amounts.extend(self.zero_amounts)
+        self.epochs.append(0)
+        self.count.append(0)
+        self.amount.append(0)
+
+    def reset(self, slot: int):
+        base = slot * self.buckets
+        self.counts[base:base + self.buckets] = self.zero_counts
+        self.amounts[base:base + self.buckets] = self.zero_amounts
+        self.count[slot] = self.amount[slot] = 0
+
+    def roll(self, slot: int, current: int):
+        """Drop the buckets that left the window between the slot's last bucket number and `current`."""
+        last = self.epochs[slot]
+        if current - last >= self.buckets:
+            if self.count[slot]:
+                self.reset(slot)
+        elif current > last:
+            base = slot * self.buckets
+            counts, amounts = self.counts, self.amounts
+            for b in range(last + 1, current + 1):
+                i = base + b % self.buckets
+                if counts[i]:
+                    self.count[slot] -= counts[i]
+                    self.amount[slot] -= amounts[i]
+                    counts[i] = amounts[i] = 0
+        else:
+            return  # the clock went back: keep counting into the latest bucket
+        self.epochs[slot] = current
+
+
+class _Shard:
+    __slots__ = ("lock", "slots", "keys", "free", "windows", "hand")
+
+    def __init__(self, windows):
+        self.lock = threading.Lock()
+        self.slots: Dict[int, int] = {}
+        # slot -> key hash; 0 marks a free slot
+        self.keys = array("Q")
+        self.free: List[int] = []
+        self.windows = [_Window(seconds, buckets) for seconds, buckets in windows]
+        # next slot the incremental sweep looks at
+        self.hand = 0
+
+    def release(self, slot: int):
+        del self.slots[self.keys[slot]]
+        self.keys[slot] = 0
+        self.free.append(slot)
+
+    def slot(self, key: int) -> int:
+        slot = self.slots.get(key, -1)
+        if slot >= 0:
+            return slot
+        if self.free:
+            slot = self.free.pop()
+            self.keys[slot] = key
+            for window in self.windows:
+                window.reset(slot)
+                window.epochs[slot] = 0
+        else:
+            slot = len(self.keys)
+            self.keys.append(key)
+            for window in self.windows:
+                window.append()
+        self.slots[key] = slot
+        return slot
+
+
+class VelocityStore:
+    def __init__(self, windows: Sequence[Tuple[int, int]] = WINDOWS, shards: int = SHARDS, hash_key: bytes = HASH_KEY):
+        self.windows = tuple((int(seconds), int(buckets)) for seconds, buckets in windows)
+        if not self.windows or any(s <= 0 or b <= 0 or s % b for s, b in self.windows):
+            raise ValueError(f"velocity windows must be seconds:buckets with seconds divisible by buckets: {windows}")
+        self.shard_count = max(1, shards)
+        self.hash_key = hash_key
+        self._shards = [_Shard(self.windows) for _ in range(self.shard_count)]
+        self._zeros = Totals((0,) * len(self.windows), (0,) * len(self.windows))
+        self._longest = max(range(len(self.windows)), key=lambda w: self.windows[w][0])
+
+    def key(self, kind: str, value: str) -> int:
+        digest = hashlib.blake2b(f"{kind}:{value}".encode("utf-8"), digest_size=8, key=self.hash_key).digest()
+        return int.from_bytes(digest, "little") or 1
+
+    def key_check(self) -> str:
+        """Identifies the hash key in snapshots without revealing it."""
+        return hashlib.blake2b(b"velocity-key-check", digest_size=8, key=self.hash_key).hexdigest()
+
+    def __len__(self) -> int:
+        return sum(len(shard.slots) for shard in self._shards)
+
+    def totals(self, key: int, now: Optional[float] = None) -> Totals:
+        shard = self._shards[key % self.shard_count]
+        with shard.lock:
+            slot = shard.slots.get(key, -1)
+            if slot < 0:
+                return self._zeros
+            now = time.time() if now is None else now
+            for window in shard.windows:
+                current = int(now // window.width)
+                if current != window.epochs[slot]:
+                    window.roll(slot, current)
+            return Totals(tuple([w.count[slot] for w in shard.windows]), tuple([w.amount[slot] for w in shard.windows]))
+
+    def add(self, key: int, amount: int, now: Optional[float] = None):
+        """Count one event of `amount` for key."""
+        now = time.time() if now is None else now
+        shard = self._shards[key % self.shard_count]
+        with shard.lock:
+            slot = shard.slot(key)
+            for window in shard.windows:
+                current = int(now // window.width)
+                if current != window.epochs[slot]:
+                    window.roll(slot, current)
+                i = slot * window.buckets + window.epochs[slot] % window.buckets
+                window.counts[i] += 1
+                window.amounts[i] += amount
+                window.count[slot] += 1
+                window.amount[slot] += amount
+            self._reap(shard, now)
+
+    def _reap(self, shard: _Shard, now: float):
+        # clock hand: free the next SWEEP_STEP slots if idle for a whole longest window
+        size = len(shard.keys)
+        window = shard.windows[self._longest]
+        horizon = int(now // window.width) - window.buckets
+        for _ in range(min(SWEEP_STEP, size)):
+            slot = shard.hand = (shard.hand + 1) % size
+            if shard.keys[slot] and window.epochs[slot] <= horizon:
+                shard.release(slot)
+
+    def sweep(self, now: Optional[float] = None) -> int:
+        """Free the slots of keys idle for the whole longest window; returns how many."""
+        now = time.time() if now is None else now
+        freed = 0
+        for shard in self._shards:
+            with shard.lock:
+                window = shard.windows[self._longest]
+                horizon = int(now // window.width) - window.buckets
+                for slot in list(shard.slots.values()):
+                    if window.epochs[slot] <= horizon:
+                        shard.release(slot)
+                        freed += 1
+        return freed
+
+    def save(self, path: str):
+        """Snapshot every shard to `path` (temp file, then rename)."""
+        header = json.dumps({"windows": self.windows, "shards": self.shard_count, "saved_at": time.time(),
+                             "key_check": self.key_check(),
+                             "slots": [len(shard.keys) for shard in self._shards]}).encode("utf-8")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(_MAGIC + struct.pack("<I", len(header)) + header)
+            for shard in self._shards:
+                with shard.lock:
+                    chunks = [shard.keys.tobytes()] + [a.tobytes() for w in shard.windows for a in w.arrays()]
+                for chunk in chunks:
+                    fh.write(chunk)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, hash_key: bytes = HASH_KEY) -> "VelocityStore":
+        with open(path, "rb") as fh:
+            if fh.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a velocity snapshot")
+            header = json.loads(fh.read(struct.unpack("<I", fh.read(4))[0]))
+            store = cls(header["windows"], header["shards"], hash_key)
+            if header.get("key_check") != store.key_check():
+                raise ValueError(f"{path} was saved with another VELOCITY_HASH_KEY")
+            for shard, slots in zip(store._shards, header["slots"]):
+                shard.keys.fromfile(fh, slots)
+                for window in shard.windows:
+                    for a, n in zip(window.arrays(), (slots * window.buckets,) * 2 + (slots,) * 3):
+                        a.fromfile(fh, n)
+                for slot, key in enumerate(shard.keys):
+                    if key:
+                        shard.slots[key] = slot
+                    else:
+                        shard.free.append(slot)
+        return store
+
+
+def _load_limits(path: Optional[str]) -> Dict[str, List[Tuple[int, str, int]]]:
+    """{"card": [(window index, "count" | "amount", limit), ...], "merchant": [...]}"""
+    limits: Dict[str, List[Tuple[int, str, int]]] = {"card": [], "merchant": []}
+    if not path:
+        return limits
+    with open(path, encoding="utf-8") as fh:
+        data = json.load(fh)
+    seconds = [s for s, _ in WINDOWS]
+    for kind in limits:
+        for window, caps in (data.get(kind) or {}).items():
+            if int(window) not in seconds:
+                raise ValueError(f"velocity limit for a {window}s window, but VELOCITY_WINDOWS has {seconds}")
+            for measure, cap in caps.items():
+                if measure not in ("count", "amount"):
+                    raise ValueError(f"velocity limits are count or amount, got {measure!r}")
+                limits[kind].append((seconds.index(int(window)), measure, int(cap)))
+    return limits
+
+
+STORE = VelocityStore()
+LIMITS = _load_limits(LIMITS_FILE)
+
+
+def _over(totals: Totals, amount: int, limits) -> Optional[Tuple[int, str]]:
+    for w, measure, cap in limits:
+        if measure == "count" and totals.counts[w] + 1 > cap:
+            return w, measure
+        if measure == "amount" and totals.amounts[w] + amount > cap:
+            return w, measure
+    return None
+
+
+def check(card: str, merchant: str, amount: int) -> Optional[Tuple[str, str]]:
+    """(de39, reason) when the authorization would break a limit; otherwise count it and return None."""
+    now = time.time()
+    keys = [("card", STORE.key("card", card))]
+    if merchant:
+        keys.append(("merchant", STORE.key("merchant", merchant)))
+    for kind, key in keys:
+        if LIMITS[kind]:
+            over = _over(STORE.totals(key, now), amount, LIMITS[kind])
+            if over is not None:
+                w, measure = over
+                _declined.inc()
+                return ("65" if measure == "count" else "61"), f"velocity_{kind}_{measure}_{STORE.windows[w][0]}s"
+    for _, key in keys:
+        STORE.add(key, amount, now)
+    return None
+
+
+def snapshot_path() -> Optional[str]:
+    if not SNAPSHOT_FILE:
+        return None
+    if not KEY_CONFIGURED:
+        LOG.error("VELOCITY_SNAPSHOT_FILE is set but VELOCITY_HASH_KEY is not: velocity snapshots disabled")
+        return None
+    return SNAPSHOT_FILE.replace("{worker}", multiprocessing.current_process().name)
+
+
+def restore() -> int:
+    """Load the snapshot (if any) into STORE; returns the number of keys."""
+    global STORE
+    path = snapshot_path()
+    if path and os.path.exists(path):
+        try:
+            store = VelocityStore.load(path, STORE.hash_key)
+            if store.windows != STORE.windows:
+                raise ValueError(f"snapshot windows {store.windows} != VELOCITY_WINDOWS {STORE.windows}")
+        except (OSError, ValueError, EOFError, KeyError) as e:
+            LOG.error("Velocity snapshot %s not loaded, starting empty: %s", path, e)
+        else:
+            STORE = store
+            LOG.info("Velocity: %d keys loaded from %s", len(store), path)
+    _keys.set(len(STORE))
+    return len(STORE)
+
+
+def save_snapshot():
+    path = snapshot_path()
+    if not path:
+        return
+    started = time.perf_counter()
+    freed = STORE.sweep()
+    STORE.save(path)
+    _keys.set(len(STORE))
+    _snapshot_ms.observe((time.perf_counter() - started) * 1000.0)
+    LOG.debug("Velocity snapshot: %d keys (%d expired) -> %s", len(STORE), freed, path)
+
+
+async def run_snapshots(interval: float = SNAPSHOT_INTERVAL):
+    """Save STORE every `interval` seconds (off the event loop) until cancelled."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(save_snapshot)
+        except Exception as e:
+            LOG.error("Velocity snapshot failed: %r", e)